@@ -0,0 +1,26 @@
+"""
+ASGI config for MLChat project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The chat views are async, so under an ASGI server (``uvicorn MLChat.asgi:application``)
+one process keeps many chats in flight while they wait on TMDB, the
+translator or OCR.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MLChat.settings')
+
+application = get_asgi_application()
+
+# With MLCHAT_PRELOAD set, build and warm up the models it names before the first request
+if os.environ.get('MLCHAT_PRELOAD'):
+    from chatbot.views import handler
+
+    if handler.preload_names is None or handler.preload_names:
+        handler.warmup(handler.preload_names)
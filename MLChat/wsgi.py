@@ -0,0 +1,28 @@
+"""
+WSGI config for MLChat project.
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MLChat.settings')
+
+application = get_wsgi_application()
+
+# With MLCHAT_PRELOAD set, build the models here. Under `gunicorn --preload`
+# this module is imported by the master, so the models are loaded once and
+# shared copy-on-write by every forked worker. Only the models named in
+# MLCHAT_PRELOAD are loaded; threads and SQLite connections are opened
+# lazily in each worker.
+if os.environ.get('MLCHAT_PRELOAD'):
+    from chatbot.views import handler
+
+    if handler.preload_names is None or handler.preload_names:
+        handler.warmup(handler.preload_names)
+        handler.preload(handler.preload_names, freeze=True)
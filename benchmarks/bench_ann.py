@@ -0,0 +1,85 @@
+"""Movie neighbours: the dense similarity matrix vs. the embedding engine (exact and IVF).
+
+    python -m benchmarks.bench_ann [--queries 500] [--nprobe 1,4,8,16] [--json out.json]
+
+Builds the embeddings in memory when models/movie_recommender/embeddings/
+does not exist yet. recall@5 is measured against the dense matrix (how
+close the embedding model is to the original one) and against an exact
+search over the same embeddings (what the IVF index loses).
+"""
+import argparse
+import os
+import time
+import numpy as np
+from benchmarks.common import MOVIE_DIR, print_table, summarize, time_calls, write_json
+from models.movie_recommender.catalog import MovieCatalog
+from models.movie_recommender.embedding_store import EMBEDDING_DIR, EmbeddingStore
+from models.movie_recommender.similarity_store import SimilarityStore, top_k_from_scores
+
+
+def dense_row_top_k(store, pos, k=5):
+    scores = np.array(store.matrix[pos], dtype=np.float32)
+    scores[pos] = -np.inf
+    return top_k_from_scores(scores, k)[0]
+
+
+def recall(expected, found):
+    return float(np.mean([len(set(e) & set(f)) / len(e) for e, f in zip(expected, found)]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--nprobe', default='1,4,8,16', help="comma-separated IVF probe counts")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    dense = SimilarityStore.load(MOVIE_DIR)
+    path = os.path.join(MOVIE_DIR, EMBEDDING_DIR)
+    if os.path.exists(path):
+        embeddings = EmbeddingStore.load(path)
+    else:
+        start = time.perf_counter()
+        embeddings = EmbeddingStore.build(MovieCatalog.load(os.path.join(MOVIE_DIR, 'dict_mov.pkl')).tags)
+        print(f"built the embeddings in {time.perf_counter() - start:.1f} s")
+    if len(embeddings) != len(dense):
+        parser.error(f"the embeddings have {len(embeddings)} movies, the similarity matrix {len(dense)}")
+
+    rng = np.random.default_rng(args.seed)
+    queries = rng.choice(len(dense), min(args.queries, len(dense)), replace=False).tolist()
+    truth = [dense_row_top_k(dense, pos) for pos in queries]
+
+    results = {'dense row argpartition': summarize(time_calls(lambda p: dense_row_top_k(dense, p), queries))}
+    if dense.neighbor_depth >= 5:
+        results['dense neighbour table'] = summarize(time_calls(lambda p: dense.top_k(p, 5), queries))
+
+    embeddings.nprobe = len(embeddings.index)
+    exact = [embeddings.top_k(pos, 5)[0] for pos in queries]
+    results['embedding exact'] = summarize(time_calls(lambda p: embeddings.top_k(p, 5), queries))
+    quality = {'embedding exact': {'recall@5_vs_dense': recall(truth, exact), 'recall@5_vs_exact': 1.0}}
+
+    for nprobe in [int(n) for n in args.nprobe.split(',')]:
+        embeddings.nprobe = nprobe
+        found = [embeddings.top_k(pos, 5)[0] for pos in queries]
+        name = f'embedding ivf nprobe={nprobe}'
+        results[name] = summarize(time_calls(lambda p: embeddings.top_k(p, 5), queries))
+        quality[name] = {'recall@5_vs_dense': recall(truth, found), 'recall@5_vs_exact': recall(exact, found)}
+
+    sizes = {
+        'similarity matrix': dense.matrix.nbytes,
+        'embeddings': embeddings.vectors.nbytes,
+        'ivf index': sum(a.nbytes for a in (embeddings.index.centroids, embeddings.index.lists,
+                                            embeddings.index.offsets, embeddings.index.list_vectors)),
+    }
+    print(f"{len(dense)} movies, {embeddings.vectors.shape[1]}-d embeddings, "
+          f"{len(embeddings.index)} IVF lists, {len(queries)} queries, top 5")
+    print_table(results)
+    for name, q in quality.items():
+        print(f"{name:<28} recall@5 vs dense {q['recall@5_vs_dense']:.1%}, vs exact embedding {q['recall@5_vs_exact']:.1%}")
+    print(', '.join(f"{name} {size / 2 ** 20:.1f} MB" for name, size in sizes.items()))
+    write_json(args.json, {'latency': results, 'quality': quality, 'bytes': sizes})
+
+
+if __name__ == '__main__':
+    main()
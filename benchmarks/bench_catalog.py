@@ -0,0 +1,77 @@
+"""Per-request catalog access: MovieCatalog vs. the pandas DataFrame paths it replaced.
+
+    python -m benchmarks.bench_catalog [--requests 2000] [--json out.json]
+
+Each request reads the ids and titles of 5 random rows, as one
+recommendation does. "iloc per row" is the original recommend() loop
+(movies.iloc[idx]['id'] / ['title']), "column iloc" the vectorised
+DataFrame version.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import pandas as pd
+from benchmarks.common import load_movies_dict, print_table, summarize, time_calls, write_json
+from models.movie_recommender.catalog import MovieCatalog
+
+
+def iloc_per_row(movies, rows):
+    ids, titles = [], []
+    for idx in rows:
+        ids.append(int(movies.iloc[idx]['id']))
+        titles.append(movies.iloc[idx]['title'])
+    return ids, titles
+
+
+def column_iloc(movies, rows):
+    return [int(m) for m in movies['id'].iloc[rows]], movies['title'].iloc[rows].tolist()
+
+
+def catalog_access(catalog, rows):
+    return catalog.ids_at(rows), catalog.titles_at(rows)
+
+
+def build(fn, movies_dict):
+    tracemalloc.start()
+    start = time.perf_counter()
+    table = fn(movies_dict)
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return table, {'build_ms': elapsed, 'build_peak_mb': peak / 2 ** 20}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    movies_dict = load_movies_dict()
+    movies, df_build = build(lambda d: pd.DataFrame(d).reset_index(drop=True), movies_dict)
+    catalog, catalog_build = build(MovieCatalog.from_dict, movies_dict)
+
+    rng = random.Random(args.seed)
+    requests = [rng.sample(range(len(catalog)), args.rows) for _ in range(args.requests)]
+    for rows in requests[:50]:
+        assert iloc_per_row(movies, rows) == column_iloc(movies, rows) == catalog_access(catalog, rows)
+
+    results = {
+        'DataFrame iloc per row': summarize(time_calls(lambda r: iloc_per_row(movies, r), requests)),
+        'DataFrame column iloc': summarize(time_calls(lambda r: column_iloc(movies, r), requests)),
+        'MovieCatalog': summarize(time_calls(lambda r: catalog_access(catalog, r), requests)),
+    }
+
+    print(f"{len(catalog)} movies, {args.requests} requests of {args.rows} rows")
+    print_table(results)
+    build_stats = {'DataFrame': df_build, 'MovieCatalog': catalog_build}
+    for name, stats in build_stats.items():
+        print(f"{name:<28}build {stats['build_ms']:.1f} ms, peak {stats['build_peak_mb']:.1f} MB")
+    write_json(args.json, {'latency': results, 'build': build_stats})
+
+
+if __name__ == '__main__':
+    main()
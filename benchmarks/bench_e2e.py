@@ -0,0 +1,379 @@
+"""End-to-end chatbot request paths, offline: through the Django test client and MLModelHandler.
+
+    python -m benchmarks.bench_e2e [--iterations 20] [--concurrency 1] [--json out.json] [--compare old.json]
+
+TMDB is ``benchmarks/fake_tmdb.py``; the Google translator and Tesseract's
+``image_to_string`` are replaced by stubs that sleep for a fixed time, so
+runs need no network or Tesseract and are repeatable. The poster,
+translation, OCR and movie result caches are off unless ``--warm-caches``,
+so every request does the full work. Chat flows use a throwaway test
+database, never ``db.sqlite3``.
+
+Each scenario reports the latency of its measured requests (e.g. only the
+upload in the image flow, not the menu choices leading to it), throughput
+as all requests it sent per second of wall time, and the peak RSS of the
+process after it ran. ``--compare`` prints the p50/p95 change against an
+earlier ``--json`` file, e.g. from the previous commit.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import REPO_DIR, peak_rss_mb, summarize, write_json
+from benchmarks.fake_tmdb import start_fake_tmdb
+
+GENRES = ['action', 'comedy', 'drama', 'horror', 'اکشن', 'کمدی', 'ترسناک', 'عاشقانه']
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+class StubTranslator:
+    """Stands in for ``GoogleTranslator``: answers after ``latency_ms`` with a marked copy of the text."""
+
+    def __init__(self, target, latency_ms):
+        self.target = target
+        self.latency = latency_ms / 1000.0
+
+    def translate(self, text):
+        time.sleep(self.latency)
+        return f"[{self.target}] {text}"
+
+
+def stub_tesseract(report_text, latency_ms):
+    import pytesseract
+
+    def image_to_string(image, *args, **kwargs):
+        time.sleep(latency_ms / 1000.0)
+        return report_text
+
+    pytesseract.image_to_string = image_to_string
+
+
+def configure_env(args, tmp_dir, tmdb_url):
+    """Must run before the models and ``chatbot.views`` are imported."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MLChat.settings')
+    # one log line per request would drown the results
+    os.environ.setdefault('MLCHAT_LOG_LEVEL', 'WARNING')
+    os.environ.update({
+        'TMDB_API_KEY': 'bench',
+        'TMDB_API_BASE': tmdb_url,
+        'MOVIE_TRANSLATION_OFFLINE': '0',
+        'MLCHAT_ASYNC_OCR': '0',
+        'MLCHAT_PRELOAD': '',
+    })
+    if args.warm_caches:
+        os.environ.update({
+            'MOVIE_POSTER_CACHE': os.path.join(tmp_dir, 'posters.sqlite3'),
+            'MOVIE_TRANSLATION_CACHE': os.path.join(tmp_dir, 'translations.sqlite3'),
+            'MLCHAT_OCR_CACHE_PATH': os.path.join(tmp_dir, 'ocr.sqlite3'),
+        })
+    else:
+        os.environ.update({
+            'MOVIE_POSTER_CACHE': '',
+            'MOVIE_TRANSLATION_CACHE': '',
+            'MLCHAT_OCR_CACHE_PATH': '',
+            'MLCHAT_OCR_CACHE_SIZE': '0',
+            'MOVIE_RESULT_CACHE_TTL': '0',
+        })
+
+
+def setup_django(tmp_dir):
+    import django
+    django.setup()
+    from django.db import connections
+    from django.test.utils import setup_databases, setup_test_environment
+
+    setup_test_environment()
+    # a file rather than the default in-memory test database, so that
+    # --concurrency threads each get a working connection
+    connections['default'].settings_dict['TEST']['NAME'] = os.path.join(tmp_dir, 'bench.sqlite3')
+    return setup_databases(verbosity=0, interactive=False)
+
+
+class ChatClient:
+    """One browser session on the chat page, posting the way ``static/js/main.js`` does."""
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client()
+        self.last_seq = 0
+        self.requests = 0
+
+    def _send(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        response = method(*args, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.requests += 1
+        if response.status_code != 200:
+            raise RuntimeError(f"{args[0]} answered {response.status_code}")
+        return response, elapsed
+
+    def post(self, **data):
+        response, elapsed = self._send(self.client.post, '/', dict(data, last_seq=self.last_seq), **AJAX)
+        body = response.json()
+        self.last_seq = body.get('last_seq', self.last_seq)
+        return body, elapsed
+
+    def get(self, path, **params):
+        return self._send(self.client.get, path, params)
+
+    def post_json(self, path, payload):
+        response, elapsed = self._send(self.client.post, path, json.dumps(payload), content_type='application/json')
+        return response.json(), elapsed
+
+
+def last_bot_text(body):
+    messages = body.get('messages') or [(None,) + tuple(m) for m in body.get('chat_history', [])]
+    texts = [m[2] for m in messages if m[1] == 'bot']
+    return texts[-1] if texts else ''
+
+
+def pick_queries(movie, rng, count):
+    """Titles with exactly one match (the similarity path) and typos of them that only the fuzzy matcher finds."""
+    titles, typos = [], []
+    candidates = movie.get_all_titles()
+    rng.shuffle(candidates)
+    for title in candidates:
+        query = title.lower()
+        if len(query) < 6 or len(movie.tags_index.search(query, limit=1)):
+            continue
+        if len(movie.title_index.search(query, limit=2)) != 1:
+            continue
+        cut = rng.randrange(1, len(query) - 1)
+        typo = query[:cut] + query[cut + 1:]
+        if len(movie.tags_index.search(typo, limit=1)) or len(movie.title_index.search(typo, limit=1)):
+            continue
+        titles.append(title)
+        typos.append(typo)
+        if len(titles) >= count:
+            break
+    return titles, typos
+
+
+def upload(data):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    return SimpleUploadedFile('report.jpg', data, content_type='image/jpeg')
+
+
+def build_scenarios(handler, records, images, titles, typos):
+    from models.diabetes_prediction.ml_model import DiabetesModel
+
+    def pick(items, i):
+        return items[i % len(items)]
+
+    def chat_page(i):
+        chat = ChatClient()
+        chat.post(model='movie')
+        chat.post(user_input=pick(titles, i))
+        _, elapsed = chat.get('/')
+        return [elapsed], chat.requests
+
+    def chat_diabetes_manual(i):
+        chat = ChatClient()
+        record = pick(records, i)
+        latencies = [chat.post(model='diabetes')[1], chat.post(user_input='2')[1]]
+        for field in DiabetesModel.REQUIRED_FIELDS:
+            body, elapsed = chat.post(user_input=str(record[field]))
+            latencies.append(elapsed)
+        if 'دیابت' not in last_bot_text(body):
+            raise RuntimeError(f"manual entry did not end in a prediction: {last_bot_text(body)!r}")
+        return latencies, chat.requests
+
+    def chat_diabetes_image(i):
+        chat = ChatClient()
+        chat.post(model='diabetes')
+        chat.post(user_input='1')
+        body, elapsed = chat.post(test_image=upload(pick(images, i)))
+        if 'دیابت' not in last_bot_text(body):
+            raise RuntimeError(f"image upload did not end in a prediction: {last_bot_text(body)!r}")
+        return [elapsed], chat.requests
+
+    def chat_movie(query_of):
+        def flow(i):
+            chat = ChatClient()
+            chat.post(model='movie')
+            _, elapsed = chat.post(user_input=query_of(i))
+            return [elapsed], chat.requests
+        return flow
+
+    def chat_movie_confirm(i):
+        chat = ChatClient()
+        chat.post(model='movie')
+        chat.post(user_input=pick(typos, i))
+        body, elapsed = chat.post(user_input='1')
+        return [elapsed], chat.requests
+
+    def api_send_message(i):
+        chat = ChatClient()
+        body, elapsed = chat.post_json('/api/send-message/', {'model': 'movie', 'message': pick(titles, i)})
+        if body['result'].get('status') != 'success':
+            raise RuntimeError(f"send-message failed: {body}")
+        return [elapsed], chat.requests
+
+    def api_movie_stream(i):
+        chat = ChatClient()
+        chat.post(model='movie')
+        # the turn is posted, then the posters stream from the URL it returns
+        start = time.perf_counter()
+        started = chat.client.post('/api/movie/stream/', {'q': pick(titles, i), 'last_seq': chat.last_seq}, **AJAX)
+        if 'stream' not in started.json():
+            raise RuntimeError(f"no stream started: {started.json()}")
+        response = chat.client.get(started.json()['stream'])
+        payload = b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - start) * 1000
+        if b'event: done' not in payload:
+            raise RuntimeError("stream ended without a done event")
+        return [elapsed], chat.requests + 2
+
+    def direct(fn):
+        def flow(i):
+            start = time.perf_counter()
+            result = fn(i)
+            elapsed = (time.perf_counter() - start) * 1000
+            if result.get('status') not in ('success', 'need_confirmation'):
+                raise RuntimeError(f"unexpected result: {result}")
+            return [elapsed], 1
+        return flow
+
+    return {
+        'chat: page load': chat_page,
+        'chat: diabetes manual': chat_diabetes_manual,
+        'chat: diabetes image': chat_diabetes_image,
+        'chat: movie title': chat_movie(lambda i: pick(titles, i)),
+        'chat: movie genre': chat_movie(lambda i: pick(GENRES, i)),
+        'chat: movie fuzzy': chat_movie(lambda i: pick(typos, i)),
+        'chat: movie confirm': chat_movie_confirm,
+        'api: send-message': api_send_message,
+        'api: movie stream': api_movie_stream,
+        'handler: diabetes form': direct(lambda i: handler.predict('diabetes', pick(records, i))),
+        'handler: diabetes image': direct(lambda i: handler.predict('diabetes', {'image': io.BytesIO(pick(images, i))})),
+        'handler: movie title': direct(lambda i: handler.predict('movie', {'title': pick(titles, i)})),
+        'handler: movie genre': direct(lambda i: handler.predict('movie', {'title': pick(GENRES, i)})),
+        'handler: movie fuzzy': direct(lambda i: handler.predict('movie', {'title': pick(typos, i)})),
+    }
+
+
+def run_scenario(flow, iterations, concurrency):
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(flow, range(iterations)))
+    else:
+        results = [flow(i) for i in range(iterations)]
+    wall = time.perf_counter() - start
+
+    stats = summarize([ms for latencies, _ in results for ms in latencies])
+    requests = sum(n for _, n in results)
+    stats.update({'requests': requests, 'wall_s': wall, 'throughput_rps': requests / wall,
+                  'peak_rss_mb': peak_rss_mb()})
+    return stats
+
+
+def print_results(results):
+    print(f"{'scenario':<26}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>9}{'RSS MB':>9}  (ms)")
+    for name, stats in results.items():
+        rss = stats['peak_rss_mb']
+        print(f"{name:<26}{stats['count']:>6}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['throughput_rps']:>9.1f}{rss if rss is not None else 0:>9.0f}")
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nvs. {baseline_path} ({baseline.get('meta', {}).get('commit', '?')}): p50 / p95 change")
+    for name, stats in results.items():
+        old = baseline.get('scenarios', {}).get(name)
+        if not old or not old.get('count'):
+            print(f"{name:<26}{'(new)':>12}")
+            continue
+        changes = [(stats[k] - old[k]) / old[k] * 100 if old[k] else 0.0 for k in ('p50_ms', 'p95_ms')]
+        print(f"{name:<26}{changes[0]:>+11.1f}%{changes[1]:>+11.1f}%")
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20, help="flows per scenario")
+    parser.add_argument('--concurrency', type=int, default=1, help="flows run in parallel threads")
+    parser.add_argument('--scenarios', default='', help="comma-separated name prefixes, e.g. 'chat: movie,handler'")
+    parser.add_argument('--tmdb-latency-ms', type=float, default=50)
+    parser.add_argument('--translate-latency-ms', type=float, default=80)
+    parser.add_argument('--ocr-latency-ms', type=float, default=400)
+    parser.add_argument('--warm-caches', action='store_true',
+                        help="keep the poster/translation/OCR/result caches on (temporary files)")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    parser.add_argument('--compare', default=None, help="an earlier --json file to compare against")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    server, tmdb_url = start_fake_tmdb(latency_ms=args.tmdb_latency_ms, missing_every=10)
+    tmp = tempfile.TemporaryDirectory()
+    configure_env(args, tmp.name, tmdb_url)
+    old_config = setup_django(tmp.name)
+    try:
+        from benchmarks.bench_ocr import random_features, render_report
+        from chatbot.views import handler
+
+        records = [random_features(rng) for _ in range(8)]
+        report = records[0]
+        stub_tesseract('\n'.join(f"{field}: {value}" for field, value in report.items()), args.ocr_latency_ms)
+        # distinct photos, so a warm OCR cache only helps from the second round on
+        images = [render_report(record, rng, size=(1240, 1754)) for record in records]
+
+        start = time.perf_counter()
+        movie = handler.models['movie']
+        load_ms = (time.perf_counter() - start) * 1000
+        handler.models['diabetes']
+        movie.translator_fa_to_en = StubTranslator('en', args.translate_latency_ms)
+        movie.translator_en_to_fa = StubTranslator('fa', args.translate_latency_ms)
+        titles, typos = pick_queries(movie, rng, max(args.iterations, 1))
+
+        scenarios = build_scenarios(handler, records, images, titles, typos)
+        prefixes = [p.strip() for p in args.scenarios.split(',') if p.strip()]
+        if prefixes:
+            scenarios = {name: flow for name, flow in scenarios.items() if name.startswith(tuple(prefixes))}
+
+        results = {}
+        for name, flow in scenarios.items():
+            results[name] = run_scenario(flow, args.iterations, args.concurrency)
+    finally:
+        from django.test.utils import teardown_databases
+        teardown_databases(old_config, verbosity=0)
+        server.shutdown()
+        tmp.cleanup()
+
+    print(f"{args.iterations} flows per scenario, concurrency {args.concurrency}, "
+          f"stub latency TMDB {args.tmdb_latency_ms:.0f} / translate {args.translate_latency_ms:.0f} / "
+          f"OCR {args.ocr_latency_ms:.0f} ms, caches {'on' if args.warm_caches else 'off'}")
+    print_results(results)
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    write_json(args.json, {
+        'meta': {
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': sys.version.split()[0],
+            'args': vars(args),
+            'movie_model_load_ms': load_ms,
+        },
+        'scenarios': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
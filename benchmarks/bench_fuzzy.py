@@ -0,0 +1,83 @@
+"""Fuzzy title matching: FuzzyTitleMatcher vs. the old difflib.get_close_matches path.
+
+    python -m benchmarks.bench_fuzzy [--queries 300] [--json out.json]
+"""
+import argparse
+import random
+from difflib import get_close_matches
+from benchmarks.common import load_titles, print_table, summarize, time_calls, write_json
+from models.movie_recommender.fuzzy import FuzzyTitleMatcher
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz '
+
+
+def make_typo(title: str, rng: random.Random, edits: int) -> str:
+    chars = list(title.lower())
+    for _ in range(edits):
+        op = rng.choice('sdit')
+        i = rng.randrange(len(chars)) if chars else 0
+        if op == 's' and chars:
+            chars[i] = rng.choice(ALPHABET)
+        elif op == 'd' and len(chars) > 1:
+            del chars[i]
+        elif op == 'i':
+            chars.insert(i, rng.choice(ALPHABET))
+        elif op == 't' and i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+
+def difflib_path(titles_lower, query, n=5, cutoff=0.4):
+    close = get_close_matches(query, titles_lower, n=n, cutoff=cutoff)
+    return [titles_lower.index(c) for c in close]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--cutoff', type=float, default=0.4)
+    parser.add_argument('--candidates', type=int, default=64,
+                        help="FuzzyTitleMatcher.max_candidates, the titles scored before the bound prunes the rest")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    titles = load_titles()
+    titles_lower = [t.lower() for t in titles]
+    rng = random.Random(args.seed)
+    queries = [make_typo(rng.choice(titles), rng, rng.randint(1, 3)) for _ in range(args.queries)]
+
+    matcher = FuzzyTitleMatcher(titles, cutoff=args.cutoff, max_candidates=args.candidates)
+
+    results = {
+        'difflib.get_close_matches': summarize(
+            time_calls(lambda q: difflib_path(titles_lower, q, cutoff=args.cutoff), queries)),
+        'FuzzyTitleMatcher.match': summarize(
+            time_calls(lambda q: matcher.match(q, cutoff=args.cutoff), queries)),
+    }
+
+    # agreement: same best title, and how much of difflib's top-5 we also return
+    top1_agree = 0
+    overlap = 0
+    expected = 0
+    for q in queries:
+        old = [titles_lower[i] for i in difflib_path(titles_lower, q, cutoff=args.cutoff)]
+        new = [titles_lower[i] for i, _ in matcher.match(q, cutoff=args.cutoff)]
+        if old[:1] == new[:1]:
+            top1_agree += 1
+        overlap += len(set(old) & set(new))
+        expected += len(set(old))
+
+    print(f"{len(titles)} titles, {len(queries)} typo queries, cutoff={args.cutoff}, candidates={args.candidates}")
+    print_table(results)
+    quality = {
+        'top1_agreement': top1_agree / len(queries),
+        'top5_recall_vs_difflib': overlap / expected if expected else 1.0,
+    }
+    print(f"top-1 agreement with difflib: {quality['top1_agreement']:.1%}, "
+          f"recall of difflib's top-5: {quality['top5_recall_vs_difflib']:.1%}")
+    write_json(args.json, {'latency': results, 'quality': quality})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Catalog updates: appending movies as a new release vs. rebuilding every artifact.
+
+    python -m benchmarks.bench_ingest [--batches 1,10,100] [--json out.json]
+
+Works on a copy of the movie artifacts in a temporary directory. "ingest"
+is models.movie_recommender.ingest (only the added movies' similarities,
+indexes extended in place); "full rebuild" refits the tag vectorizer,
+recomputes the whole cosine matrix and neighbour table and rebuilds the
+bundle, as regenerating similarity.pkl offline did. The added movies
+reuse existing tags with new ids and titles.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from benchmarks.common import MOVIE_DIR, write_json
+from models.movie_recommender.bundle import BUNDLE_DIR, MovieBundle
+from models.movie_recommender.catalog import MovieCatalog
+from models.movie_recommender.embedding_store import EMBEDDING_DIR
+from models.movie_recommender.ingest import ingest
+from models.movie_recommender.releases import artifact_dir
+from models.movie_recommender.similarity_store import (
+    NEIGHBORS_IDX_NPY, NEIGHBORS_JSON, NEIGHBORS_SCORE_NPY, SIMILARITY_NPY, build_neighbors, save_neighbors,
+)
+
+ARTIFACTS = ['dict_mov.pkl', SIMILARITY_NPY, NEIGHBORS_IDX_NPY, NEIGHBORS_SCORE_NPY, NEIGHBORS_JSON, BUNDLE_DIR,
+             EMBEDDING_DIR]
+
+
+def copy_artifacts(dst):
+    for name in ARTIFACTS:
+        src = os.path.join(MOVIE_DIR, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(dst, name))
+        elif os.path.exists(src):
+            shutil.copy(src, dst)
+
+
+def full_rebuild(catalog, out_dir):
+    vectors = CountVectorizer(max_features=5000, stop_words='english').fit_transform(catalog.tags)
+    matrix = cosine_similarity(vectors).astype(np.float32)
+    np.save(os.path.join(out_dir, SIMILARITY_NPY), matrix)
+    save_neighbors(out_dir, *build_neighbors(matrix), matrix)
+    MovieBundle.from_catalog(catalog).save(os.path.join(out_dir, BUNDLE_DIR))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', default='1,10,100', help="comma-separated numbers of movies added at once")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    catalog = MovieCatalog.load(os.path.join(MOVIE_DIR, 'dict_mov.pkl'))
+    rng = np.random.default_rng(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = os.path.join(tmp, 'movies')
+        os.makedirs(base_dir)
+        copy_artifacts(base_dir)
+        next_id = int(catalog.ids.max()) + 1
+        for size in [int(n) for n in args.batches.split(',')]:
+            movies = []
+            for row in rng.choice(len(catalog), size, replace=False).tolist():
+                movies.append({'id': next_id, 'title': f'{catalog.titles[row]} (bench {next_id})', 'tags': catalog.tags[row]})
+                next_id += 1
+            summary = ingest(movies, base_dir, keep=1)
+
+            current = MovieCatalog.load(os.path.join(artifact_dir(base_dir), 'dict_mov.pkl'))
+            rebuild_dir = os.path.join(tmp, 'rebuild')
+            os.makedirs(rebuild_dir, exist_ok=True)
+            start = time.perf_counter()
+            full_rebuild(current, rebuild_dir)
+            rebuild_s = time.perf_counter() - start
+            results[f'+{size}'] = {'movies': summary['movies'], 'ingest_s': summary['seconds'], 'full_rebuild_s': rebuild_s}
+
+    print(f"{'added':<8}{'movies':>8}{'ingest':>10}{'rebuild':>10}  (s)")
+    for name, r in results.items():
+        print(f"{name:<8}{r['movies']:>8}{r['ingest_s']:>10.2f}{r['full_rebuild_s']:>10.2f}")
+    write_json(args.json, {'results': results})
+
+
+if __name__ == '__main__':
+    main()
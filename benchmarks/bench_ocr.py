@@ -0,0 +1,128 @@
+"""Lab-report OCR: raw vs. preprocessed vs. region-of-interest, on synthetic report photos.
+
+    python -m benchmarks.bench_ocr [--images 20] [--json out.json] [--save-images DIR]
+
+Needs a working Tesseract (set TESSERACT_CMD if it is not on PATH). Each image
+is a rendered report with the eight diabetes fields among unrelated lab
+values, photographed badly: large, slightly rotated, noisy and JPEG-compressed.
+Accuracy is the share of fields whose extracted value matches the rendered one.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import numpy as np
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+from benchmarks.common import print_table, summarize, time_calls, write_json
+from models.diabetes_prediction.ml_model import OCR_MODES, DiabetesModel, ocr_image_bytes
+
+LABELS = {
+    'Pregnancies': ['Pregnancies'],
+    'Glucose': ['Glucose', 'Fasting Glucose'],
+    'BloodPressure': ['BloodPressure', 'BP'],
+    'SkinThickness': ['SkinThickness', 'Skin Thickness'],
+    'Insulin': ['Insulin'],
+    'BMI': ['BMI', 'Body Mass Index'],
+    'DiabetesPedigreeFunction': ['DiabetesPedigreeFunction', 'Diabetes Pedigree'],
+    'Age': ['Age'],
+}
+
+DISTRACTORS = ['Hemoglobin {v:.1f} g/dL', 'Cholesterol {v:.0f} mg/dL', 'Triglycerides {v:.0f} mg/dL',
+               'Creatinine {v:.2f} mg/dL', 'WBC {v:.1f} x10^3/uL', 'Sample ID {v:.0f}']
+
+
+def random_features(rng):
+    return {
+        'Pregnancies': str(rng.randint(0, 10)),
+        'Glucose': str(rng.randint(70, 200)),
+        'BloodPressure': str(rng.randint(50, 110)),
+        'SkinThickness': str(rng.randint(5, 50)),
+        'Insulin': str(rng.randint(0, 300)),
+        'BMI': f"{rng.uniform(18, 45):.1f}",
+        'DiabetesPedigreeFunction': f"{rng.uniform(0.08, 2.4):.3f}",
+        'Age': str(rng.randint(21, 80)),
+    }
+
+
+def render_report(features, rng, size=(3000, 4000)):
+    image = Image.new('L', size, 245)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=64)
+    lines = [f"{rng.choice(LABELS[field])}: {value}" for field, value in features.items()]
+    lines += [d.format(v=rng.uniform(1, 400)) for d in rng.sample(DISTRACTORS, 4)]
+    rng.shuffle(lines)
+    lines = ['CITY MEDICAL LABORATORY', 'Patient: J. Doe    Date: 2024-05-01', ''] + lines
+
+    y = 260
+    for line in lines:
+        draw.text((220, y), line, fill=20, font=font)
+        y += 140
+
+    image = image.rotate(rng.uniform(-3, 3), resample=Image.BICUBIC, fillcolor=245)
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels += np.random.default_rng(rng.randrange(1 << 30)).normal(0, 12, pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=80)
+    return buf.getvalue()
+
+
+def field_matches(expected: str, got) -> bool:
+    try:
+        return abs(float(expected) - float(got)) < 1e-6
+    except (TypeError, ValueError):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--modes', default=','.join(OCR_MODES))
+    parser.add_argument('--save-images', default=None, help="also write the synthetic images to this directory")
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        print(f"Tesseract is not available ({e}); set TESSERACT_CMD.", file=sys.stderr)
+        return 1
+
+    rng = random.Random(args.seed)
+    samples = []
+    for i in range(args.images):
+        features = random_features(rng)
+        data = render_report(features, rng)
+        samples.append((features, data))
+        if args.save_images:
+            os.makedirs(args.save_images, exist_ok=True)
+            with open(os.path.join(args.save_images, f"report_{i:03d}.jpg"), 'wb') as f:
+                f.write(data)
+
+    model = DiabetesModel()
+    latency = {}
+    accuracy = {}
+    for mode in args.modes.split(','):
+        texts = []
+        latency[mode] = summarize(time_calls(lambda s: texts.append(ocr_image_bytes(s[1], mode=mode)), samples))
+        correct = total = 0
+        for (expected, _), text in zip(samples, texts):
+            found = model.extract_features_from_text(text)
+            correct += sum(field_matches(v, found.get(f)) for f, v in expected.items())
+            total += len(expected)
+        accuracy[mode] = correct / total
+
+    print(f"{args.images} synthetic reports")
+    print_table(latency)
+    for mode, acc in accuracy.items():
+        print(f"{mode:<28}field accuracy {acc:.1%}")
+    write_json(args.json, {'latency': latency, 'field_accuracy': accuracy})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Poster resolution for one recommendation (5 movies) against a local fake TMDB.
+
+    python -m benchmarks.bench_posters [--latency-ms 150] [--json out.json]
+
+Compares the old sequential ``requests.get`` loop with ``PosterFetcher`` on a
+cold and on a warm cache.
+"""
+import argparse
+import os
+import random
+import tempfile
+import requests
+from benchmarks.common import load_movies_dict, print_table, summarize, time_calls, write_json
+from benchmarks.fake_tmdb import start_fake_tmdb
+from models.movie_recommender.posters import PosterCache, PosterFetcher
+
+
+def sequential_fetch(base_url, movie_ids):
+    urls = []
+    for movie_id in movie_ids:
+        res = requests.get(f"{base_url}/movie/{movie_id}", params={'api_key': 'test', 'language': 'en-US'},
+                           timeout=5)
+        poster_path = res.json().get('poster_path')
+        urls.append(f"https://image.tmdb.org/t/p/w500/{poster_path}" if poster_path else None)
+    return urls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=150)
+    parser.add_argument('--requests', type=int, default=20, help="recommendations to resolve")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    ids = [int(i) for i in load_movies_dict()['id'].values()]
+    rng = random.Random(args.seed)
+    batches = [rng.sample(ids, 5) for _ in range(args.requests)]
+
+    server, base_url = start_fake_tmdb(latency_ms=args.latency_ms, missing_every=10)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            fetcher = PosterFetcher('test', base_url=base_url,
+                                    cache=PosterCache(os.path.join(tmp, 'posters.sqlite3')))
+            results = {
+                'sequential requests.get': summarize(time_calls(lambda b: sequential_fetch(base_url, b), batches)),
+                'PosterFetcher (cold cache)': summarize(time_calls(fetcher.fetch_many, batches)),
+                'PosterFetcher (warm cache)': summarize(time_calls(fetcher.fetch_many, batches)),
+            }
+    finally:
+        server.shutdown()
+
+    print(f"{args.requests} recommendations x 5 posters, upstream latency {args.latency_ms:.0f} ms")
+    print_table(results)
+    write_json(args.json, {'latency': results, 'upstream_latency_ms': args.latency_ms})
+
+
+if __name__ == '__main__':
+    main()
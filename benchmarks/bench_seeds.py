@@ -0,0 +1,60 @@
+"""Multi-seed recommendations: one blended reduction vs. a Python loop over the seed rows.
+
+    python -m benchmarks.bench_seeds [--requests 200] [--json out.json]
+
+"per-seed loop" reads each seed's similarity row separately, adds them up
+and sorts the whole score vector, as N single-title calls would;
+"blended_top_k" gathers the rows at once, reduces them with one
+matrix-vector product and takes the top 5 with argpartition. Both exclude
+the seeds and their already-shown neighbours, and must return equally scored movies.
+"""
+import argparse
+import numpy as np
+from benchmarks.common import MOVIE_DIR, print_table, summarize, time_calls, write_json
+from models.movie_recommender.similarity_store import SimilarityStore
+
+
+def per_seed_loop(store, positions, k=5):
+    scores = np.zeros(len(store), dtype=np.float32)
+    exclude = []
+    for pos in positions:
+        scores += store.row(pos)
+        exclude.extend(store.top_k(pos, 5)[0].tolist())
+    scores /= len(positions)
+    scores[list(positions)] = -np.inf
+    scores[exclude] = -np.inf
+    return np.argsort(-scores, kind='stable')[:k]
+
+
+def blended(store, positions, k=5):
+    return store.blended_top_k(positions, k, exclude=store.neighbors_of(positions, 5))[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seeds', default='1,3,5,10,20', help="comma-separated seed counts")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    store = SimilarityStore.load(MOVIE_DIR)
+    rng = np.random.default_rng(args.seed)
+    results = {}
+    for n_seeds in [int(n) for n in args.seeds.split(',')]:
+        requests = [rng.choice(len(store), n_seeds, replace=False) for _ in range(args.requests)]
+        for positions in requests[:20]:
+            # ties and float32 summation order may pick different but equally scored movies
+            mean = np.asarray(store.matrix[np.sort(positions)], dtype=np.float64).mean(axis=0)
+            assert np.allclose(np.sort(mean[per_seed_loop(store, positions)]),
+                               np.sort(mean[blended(store, positions)]), atol=1e-5)
+        results[f'{n_seeds} seeds: per-seed loop'] = summarize(time_calls(lambda p: per_seed_loop(store, p), requests))
+        results[f'{n_seeds} seeds: blended_top_k'] = summarize(time_calls(lambda p: blended(store, p), requests))
+
+    print(f"{len(store)} movies, {args.requests} requests per seed count, top 5")
+    print_table(results)
+    write_json(args.json, {'latency': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Process start-up: MovieRecommender from the movie bundle vs. from dict_mov.pkl.
+
+    python -m models.movie_recommender.bundle          # build the bundle first
+    python -m benchmarks.bench_startup [--runs 5] [--json out.json]
+
+Every run is a fresh interpreter, so nothing is shared between runs but the
+OS page cache. "pickle" unpickles dict_mov.pkl and builds the substring and
+fuzzy indexes, "bundle" memory-maps the precomputed arrays. Times cover the
+MovieRecommender constructor only, not the imports.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks.common import MOVIE_DIR, REPO_DIR, peak_rss_mb, print_table, summarize, write_json
+from models.movie_recommender.bundle import BUNDLE_DIR, bundle_manifest
+
+MODES = ('pickle', 'bundle')
+
+
+def child(mode):
+    if mode == 'pickle':
+        os.environ['MOVIE_BUNDLE'] = ''
+    from models.movie_recommender.ml_model import MovieRecommender
+
+    start = time.perf_counter()
+    recommender = MovieRecommender()
+    elapsed = (time.perf_counter() - start) * 1000
+    if mode == 'bundle' and not recommender.bundle_manifest:
+        raise SystemExit("no bundle loaded")
+    print(json.dumps({'init_ms': elapsed, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def run(mode):
+    env = dict(os.environ, MOVIE_TRANSLATION_OFFLINE='1', TMDB_API_KEY='', PYTHONPATH=REPO_DIR)
+    out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', mode],
+                         cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child)
+        return
+
+    if not os.path.exists(bundle_manifest(os.path.join(MOVIE_DIR, BUNDLE_DIR))):
+        parser.error("no movie bundle; run `python -m models.movie_recommender.bundle` first")
+
+    runs = {mode: [run(mode) for _ in range(args.runs)] for mode in MODES}
+    results = {mode: summarize([r['init_ms'] for r in samples]) for mode, samples in runs.items()}
+    rss = {mode: max((r['peak_rss_mb'] or 0) for r in samples) for mode, samples in runs.items()}
+
+    print(f"{args.runs} fresh processes per mode, MovieRecommender() time")
+    print_table(results)
+    for mode in MODES:
+        print(f"{mode:<28}peak RSS {rss[mode]:.1f} MB")
+    write_json(args.json, {'init': results, 'peak_rss_mb': rss, 'runs': runs})
+
+
+if __name__ == '__main__':
+    main()
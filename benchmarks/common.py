@@ -0,0 +1,76 @@
+import json
+import os
+import pickle
+import sys
+import time
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOVIE_DIR = os.path.join(REPO_DIR, 'models', 'movie_recommender')
+
+
+def load_movies_dict():
+    with open(os.path.join(MOVIE_DIR, 'dict_mov.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+def load_titles():
+    return [str(t) for t in load_movies_dict()['title'].values()]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or ``None`` where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def time_calls(fn, inputs, repeat: int = 1):
+    """Call ``fn`` on every input ``repeat`` times; returns per-call latencies in ms."""
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies_ms):
+    arr = np.asarray(latencies_ms, dtype=np.float64)
+    if len(arr) == 0:
+        return {'count': 0}
+    return {
+        'count': int(len(arr)),
+        'mean_ms': float(arr.mean()),
+        'p50_ms': float(np.percentile(arr, 50)),
+        'p95_ms': float(np.percentile(arr, 95)),
+        'p99_ms': float(np.percentile(arr, 99)),
+        'max_ms': float(arr.max()),
+    }
+
+
+def print_table(rows):
+    """Print ``{name: summarize(...)}`` as an aligned table."""
+    print(f"{'path':<28}{'n':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for name, stats in rows.items():
+        if not stats.get('count'):
+            print(f"{name:<28}{0:>7}")
+            continue
+        print(f"{name:<28}{stats['count']:>7}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}"
+              f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+
+def write_json(path, payload):
+    if not path:
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    print(f"results written to {path}")
@@ -0,0 +1,73 @@
+"""Local stand-in for the TMDB movie endpoint.
+
+    python -m benchmarks.fake_tmdb --port 8765 --latency-ms 150
+    export TMDB_API_KEY=test TMDB_API_BASE=http://127.0.0.1:8765/3
+
+``GET /3/movie/<id>`` answers after ``--latency-ms`` with a fake poster path;
+ids divisible by ``--missing-every`` have no poster, so negative caching can
+be exercised too.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTMDBHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    missing_every = 0
+
+    def do_GET(self):
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        if len(parts) != 3 or parts[:2] != ['3', 'movie'] or not parts[2].isdigit():
+            self._send(404, {'status_message': 'not found'})
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        movie_id = int(parts[2])
+        poster_path = None
+        if not self.missing_every or movie_id % self.missing_every:
+            poster_path = f"/fake/{movie_id}.jpg"
+        self._send(200, {'id': movie_id, 'poster_path': poster_path})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_tmdb(port: int = 0, latency_ms: float = 0, missing_every: int = 0):
+    """Serve in a daemon thread; returns ``(server, base_url)``. Call ``server.shutdown()`` when done."""
+    handler = type('ConfiguredFakeTMDBHandler', (FakeTMDBHandler,),
+                   {'latency': latency_ms / 1000.0, 'missing_every': missing_every})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/3"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake TMDB movie endpoint for offline runs.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--missing-every', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server, base_url = start_fake_tmdb(args.port, args.latency_ms, args.missing_every)
+    print(f"fake TMDB listening on {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
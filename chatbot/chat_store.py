@@ -0,0 +1,110 @@
+import os
+import uuid
+from django.db import IntegrityError, transaction
+from .models import ChatMessage
+
+# how many of the latest messages a page load renders; older ones are fetched on demand
+HISTORY_WINDOW = int(os.environ.get('MLCHAT_HISTORY_WINDOW', '50'))
+
+
+class Conversation:
+    """Append-only message log of one chat, kept as ``ChatMessage`` rows.
+
+    Messages added with ``append`` are buffered and written by ``save`` as
+    new rows numbered on from the last stored sequence number, so a turn
+    costs one insert of its own messages however long the chat already is.
+    The session only carries the conversation id.
+    """
+
+    SESSION_KEY = 'conversation_id'
+
+    def __init__(self, conversation_id: str):
+        self.id = conversation_id
+        self._pending = []
+        self._last = None
+        self._last_seq = None
+
+    @classmethod
+    def for_session(cls, session):
+        conversation_id = session.get(cls.SESSION_KEY)
+        if not conversation_id:
+            conversation_id = uuid.uuid4().hex
+            session[cls.SESSION_KEY] = conversation_id
+        conversation = cls(conversation_id)
+
+        # sessions from before the message store kept the whole history in the cookie-backed blob
+        legacy = session.pop('chat_history', None)
+        if legacy:
+            for sender, message in legacy:
+                conversation.append(sender, message)
+            conversation.save()
+        return conversation
+
+    def _load_last(self):
+        row = (ChatMessage.objects.filter(conversation=self.id)
+               .order_by('-seq').values_list('seq', 'sender', 'text').first())
+        if row is None:
+            self._last_seq, self._last = 0, None
+        else:
+            self._last_seq, self._last = row[0], (row[1], row[2])
+
+    def last(self):
+        """``(sender, text)`` of the most recent message, including unsaved ones, or ``None``."""
+        if self._pending:
+            return self._pending[-1]
+        if self._last_seq is None:
+            self._load_last()
+        return self._last
+
+    def append(self, sender: str, text: str):
+        self._pending.append((sender, text))
+
+    @property
+    def last_seq(self) -> int:
+        if self._last_seq is None:
+            self._load_last()
+        return self._last_seq
+
+    def save(self):
+        if not self._pending:
+            return
+        for attempt in range(3):
+            start = self.last_seq
+            rows = [ChatMessage(conversation=self.id, seq=start + i + 1, sender=sender, text=text)
+                    for i, (sender, text) in enumerate(self._pending)]
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create(rows)
+            except IntegrityError:
+                # another request of the same chat got these numbers first
+                if attempt == 2:
+                    raise
+                self._load_last()
+                continue
+            self._last_seq, self._last = rows[-1].seq, self._pending[-1]
+            self._pending = []
+            return
+
+    def window(self, limit: int = HISTORY_WINDOW, before: int = None):
+        """Up to ``limit`` saved messages as ``(seq, sender, text)``, oldest first, ending before ``before``."""
+        rows = ChatMessage.objects.filter(conversation=self.id)
+        if before is not None:
+            rows = rows.filter(seq__lt=before)
+        rows = list(rows.order_by('-seq').values_list('seq', 'sender', 'text')[:limit])
+        rows.reverse()
+        return rows
+
+    def since(self, seq: int, limit: int = None):
+        """Saved messages after ``seq`` as ``(seq, sender, text)``, oldest first."""
+        rows = ChatMessage.objects.filter(conversation=self.id, seq__gt=seq).order_by('seq')
+        if limit is not None:
+            rows = rows[:limit]
+        return list(rows.values_list('seq', 'sender', 'text'))
+
+    def etag(self) -> str:
+        return f'"{self.id}:{self.last_seq}"'
+
+    def clear(self):
+        ChatMessage.objects.filter(conversation=self.id).delete()
+        self._pending = []
+        self._last_seq, self._last = 0, None
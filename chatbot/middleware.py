@@ -0,0 +1,60 @@
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from models.metrics import HTTP_SECONDS, collect_timings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimingMiddleware:
+    """Times every request into ``mlchat_http_request_seconds`` and logs one line per request
+    with the model stages it ran (``models.metrics.stage``).
+
+    With ``DEBUG`` on, the stage breakdown is also sent as a ``Server-Timing``
+    header, which the browser's network panel shows.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            response = self.get_response(request)
+        return self._finish(request, response, start, timings)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            response = await self.get_response(request)
+        return self._finish(request, response, start, timings)
+
+    def _finish(self, request, response, start, timings):
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'other'
+        HTTP_SECONDS.observe(elapsed, view, request.method, str(response.status_code))
+
+        stages = {}
+        for name, seconds in timings:
+            stages[name] = stages.get(name, 0.0) + seconds * 1000
+        logger.info("request", extra={
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 2),
+            'stages': {name: round(ms, 2) for name, ms in stages.items()},
+        })
+        if settings.DEBUG:
+            response['Server-Timing'] = ', '.join(
+                [f'{name.replace(".", "-")};dur={ms:.1f}' for name, ms in stages.items()]
+                + [f'total;dur={elapsed * 1000:.1f}'])
+        return response
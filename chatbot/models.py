@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class ChatMessage(models.Model):
+    """One message of a conversation; rows are only ever appended (or deleted with the whole chat)."""
+    conversation = models.CharField(max_length=32)
+    seq = models.PositiveIntegerField()
+    sender = models.CharField(max_length=10)
+    text = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['conversation', 'seq']
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='chatmessage_conversation_seq'),
+        ]
+
+    def __str__(self):
+        return f"{self.conversation}#{self.seq} {self.sender}: {self.text[:40]}"
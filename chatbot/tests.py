@@ -0,0 +1,59 @@
+from unittest import mock
+from django.db import IntegrityError
+from django.test import TestCase
+from .chat_store import Conversation
+from .models import ChatMessage
+
+
+class ConversationTests(TestCase):
+    def test_seq_continues_across_saves_and_instances(self):
+        chat = Conversation('c1')
+        chat.append('user', 'hi')
+        chat.append('bot', 'hello')
+        chat.save()
+        chat.append('user', 'again')
+        chat.save()
+
+        reopened = Conversation('c1')
+        self.assertEqual(reopened.last_seq, 3)
+        self.assertEqual(reopened.last(), ('user', 'again'))
+        reopened.append('bot', 'ok')
+        reopened.save()
+        self.assertEqual([seq for seq, _, _ in reopened.window()], [1, 2, 3, 4])
+        self.assertEqual(reopened.since(2), [(3, 'user', 'again'), (4, 'bot', 'ok')])
+        self.assertEqual(Conversation('other').last_seq, 0)
+
+    def test_concurrent_save_retries_with_next_numbers(self):
+        first, second = Conversation('c2'), Conversation('c2')
+        self.assertEqual(second.last_seq, 0)  # second now holds a stale last_seq
+        first.append('user', 'from first')
+        first.save()
+
+        second.append('user', 'from second')
+        second.append('bot', 'reply')
+        second.save()
+        self.assertEqual(second.last_seq, 3)
+        self.assertEqual(list(ChatMessage.objects.filter(conversation='c2').values_list('seq', 'text')),
+                         [(1, 'from first'), (2, 'from second'), (3, 'reply')])
+
+    def test_save_gives_up_after_three_conflicts(self):
+        chat = Conversation('c3')
+        chat.append('user', 'hi')
+        with mock.patch.object(ChatMessage.objects, 'bulk_create', side_effect=IntegrityError) as bulk_create:
+            with self.assertRaises(IntegrityError):
+                chat.save()
+        self.assertEqual(bulk_create.call_count, 3)
+        # the message stays pending for the next attempt
+        self.assertEqual(chat.last(), ('user', 'hi'))
+        chat.save()
+        self.assertEqual(chat.last_seq, 1)
+
+    def test_clear_restarts_numbering(self):
+        chat = Conversation('c4')
+        chat.append('user', 'hi')
+        chat.save()
+        chat.clear()
+        self.assertIsNone(chat.last())
+        chat.append('user', 'new')
+        chat.save()
+        self.assertEqual(chat.window(), [(1, 'user', 'new')])
@@ -1,8 +1,15 @@
-from django.urls import path
-from .views import *
-
-urlpatterns = [
-    path('', chat_view, name='chat_view'),
-    path('api/send-message/', api_send_message, name='api_send_message'),
-    path('api/clear-history/', clear_chat_history, name='clear_history'),
-]
+from django.urls import path
+from .views import *
+
+urlpatterns = [
+    path('', chat_view, name='chat_view'),
+    path('api/send-message/', api_send_message, name='api_send_message'),
+    path('api/movie/stream/', api_stream_movie, name='api_stream_movie'),
+    path('api/movie/for-you/', api_movie_for_you, name='api_movie_for_you'),
+    path('api/movie/ingest/', api_movie_ingest, name='api_movie_ingest'),
+    path('api/clear-history/', clear_chat_history, name='clear_history'),
+    path('api/history/', api_chat_history, name='api_chat_history'),
+    path('api/diabetes/predict-batch/', api_predict_diabetes_batch, name='api_predict_diabetes_batch'),
+    path('api/ocr-jobs/<str:job_id>/', api_ocr_job_status, name='api_ocr_job_status'),
+    path('metrics', metrics_view, name='metrics'),
+]
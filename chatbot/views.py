@@ -1,299 +1,663 @@
-from django.shortcuts import render
-from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
-import json
-from models.ml_handler import MLModelHandler
-from models.diabetes_prediction.ml_model import DiabetesModel
-from .forms import *
-
-handler = MLModelHandler()
-
-
-def append_message(chat_history, sender, message):
-    if not message:
-        return
-    last = chat_history[-1] if chat_history else None
-    candidate = (sender, message)
-    if last == candidate:
-        return
-    chat_history.append(candidate)
-
-
-def to_english_digits(s: str) -> str:
-    if not isinstance(s, str):
-        return s
-    persian = '۰۱۲۳۴۵۶۷۸۹'
-    english = '0123456789'
-    for p, e in zip(persian, english):
-        s = s.replace(p, e)
-    return s.strip()
-
-
-def process_user_post(request, chat_history, diabetes_state, selected_model):
-    context_updates = {}
-
-    is_user_input_present = bool(request.POST.get('user_input', '').strip())
-    is_file_present = 'test_image' in request.FILES and request.FILES.get('test_image') is not None
-
-    if 'model' in request.POST and not is_user_input_present and not is_file_present:
-        selected_model = request.POST.get('model')
-        request.session['selected_model'] = selected_model
-
-        if selected_model == 'diabetes':
-            append_message(chat_history, 'bot', 'شما مدل دیابت را انتخاب کردید. لطفاً یکی از گزینه‌های زیر را انتخاب کنید:')
-            append_message(chat_history, 'bot', '1. آپلود تصویر آزمایش')
-            append_message(chat_history, 'bot', '2. پر کردن اطلاعات به صورت دستی')
-            diabetes_state['current_step'] = 'awaiting_choice'
-        else:
-            append_message(chat_history, 'bot', 'شما مدل فیلم را انتخاب کردید. لطفا نام فیلم یا ژانر را وارد کنید (فارسی یا انگلیسی).')
-
-        context_updates['selected_model'] = selected_model
-        return context_updates
-
-    if selected_model == 'diabetes':
-        user_input = to_english_digits(request.POST.get('user_input', '').strip())
-
-        if diabetes_state.get('current_step') == 'awaiting_choice':
-            if user_input == '1':
-                append_message(chat_history, 'user', 'آپلود تصویر آزمایش')
-                append_message(chat_history, 'bot', 'لطفاً تصویر آزمایش خود را آپلود کنید.')
-                diabetes_state['current_step'] = 'awaiting_image'
-            elif user_input == '2':
-                append_message(chat_history, 'user', 'پر کردن اطلاعات دستی')
-                append_message(chat_history, 'bot', 'خب، اطلاعات را به صورت قدم به قدم وارد می‌کنیم.\n تعداد دفعات بارداری را وارد کنید. اگر مرد هستید یا تجربه بارداری ندارید، 0 وارد کنید:')
-                diabetes_state['current_step'] = 'collecting_data'
-                diabetes_state['collected_data'] = {}
-                diabetes_state['remaining_fields'] = DiabetesModel.REQUIRED_FIELDS.copy()
-                diabetes_state['current_field'] = diabetes_state['remaining_fields'].pop(0)
-            else:
-                append_message(chat_history, 'bot', 'لطفاً عدد 1 یا 2 را وارد کنید.')
-
-        elif diabetes_state.get('current_step') == 'awaiting_image':
-            if 'test_image' in request.FILES:
-                upload_form = DiabetesUploadForm(request.POST, request.FILES)
-                if upload_form.is_valid():
-                    image = upload_form.cleaned_data['test_image']
-                    prediction = handler.predict('diabetes', {'image': image})
-                    append_message(chat_history, 'user', 'عکس آزمایش ارسال شد')
-                    if prediction.get('status') == 'success':
-                        append_message(chat_history, 'bot', f'{"متاسفانه باید بگم که شما دیابت دارید" if prediction.get("result") == 1 else "خوشبختانه شما دیابت ندارید"}')
-                    elif prediction.get('status') == 'incomplete':
-                        missing = prediction.get('missing_fields', [])
-                        append_message(chat_history, 'bot', f'برخی فیلدها از تصویر استخراج نشدند: {", ".join(missing)}. لطفاً آنها را وارد کنید یا تصویر بهتری ارسال کنید.')
-                    else:
-                        append_message(chat_history, 'bot', prediction.get('message', 'خطایی رخ داد.'))
-                    diabetes_state['current_step'] = None
-                else:
-                    append_message(chat_history, 'bot', 'فرم تصویر معتبر نیست. لطفاً دوباره تلاش کنید.')
-
-        elif diabetes_state.get('current_step') == 'collecting_data':
-            current_field = diabetes_state.get('current_field')
-            if not current_field:
-                append_message(chat_history, 'bot', 'خطا در وضعیت جمع‌آوری داده — لطفا دوباره شروع کنید.')
-                diabetes_state['current_step'] = None
-            else:
-                raw = request.POST.get('user_input', '').strip()
-                if raw:
-                    append_message(chat_history, 'user', raw)
-                try:
-                    if current_field in ['Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'Age']:
-                        val = int(to_english_digits(raw))
-                    else:
-                        val = float(to_english_digits(raw).replace(',', '.'))
-
-                    diabetes_state['collected_data'][current_field] = val
-
-                    if not diabetes_state.get('remaining_fields'):
-                        prediction = handler.predict('diabetes', diabetes_state['collected_data'])
-                        if prediction.get('status') == 'success':
-                            append_message(chat_history, 'bot', f'{"متاسفانه باید بهتون بگم که شما دیابت دارید" if prediction.get("result") == 1 else "تبریک میگم شما دیابت ندارید"}')
-                        else:
-                            append_message(chat_history, 'bot', prediction.get('message', 'خطا در پیش‌بینی'))
-                        diabetes_state['current_step'] = None
-                    else:
-                        next_field = diabetes_state['remaining_fields'].pop(0)
-                        diabetes_state['current_field'] = next_field
-                        field_messages = {
-                            'Pregnancies': 'تعداد دفعات بارداری را وارد کنید. اگر مرد هستید یا تجربه بارداری ندارید، 0 وارد کنید.',
-                            'Glucose': 'مقدار قند خون (mg/dL) را وارد کنید (قند خون طبیعی کمتر از 100 است).',
-                            'BloodPressure': 'فشار خون (mm Hg) خود را بنویسید (معمولاً حدود 80 است).',
-                            'SkinThickness': 'ضخامت چین پوستی (میلی‌متر) بدنتان را وارد کنید (معمولا ضخامت پوستی  2 میلی متر است).',
-                            'Insulin': 'مقدار انسولین (mu U/ml) بدنتان را ارسال کنید (برای یک انسان عادی، حدود 80 است).',
-                            'BMI': 'شاخص توده بدنی (BMI) را بنویسید (اگر نمی‌دانید: وزن (kg) ÷ (قد(m))²)',
-                            'DiabetesPedigreeFunction': (
-                                "شاخص سابقه خانوادگی دیابت:\n"
-                                "- اگر هیچ‌کس در خانواده مبتلا نیست: 0.0\n"
-                                "- اگر یکی‌دو نفر از اقوام نزدیک مبتلا هستند: حدود 0.5\n"
-                                "- اگر بیش از دو نفر مبتلا هستند: حدود 1.0\n"
-                                "- اگر بیشتر اعضای خانواده مبتلا هستند: نزدیک 2.0"
-                            ),
-                            'Age': 'چند سال عمر کیده اید؟'
-                        }
-                        append_message(chat_history, 'bot', field_messages.get(next_field, f'لطفاً مقدار {next_field} را وارد کنید:'))
-                except ValueError:
-                    append_message(chat_history, 'bot', 'لطفاً یک عدد معتبر وارد کنید.')
-
-        context_updates['diabetes_state'] = diabetes_state
-        return context_updates
-
-    if selected_model == 'movie':
-        raw_input = request.POST.get('user_input', '').strip()
-
-        if 'movie_options' in request.session and raw_input:
-            if request.session.get('selected_model') == 'movie':
-                append_message(chat_history, 'user', raw_input)
-                try:
-                    choice_idx = int(to_english_digits(raw_input)) - 1
-                    options = request.session.get('movie_options', [])
-                    if 0 <= choice_idx < len(options):
-                        selected_title = options[choice_idx]
-                        del request.session['movie_options']
-                        if 'original_query' in request.session:
-                            del request.session['original_query']
-
-                        result = handler.predict('movie', {'title': selected_title})
-                        if result.get('status') == 'success':
-                            append_message(chat_history, 'bot', 'فیلم‌های پیشنهادی:')
-                            for i, title in enumerate(result.get('titles', [])):
-                                poster = None
-                                posters = result.get('posters') or []
-                                try:
-                                    poster = posters[i]
-                                except Exception:
-                                    poster = None
-                                if poster:
-                                    append_message(chat_history, 'bot', f"{i + 1}. {title} — {poster}")
-                                else:
-                                    append_message(chat_history, 'bot', f"{i + 1}. {title}")
-                        elif result.get('status') == 'need_confirmation':
-                            options2 = result.get('options', [])
-                            request.session['movie_options'] = options2
-                            append_message(chat_history, 'bot', result.get('message', 'کدام یک؟'))
-                            for i, opt in enumerate(options2):
-                                append_message(chat_history, 'bot', f"{i + 1}. {opt}")
-                        else:
-                            append_message(chat_history, 'bot', result.get('message', 'خطا در دریافت پیشنهادات'))
-                    else:
-                        append_message(chat_history, 'bot', 'عدد وارد شده خارج از بازه گزینه‌هاست. لطفاً یک عدد معتبر وارد کنید.')
-                except ValueError:
-                    result = handler.predict('movie', {'title': raw_input})
-                    if result.get('status') == 'success':
-                        append_message(chat_history, 'bot', 'فیلم‌های پیشنهادی:')
-                        for i, title in enumerate(result.get('titles', [])):
-                            poster = None
-                            posters = result.get('posters') or []
-                            try:
-                                poster = posters[i]
-                            except Exception:
-                                poster = None
-                            if poster:
-                                append_message(chat_history, 'bot', f"{i + 1}. {title} — {poster}")
-                            else:
-                                append_message(chat_history, 'bot', f"{i + 1}. {title}")
-                    elif result.get('status') == 'need_confirmation':
-                        options2 = result.get('options', [])
-                        request.session['movie_options'] = options2
-                        append_message(chat_history, 'bot', result.get('message', 'کدام یک؟'))
-                        for i, opt in enumerate(options2):
-                            append_message(chat_history, 'bot', f"{i + 1}. {opt}")
-                    else:
-                        append_message(chat_history, 'bot', result.get('message', 'خطا در پردازش درخواست'))
-            return context_updates
-
-        if raw_input:
-            append_message(chat_history, 'user', raw_input)
-            result = handler.predict('movie', {'title': raw_input})
-
-            if result.get('status') == 'need_confirmation':
-                options = result.get('options', [])
-                request.session['movie_options'] = options
-                request.session['original_query'] = raw_input
-                append_message(chat_history, 'bot', result.get('message', 'کدام یک؟'))
-                for i, option in enumerate(options):
-                    append_message(chat_history, 'bot', f"{i + 1}. {option}")
-                append_message(chat_history, 'bot', 'لطفاً عدد مربوط به فیلم مورد نظر را وارد کنید.')
-            elif result.get('status') == 'success':
-                append_message(chat_history, 'bot', 'فیلم‌های پیشنهادی:')
-                for i, title in enumerate(result.get('titles', [])):
-                    poster = None
-                    posters = result.get('posters') or []
-                    try:
-                        poster = posters[i]
-                    except Exception:
-                        poster = None
-                    if poster:
-                        append_message(chat_history, 'bot', f"{i + 1}. {title} — {poster}")
-                    else:
-                        append_message(chat_history, 'bot', f"{i + 1}. {title}")
-            elif result.get('status') == 'error':
-                append_message(chat_history, 'bot', result.get('message', 'خطایی رخ داده است.'))
-
-        return context_updates
-
-    return context_updates
-
-
-@csrf_exempt
-def chat_view(request):
-    if 'chat_history' not in request.session:
-        request.session['chat_history'] = []
-
-    if 'diabetes_state' not in request.session:
-        request.session['diabetes_state'] = {
-            'current_step': None,
-            'collected_data': {},
-            'remaining_fields': []
-        }
-
-    chat_history = request.session['chat_history']
-    diabetes_state = request.session['diabetes_state']
-
-    model_form = ModelSelectForm(request.POST or None)
-    selected_model = request.session.get('selected_model', None)
-
-    if request.method == 'POST':
-        updates = process_user_post(request, chat_history, diabetes_state, selected_model)
-        request.session['chat_history'] = chat_history
-        request.session['diabetes_state'] = diabetes_state
-        request.session.modified = True
-
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return JsonResponse({
-                'chat_history': chat_history,
-                'selected_model': request.session.get('selected_model', None)
-            })
-
-    context = {
-        'chat_history': chat_history,
-        'selected_model': request.session.get('selected_model', None),
-    }
-
-    return render(request, 'chat.html', context)
-
-
-@csrf_exempt
-def api_send_message(request):
-    if request.method == 'POST':
-        data = json.loads(request.body)
-        user_input = data.get('message', '').strip()
-        selected_model = data.get('model', request.session.get('selected_model', ''))
-
-        if selected_model == 'movie' and user_input:
-            result = handler.predict('movie', {'title': user_input})
-            return JsonResponse({'success': True, 'result': result})
-
-        return JsonResponse({
-            'success': True,
-            'response': 'پیام دریافت شد. (از طریق صفحهٔ چت اصلی تعامل بهتر پشتیبانی می‌شود)'
-        })
-
-    return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
-
-@csrf_exempt
-def clear_chat_history(request):
-    if request.method == 'POST':
-        request.session.pop('chat_history', None)
-        request.session.pop('diabetes_state', None)
-        request.session.modified = True
-        return JsonResponse({'success': True})
-    return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
\ No newline at end of file
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.shortcuts import render
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+import copy
+import hmac
+import json
+import os
+import secrets
+from urllib.parse import urlencode
+from models.ml_handler import MLModelHandler
+from models.diabetes_prediction.ml_model import DiabetesModel
+from models.diabetes_prediction.ocr_jobs import OCRQueueFull
+from models import text_utils
+from models.metrics import REGISTRY, current_timings
+from .forms import *
+from .chat_store import HISTORY_WINDOW, Conversation
+
+handler = MLModelHandler()
+
+# XHR uploads are OCR'd in the background and polled (MLCHAT_ASYNC_OCR=0 to disable)
+ASYNC_OCR = os.environ.get('MLCHAT_ASYNC_OCR', '1').lower() not in ('0', 'false', 'no')
+
+# GET /metrics (Prometheus-style) only exists when a token is configured
+METRICS_TOKEN = os.environ.get('MLCHAT_METRICS_TOKEN', '')
+
+# POST /api/movie/ingest/ only exists when a token is configured
+INGEST_TOKEN = os.environ.get('MLCHAT_INGEST_TOKEN', '')
+
+
+def append_message(chat_history, sender, message):
+    if not message:
+        return
+    last = chat_history.last()
+    candidate = (sender, message)
+    if last == candidate:
+        return
+    chat_history.append(sender, message)
+
+
+def to_english_digits(s: str) -> str:
+    if not isinstance(s, str):
+        return s
+    return text_utils.to_english_digits(s).strip()
+
+
+def append_image_prediction(chat_history, prediction):
+    if prediction.get('status') == 'success':
+        append_message(chat_history, 'bot', f'{"متاسفانه باید بگم که شما دیابت دارید" if prediction.get("result") == 1 else "خوشبختانه شما دیابت ندارید"}')
+    elif prediction.get('status') == 'incomplete':
+        missing = prediction.get('missing_fields', [])
+        append_message(chat_history, 'bot', f'برخی فیلدها از تصویر استخراج نشدند: {", ".join(missing)}. لطفاً آنها را وارد کنید یا تصویر بهتری ارسال کنید.')
+    else:
+        append_message(chat_history, 'bot', prediction.get('message', 'خطایی رخ داد.'))
+
+
+def append_movie_results(chat_history, titles, posters):
+    append_message(chat_history, 'bot', 'فیلم‌های پیشنهادی:')
+    for i, title in enumerate(titles):
+        poster = posters[i] if i < len(posters) else None
+        if poster:
+            append_message(chat_history, 'bot', f"{i + 1}. {title} — {poster}")
+        else:
+            append_message(chat_history, 'bot', f"{i + 1}. {title}")
+
+
+# the last movie queries that produced recommendations, the seeds of /api/movie/for-you/
+MOVIE_SEEDS_KEY = 'movie_seeds'
+MAX_MOVIE_SEEDS = 20
+
+
+def remember_movie_seed(session, query):
+    seeds = [s for s in session.get(MOVIE_SEEDS_KEY, []) if s != query]
+    seeds.append(query)
+    session[MOVIE_SEEDS_KEY] = seeds[-MAX_MOVIE_SEEDS:]
+
+
+def is_ajax(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def debug_timings():
+    """The model stages of this request, for JSON replies while ``DEBUG`` is on."""
+    return {'timings': current_timings()} if settings.DEBUG else {}
+
+
+async def process_user_post(request, chat_history, diabetes_state, selected_model):
+    context_updates = {}
+
+    is_user_input_present = bool(request.POST.get('user_input', '').strip())
+    is_file_present = 'test_image' in request.FILES and request.FILES.get('test_image') is not None
+
+    if 'model' in request.POST and not is_user_input_present and not is_file_present:
+        selected_model = request.POST.get('model')
+        request.session['selected_model'] = selected_model
+
+        if selected_model == 'diabetes':
+            append_message(chat_history, 'bot', 'شما مدل دیابت را انتخاب کردید. لطفاً یکی از گزینه‌های زیر را انتخاب کنید:')
+            append_message(chat_history, 'bot', '1. آپلود تصویر آزمایش')
+            append_message(chat_history, 'bot', '2. پر کردن اطلاعات به صورت دستی')
+            diabetes_state['current_step'] = 'awaiting_choice'
+        else:
+            append_message(chat_history, 'bot', 'شما مدل فیلم را انتخاب کردید. لطفا نام فیلم یا ژانر را وارد کنید (فارسی یا انگلیسی).')
+
+        context_updates['selected_model'] = selected_model
+        return context_updates
+
+    if selected_model == 'diabetes':
+        user_input = to_english_digits(request.POST.get('user_input', '').strip())
+
+        if diabetes_state.get('current_step') == 'awaiting_choice':
+            if user_input == '1':
+                append_message(chat_history, 'user', 'آپلود تصویر آزمایش')
+                append_message(chat_history, 'bot', 'لطفاً تصویر آزمایش خود را آپلود کنید.')
+                diabetes_state['current_step'] = 'awaiting_image'
+            elif user_input == '2':
+                append_message(chat_history, 'user', 'پر کردن اطلاعات دستی')
+                append_message(chat_history, 'bot', 'خب، اطلاعات را به صورت قدم به قدم وارد می‌کنیم.\n تعداد دفعات بارداری را وارد کنید. اگر مرد هستید یا تجربه بارداری ندارید، 0 وارد کنید:')
+                diabetes_state['current_step'] = 'collecting_data'
+                diabetes_state['collected_data'] = {}
+                diabetes_state['remaining_fields'] = DiabetesModel.REQUIRED_FIELDS.copy()
+                diabetes_state['current_field'] = diabetes_state['remaining_fields'].pop(0)
+            else:
+                append_message(chat_history, 'bot', 'لطفاً عدد 1 یا 2 را وارد کنید.')
+
+        elif diabetes_state.get('current_step') == 'awaiting_image':
+            if 'test_image' in request.FILES:
+                upload_form = DiabetesUploadForm(request.POST, request.FILES)
+                if upload_form.is_valid():
+                    image = upload_form.cleaned_data['test_image']
+                    if ASYNC_OCR and is_ajax(request):
+                        try:
+                            prediction = await handler.asubmit_ocr(image)
+                        except OCRQueueFull:
+                            append_message(chat_history, 'bot', 'سرور در حال پردازش تصاویر دیگر است. لطفاً چند لحظه بعد دوباره تصویر را ارسال کنید.')
+                        else:
+                            append_message(chat_history, 'user', 'عکس آزمایش ارسال شد')
+                            if prediction.get('status') == 'pending':
+                                append_message(chat_history, 'bot', 'در حال پردازش تصویر، لطفاً صبر کنید...')
+                                diabetes_state['current_step'] = 'processing_image'
+                                diabetes_state['ocr_job'] = prediction['job_id']
+                            else:
+                                append_image_prediction(chat_history, prediction)
+                                diabetes_state['current_step'] = None
+                    else:
+                        prediction = await handler.apredict('diabetes', {'image': image})
+                        append_message(chat_history, 'user', 'عکس آزمایش ارسال شد')
+                        append_image_prediction(chat_history, prediction)
+                        diabetes_state['current_step'] = None
+                else:
+                    append_message(chat_history, 'bot', 'فرم تصویر معتبر نیست. لطفاً دوباره تلاش کنید.')
+
+        elif diabetes_state.get('current_step') == 'collecting_data':
+            current_field = diabetes_state.get('current_field')
+            if not current_field:
+                append_message(chat_history, 'bot', 'خطا در وضعیت جمع‌آوری داده — لطفا دوباره شروع کنید.')
+                diabetes_state['current_step'] = None
+            else:
+                raw = request.POST.get('user_input', '').strip()
+                if raw:
+                    append_message(chat_history, 'user', raw)
+                try:
+                    if current_field in ['Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'Age']:
+                        val = int(to_english_digits(raw))
+                    else:
+                        val = float(to_english_digits(raw).replace(',', '.'))
+
+                    diabetes_state['collected_data'][current_field] = val
+
+                    if not diabetes_state.get('remaining_fields'):
+                        prediction = await handler.apredict('diabetes', diabetes_state['collected_data'])
+                        if prediction.get('status') == 'success':
+                            append_message(chat_history, 'bot', f'{"متاسفانه باید بهتون بگم که شما دیابت دارید" if prediction.get("result") == 1 else "تبریک میگم شما دیابت ندارید"}')
+                        else:
+                            append_message(chat_history, 'bot', prediction.get('message', 'خطا در پیش‌بینی'))
+                        diabetes_state['current_step'] = None
+                    else:
+                        next_field = diabetes_state['remaining_fields'].pop(0)
+                        diabetes_state['current_field'] = next_field
+                        field_messages = {
+                            'Pregnancies': 'تعداد دفعات بارداری را وارد کنید. اگر مرد هستید یا تجربه بارداری ندارید، 0 وارد کنید.',
+                            'Glucose': 'مقدار قند خون (mg/dL) را وارد کنید (قند خون طبیعی کمتر از 100 است).',
+                            'BloodPressure': 'فشار خون (mm Hg) خود را بنویسید (معمولاً حدود 80 است).',
+                            'SkinThickness': 'ضخامت چین پوستی (میلی‌متر) بدنتان را وارد کنید (معمولا ضخامت پوستی  2 میلی متر است).',
+                            'Insulin': 'مقدار انسولین (mu U/ml) بدنتان را ارسال کنید (برای یک انسان عادی، حدود 80 است).',
+                            'BMI': 'شاخص توده بدنی (BMI) را بنویسید (اگر نمی‌دانید: وزن (kg) ÷ (قد(m))²)',
+                            'DiabetesPedigreeFunction': (
+                                "شاخص سابقه خانوادگی دیابت:\n"
+                                "- اگر هیچ‌کس در خانواده مبتلا نیست: 0.0\n"
+                                "- اگر یکی‌دو نفر از اقوام نزدیک مبتلا هستند: حدود 0.5\n"
+                                "- اگر بیش از دو نفر مبتلا هستند: حدود 1.0\n"
+                                "- اگر بیشتر اعضای خانواده مبتلا هستند: نزدیک 2.0"
+                            ),
+                            'Age': 'چند سال عمر کیده اید؟'
+                        }
+                        append_message(chat_history, 'bot', field_messages.get(next_field, f'لطفاً مقدار {next_field} را وارد کنید:'))
+                except ValueError:
+                    append_message(chat_history, 'bot', 'لطفاً یک عدد معتبر وارد کنید.')
+
+        context_updates['diabetes_state'] = diabetes_state
+        return context_updates
+
+    if selected_model == 'movie':
+        raw_input = request.POST.get('user_input', '').strip()
+
+        if 'movie_options' in request.session and raw_input:
+            if request.session.get('selected_model') == 'movie':
+                append_message(chat_history, 'user', raw_input)
+                try:
+                    choice_idx = int(to_english_digits(raw_input)) - 1
+                    options = request.session.get('movie_options', [])
+                    if 0 <= choice_idx < len(options):
+                        selected_title = options[choice_idx]
+                        del request.session['movie_options']
+                        if 'original_query' in request.session:
+                            del request.session['original_query']
+
+                        result = await handler.apredict('movie', {'title': selected_title})
+                        if result.get('status') == 'success':
+                            remember_movie_seed(request.session, selected_title)
+                            append_movie_results(chat_history, result.get('titles', []), result.get('posters') or [])
+                        elif result.get('status') == 'need_confirmation':
+                            options2 = result.get('options', [])
+                            request.session['movie_options'] = options2
+                            append_message(chat_history, 'bot', result.get('message', 'کدام یک؟'))
+                            for i, opt in enumerate(options2):
+                                append_message(chat_history, 'bot', f"{i + 1}. {opt}")
+                        else:
+                            append_message(chat_history, 'bot', result.get('message', 'خطا در دریافت پیشنهادات'))
+                    else:
+                        append_message(chat_history, 'bot', 'عدد وارد شده خارج از بازه گزینه‌هاست. لطفاً یک عدد معتبر وارد کنید.')
+                except ValueError:
+                    result = await handler.apredict('movie', {'title': raw_input})
+                    if result.get('status') == 'success':
+                        remember_movie_seed(request.session, raw_input)
+                        append_movie_results(chat_history, result.get('titles', []), result.get('posters') or [])
+                    elif result.get('status') == 'need_confirmation':
+                        options2 = result.get('options', [])
+                        request.session['movie_options'] = options2
+                        append_message(chat_history, 'bot', result.get('message', 'کدام یک؟'))
+                        for i, opt in enumerate(options2):
+                            append_message(chat_history, 'bot', f"{i + 1}. {opt}")
+                    else:
+                        append_message(chat_history, 'bot', result.get('message', 'خطا در پردازش درخواست'))
+            return context_updates
+
+        if raw_input:
+            append_message(chat_history, 'user', raw_input)
+            result = await handler.apredict('movie', {'title': raw_input})
+
+            if result.get('status') == 'need_confirmation':
+                options = result.get('options', [])
+                request.session['movie_options'] = options
+                request.session['original_query'] = raw_input
+                append_message(chat_history, 'bot', result.get('message', 'کدام یک؟'))
+                for i, option in enumerate(options):
+                    append_message(chat_history, 'bot', f"{i + 1}. {option}")
+                append_message(chat_history, 'bot', 'لطفاً عدد مربوط به فیلم مورد نظر را وارد کنید.')
+            elif result.get('status') == 'success':
+                remember_movie_seed(request.session, raw_input)
+                append_movie_results(chat_history, result.get('titles', []), result.get('posters') or [])
+            elif result.get('status') == 'error':
+                append_message(chat_history, 'bot', result.get('message', 'خطایی رخ داده است.'))
+
+        return context_updates
+
+    return context_updates
+
+
+def history_context(window):
+    return {
+        'chat_history': [(sender, text) for _, sender, text in window],
+        'first_seq': window[0][0] if window else None,
+        'last_seq': window[-1][0] if window else 0,
+        'has_older': bool(window) and window[0][0] > 1,
+    }
+
+
+def parse_seq(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def history_update(conversation, last_seq):
+    """What an XHR client that has seen messages up to ``last_seq`` is missing.
+
+    Normally just the newer messages (``messages`` + ``last_seq``); the whole
+    window (``chat_history``) when the client sent no sequence number, is
+    ahead of the server (history cleared elsewhere) or too far behind.
+    """
+    latest = conversation.last_seq
+    if last_seq is not None and 0 <= last_seq <= latest and latest - last_seq <= HISTORY_WINDOW:
+        return {'messages': conversation.since(last_seq), 'last_seq': latest}
+    return history_context(conversation.window())
+
+
+def load_chat_state(request):
+    if 'diabetes_state' not in request.session:
+        request.session['diabetes_state'] = {
+            'current_step': None,
+            'collected_data': {},
+            'remaining_fields': []
+        }
+
+    chat_history = Conversation.for_session(request.session)
+    # fetched now so appending during the turn needs no database access
+    chat_history.last()
+    return chat_history, request.session['diabetes_state']
+
+
+def save_turn(request, chat_history, diabetes_state, state_before):
+    chat_history.save()
+    if diabetes_state != state_before:
+        request.session['diabetes_state'] = diabetes_state
+    if is_ajax(request):
+        return history_update(chat_history, parse_seq(request.POST.get('last_seq'))), chat_history.etag()
+    return history_context(chat_history.window()), None
+
+
+@csrf_exempt
+async def chat_view(request):
+    # session and chat log are loaded on the ORM thread up front; the turn
+    # itself only awaits the models, so a slow TMDB/translator/OCR call
+    # doesn't hold a worker
+    chat_history, diabetes_state = await sync_to_async(load_chat_state)(request)
+    state_before = copy.deepcopy(diabetes_state)
+
+    model_form = ModelSelectForm(request.POST or None)
+    selected_model = request.session.get('selected_model', None)
+
+    if request.method == 'POST':
+        updates = await process_user_post(request, chat_history, diabetes_state, selected_model)
+        history, etag = await sync_to_async(save_turn)(request, chat_history, diabetes_state, state_before)
+
+        if is_ajax(request):
+            response = JsonResponse({
+                **history,
+                'selected_model': request.session.get('selected_model', None),
+                'ocr_job': diabetes_state.get('ocr_job'),
+                **debug_timings(),
+            })
+            response['ETag'] = etag
+            return response
+    else:
+        history = history_context(await sync_to_async(chat_history.window)())
+
+    context = {
+        **history,
+        'selected_model': request.session.get('selected_model', None),
+    }
+
+    return render(request, 'chat.html', context)
+
+
+@csrf_exempt
+async def api_send_message(request):
+    if request.method == 'POST':
+        data = json.loads(request.body)
+        user_input = data.get('message', '').strip()
+        if 'model' in data:
+            selected_model = data['model']
+        else:
+            selected_model = await sync_to_async(request.session.get)('selected_model', '')
+
+        if selected_model == 'movie' and user_input:
+            result = await handler.apredict('movie', {'title': user_input})
+            return JsonResponse({'success': True, 'result': result, **debug_timings()})
+
+        return JsonResponse({
+            'success': True,
+            'response': 'پیام دریافت شد. (از طریق صفحهٔ چت اصلی تعامل بهتر پشتیبانی می‌شود)'
+        })
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# one-time tokens for /api/movie/stream/, each holding the state of a started stream
+MOVIE_STREAMS_KEY = 'movie_streams'
+MAX_MOVIE_STREAMS = 5
+
+
+def api_stream_movie(request):
+    """Movie recommendations whose posters and translations arrive as Server-Sent Events.
+
+    ``POST`` (``q``, ``last_seq``; CSRF-protected) runs the chat turn: it
+    stores the user's message, answers ``options`` or ``error`` right away
+    with the chat messages after ``last_seq``, and for ``titles`` returns
+    them with a ``stream`` URL holding a one-time token. ``GET`` of that URL
+    streams a ``poster`` and ``title`` (Persian translation) event per movie
+    as each resolves, stores the results in the chat and closes with
+    ``done``, carrying the messages after ``last_seq`` like the XHR replies.
+    """
+    if request.method == 'POST':
+        return start_movie_stream(request)
+    if request.method == 'GET':
+        return stream_movie_details(request)
+    return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+
+def start_movie_stream(request):
+    if request.session.get('selected_model') != 'movie':
+        return JsonResponse({'success': False, 'error': 'Movie model is not selected'}, status=400)
+    raw_input = request.POST.get('q', '').strip()
+    if not raw_input:
+        return JsonResponse({'success': False, 'error': 'Empty query'}, status=400)
+
+    last_seq = parse_seq(request.POST.get('last_seq'))
+    chat_history = Conversation.for_session(request.session)
+    append_message(chat_history, 'user', raw_input)
+
+    query, choosing = raw_input, False
+    options = request.session.get('movie_options')
+    if options:
+        try:
+            choice_idx = int(to_english_digits(raw_input)) - 1
+        except ValueError:
+            choice_idx = None
+        if choice_idx is not None:
+            choosing = True
+            if 0 <= choice_idx < len(options):
+                query = options[choice_idx]
+                del request.session['movie_options']
+                request.session.pop('original_query', None)
+            else:
+                query = None
+
+    state = None
+    if query is None:
+        first = {'event': 'error', 'message': 'عدد وارد شده خارج از بازه گزینه‌هاست. لطفاً یک عدد معتبر وارد کنید.'}
+    else:
+        first, state = handler.start_movie_stream(query)
+
+    reply = {'success': True, **first}
+    if first['event'] == 'options':
+        request.session['movie_options'] = first['options']
+        append_message(chat_history, 'bot', first['message'])
+        for i, option in enumerate(first['options']):
+            append_message(chat_history, 'bot', f"{i + 1}. {option}")
+        if not choosing:
+            request.session['original_query'] = raw_input
+            append_message(chat_history, 'bot', 'لطفاً عدد مربوط به فیلم مورد نظر را وارد کنید.')
+    elif first['event'] == 'error':
+        append_message(chat_history, 'bot', first['message'])
+    elif first['event'] == 'titles':
+        remember_movie_seed(request.session, query)
+        token = secrets.token_urlsafe(16)
+        streams = request.session.get(MOVIE_STREAMS_KEY, {})
+        streams[token] = {**state, 'last_seq': last_seq}
+        request.session[MOVIE_STREAMS_KEY] = dict(list(streams.items())[-MAX_MOVIE_STREAMS:])
+        reply['stream'] = f"{reverse('api_stream_movie')}?{urlencode({'token': token})}"
+    chat_history.save()
+
+    if 'stream' not in reply:
+        reply.update(history_update(chat_history, last_seq))
+    return JsonResponse(reply)
+
+
+def stream_movie_details(request):
+    # only a stream started by this session's POST can write to its chat
+    streams = request.session.get(MOVIE_STREAMS_KEY, {})
+    state = streams.pop(request.GET.get('token', ''), None)
+    if state is None:
+        return JsonResponse({'success': False, 'error': 'Unknown or already used stream token'}, status=404)
+    request.session[MOVIE_STREAMS_KEY] = streams
+
+    chat_history = Conversation.for_session(request.session)
+    last_seq = state.pop('last_seq')
+    events = handler.stream_movie_details(state)
+    titles, posters = list(state['titles']), [None] * len(state['titles'])
+
+    def relay(event):
+        # keeps what has resolved for the stored reply
+        if event['event'] == 'poster':
+            posters[event['index']] = event['poster']
+        else:
+            titles[event['index']] = event['title']
+        return sse_event(event['event'], event)
+
+    def store():
+        append_movie_results(chat_history, titles, posters)
+        chat_history.save()
+
+    def stream():
+        try:
+            for event in events:
+                yield relay(event)
+        finally:
+            # also when the client went away mid-stream
+            store()
+        yield sse_event('done', history_update(chat_history, last_seq))
+
+    async def astream():
+        # Django would buffer a sync iterator whole under ASGI, so wait for
+        # each event on a worker thread and send it as soon as it resolves
+        step = sync_to_async(next, thread_sensitive=False)
+        try:
+            while (event := await step(events, None)) is not None:
+                yield relay(event)
+        finally:
+            await sync_to_async(store)()
+        yield sse_event('done', await sync_to_async(history_update)(chat_history, last_seq))
+
+    body = astream() if isinstance(request, ASGIRequest) else stream()
+    response = StreamingHttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+def api_movie_for_you(request):
+    """Recommendations blended from every movie picked this session (or the given ``?seed=`` titles)."""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+    seeds = request.GET.getlist('seed') or request.session.get(MOVIE_SEEDS_KEY, [])
+    try:
+        k = max(min(int(request.GET.get('k', 5)), 20), 1)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'پارامتر k باید عدد باشد.'}, status=400)
+
+    result = handler.recommend_for_seeds(seeds, k)
+    return JsonResponse({'success': result.get('status') == 'success', 'result': result, 'seeds': seeds})
+
+
+MAX_INGEST_MOVIES = 1000
+
+
+@csrf_exempt
+def api_movie_ingest(request):
+    """Append movies to the catalog: ``{"movies": [{"id", "title", "tags"}, ...]}`` with
+    ``Authorization: Bearer <MLCHAT_INGEST_TOKEN>``."""
+    if not INGEST_TOKEN:
+        return HttpResponse(status=404)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {INGEST_TOKEN}'):
+        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    movies = data.get('movies', []) if isinstance(data, dict) else data
+    if isinstance(movies, list) and len(movies) > MAX_INGEST_MOVIES:
+        return JsonResponse({'success': False, 'error': f'حداکثر {MAX_INGEST_MOVIES} فیلم در هر درخواست مجاز است.'}, status=413)
+
+    result = handler.ingest_movies(movies)
+    return JsonResponse({'success': result.get('status') == 'success', 'result': result})
+
+
+@csrf_exempt
+def api_ocr_job_status(request, job_id):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+    diabetes_state = request.session.get('diabetes_state') or {}
+    if diabetes_state.get('ocr_job') != job_id:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+
+    prediction = handler.ocr_result(job_id)
+    if prediction.get('status') == 'pending':
+        return JsonResponse({'success': True, 'status': 'pending'})
+
+    chat_history = Conversation.for_session(request.session)
+    append_image_prediction(chat_history, prediction)
+    chat_history.save()
+    diabetes_state.pop('ocr_job', None)
+    diabetes_state['current_step'] = None
+    request.session['diabetes_state'] = diabetes_state
+    update = history_update(chat_history, parse_seq(request.GET.get('last_seq')))
+    return JsonResponse({'success': True, 'status': 'done', **update})
+
+
+@csrf_exempt
+def api_chat_history(request):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+    try:
+        before = request.GET.get('before')
+        before = int(before) if before else None
+        after = request.GET.get('after')
+        after = int(after) if after else None
+        limit = max(min(int(request.GET.get('limit', HISTORY_WINDOW)), 200), 1)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'پارامترهای before، after و limit باید عدد باشند.'}, status=400)
+
+    conversation = Conversation.for_session(request.session)
+    if after is not None:
+        # polling for new messages: answer 304 while nothing was added
+        etag = conversation.etag()
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=304)
+        else:
+            messages = conversation.since(after, limit=limit)
+            response = JsonResponse({'success': True, 'messages': messages,
+                                     'last_seq': messages[-1][0] if messages else after})
+        response['ETag'] = etag
+        return response
+
+    window = conversation.window(limit=limit, before=before)
+    return JsonResponse({
+        'success': True,
+        'messages': window,
+        'has_older': bool(window) and window[0][0] > 1,
+    })
+
+
+MAX_BATCH_RECORDS = 10000
+
+
+@csrf_exempt
+def api_predict_diabetes_batch(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+    try:
+        if 'file' in request.FILES:
+            records = DiabetesModel.records_from_csv(request.FILES['file'].read().decode('utf-8-sig'))
+        elif request.content_type == 'text/csv':
+            records = DiabetesModel.records_from_csv(request.body.decode('utf-8-sig'))
+        else:
+            data = json.loads(request.body)
+            records = data.get('records', []) if isinstance(data, dict) else data
+            if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                raise ValueError('records باید فهرستی از اشیاء JSON باشد.')
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    if len(records) > MAX_BATCH_RECORDS:
+        return JsonResponse({'success': False, 'error': f'حداکثر {MAX_BATCH_RECORDS} رکورد در هر درخواست مجاز است.'}, status=413)
+
+    result = handler.predict_batch('diabetes', records)
+    return JsonResponse({'success': result.get('status') == 'success', 'result': result})
+
+
+@csrf_exempt
+def clear_chat_history(request):
+    if request.method == 'POST':
+        Conversation.for_session(request.session).clear()
+        request.session.pop('diabetes_state', None)
+        request.session.pop(MOVIE_SEEDS_KEY, None)
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this worker's metrics, with
+    ``Authorization: Bearer <MLCHAT_METRICS_TOKEN>``."""
+    if not METRICS_TOKEN:
+        return HttpResponse(status=404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return HttpResponse(status=401)
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,165 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import numpy as np
+from models.metrics import BATCH_QUEUE_SECONDS, BATCH_SIZE
+
+
+class MicroBatcher:
+    """Collects concurrent single-item calls into one batched call.
+
+    ``batch_fn`` receives a list of items and must return one result per item,
+    in order; a result that is an exception instance is raised to that item's
+    caller only. The worker thread waits at most ``max_wait_ms`` after the
+    first queued item for others to arrive, and never runs more than
+    ``max_batch_size`` items at once. If ``batch_fn`` raises for a batch of
+    several items, each item is retried on its own, so one bad input fails
+    only its own caller. ``__call__`` gives up after ``timeout`` seconds.
+    Batch sizes and queue waits go to ``stats`` and to the
+    ``mlchat_batch_size`` / ``mlchat_batch_queue_seconds`` histograms.
+
+    The thread is started on the first ``submit`` and again in a forked
+    child (threads don't survive ``fork``), so a batcher built in a
+    ``gunicorn --preload`` master works in every worker.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 32, max_wait_ms: float = 5, name: str = 'batcher',
+                 timeout: float = 30):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=2048)
+        self._items = 0
+        self._closed = False
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # forked: the parent's queue may hold items whose futures live there
+                self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name=f'microbatch-{self.name}', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, item) -> Future:
+        if self._closed:
+            raise RuntimeError(f"{self.name} batcher is closed")
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout: float = None):
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(item)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # dropped from its batch if the worker hasn't picked it up yet
+            future.cancel()
+            raise TimeoutError(f"{self.name}: no result within {timeout:g} s")
+
+    def close(self):
+        self._closed = True
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # callers that timed out have cancelled their futures
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self._call(items)
+            except Exception as e:
+                results = self._call_each(items) if len(items) > 1 else [e]
+
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            waits = [started - queued for _, _, queued in batch]
+            with self._stats_lock:
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._queue_waits.extend(wait * 1000 for wait in waits)
+            BATCH_SIZE.observe(len(batch), self.name)
+            for wait in waits:
+                BATCH_QUEUE_SECONDS.observe(wait, self.name)
+
+    def _call(self, items):
+        results = self.batch_fn(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+        return results
+
+    def _call_each(self, items):
+        # the whole batch failed: run the items one by one so only the bad one fails
+        results = []
+        for item in items:
+            try:
+                results.append(self._call([item])[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            waits = np.array(self._queue_waits) if self._queue_waits else np.zeros(1)
+            return {
+                'name': self.name,
+                'items': self._items,
+                'batches': batches,
+                'mean_batch_size': self._items / batches if batches else 0.0,
+                'max_batch_size_seen': max(self._batch_sizes) if self._batch_sizes else 0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'queue_wait_ms_p50': float(np.percentile(waits, 50)),
+                'queue_wait_ms_p95': float(np.percentile(waits, 95)),
+                'queue_wait_ms_max': float(waits.max()),
+                'pending': self._queue.qsize(),
+            }
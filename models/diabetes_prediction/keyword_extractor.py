@@ -0,0 +1,65 @@
+import re
+from collections import namedtuple
+from models.text_utils import DIGITS_TABLE
+
+ExtractedField = namedtuple('ExtractedField', ['field', 'value', 'keyword', 'start', 'end', 'confidence'])
+
+# OCR text normalisation in a single translate pass: Persian comma -> ',',
+# ':' -> ' ', Persian digits -> ASCII
+OCR_TEXT_TABLE = {**DIGITS_TABLE, ord('،'): ',', ord(':'): ' '}
+
+
+def normalize_ocr_text(text: str) -> str:
+    return text.translate(OCR_TEXT_TABLE).lower()
+
+
+class KeywordExtractor:
+    """Finds every ``<keyword> <number>`` pair of a keyword table in one scan.
+
+    All keywords are compiled into a single alternation (plain literals, so
+    the regex engine can skip ahead on their first characters); after each
+    hit the scan resumes one character further on, so occurrences may
+    overlap just like independent ``re.search`` calls per keyword would.
+    For each field the keyword listed first in the table wins, then the
+    earliest position - the same choice the per-keyword loop made.
+    """
+
+    VALUE_PATTERN = re.compile(r'[\s:\-]*([\d\.,]+)')
+
+    def __init__(self, keywords: dict):
+        self._entries = {}
+        for field, keys in keywords.items():
+            for rank, key in enumerate(keys):
+                self._entries.setdefault(key.lower(), (field, rank))
+        self.fields = list(keywords)
+        # longest first, so a keyword never loses to its own prefix at the same position
+        alternatives = sorted(self._entries, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(key) for key in alternatives))
+
+    @staticmethod
+    def _confidence(rank: int, key: str, value: str) -> float:
+        confidence = 1.0 - 0.1 * rank
+        if len(key) <= 3:
+            # short labels such as 'bp', 'age' or 'سن' also occur inside other words
+            confidence -= 0.2
+        if value.count('.') > 1 or not any(c.isdigit() for c in value):
+            confidence *= 0.5
+        return round(max(confidence, 0.0), 2)
+
+    def extract(self, text: str) -> dict:
+        """``{field: ExtractedField}`` for every field found in already-normalised ``text``."""
+        best = {}
+        search, value_at = self.pattern.search, self.VALUE_PATTERN.match
+        match = search(text)
+        while match is not None:
+            key = match.group()
+            field, rank = self._entries[key]
+            current = best.get(field)
+            if current is None or rank < current[0]:
+                value_match = value_at(text, match.end())
+                if value_match is not None:
+                    value = value_match.group(1).strip().replace(',', '.')
+                    best[field] = (rank, ExtractedField(field, value, key, match.start(), value_match.end(),
+                                                        self._confidence(rank, key, value)))
+            match = search(text, match.start() + 1)
+        return {field: best[field][1] for field in self.fields if field in best}
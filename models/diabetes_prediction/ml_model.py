@@ -1,136 +1,260 @@
-import os
-import pickle
-import numpy as np
-import warnings
-import re
-from PIL import Image
-import pytesseract
-from sklearn.exceptions import InconsistentVersionWarning
-
-warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
-pytesseract.pytesseract.tesseract_cmd = r"C:\Users\Mehran\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
-
-
-class DiabetesModel:
-    REQUIRED_FIELDS = [
-        'Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness',
-        'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age'
-    ]
-
-    KEYWORDS = {
-        'Pregnancies': ['pregnancies', 'بارداری'],
-        'Glucose': ['glucose', 'قند'],
-        'BloodPressure': ['bloodpressure', 'bp', 'فشار خون'],
-        'SkinThickness': ['skinthickness', 'پوست', 'skin thickness'],
-        'Insulin': ['insulin', 'انسولین'],
-        'BMI': ['bmi', 'body mass index', 'شاخص توده بدنی'],
-        'DiabetesPedigreeFunction': ['diabetespedigreefunction', 'diabetes pedigree', 'دیابت'],
-        'Age': ['age', 'سن']
-    }
-
-    FIELD_DESCRIPTIONS = {
-        'Pregnancies': 'تعداد دفعات بارداری',
-        'Glucose': 'غلظت گلوکز پلاسما در تست تحمل گلوکز خوراکی',
-        'BloodPressure': 'فشار خون دیاستولیک (mm Hg)',
-        'SkinThickness': 'ضخامت چین پوستی تریسپس (mm)',
-        'Insulin': 'انسولین سرم 2 ساعت (mu U/ml)',
-        'BMI': 'شاخص توده بدنی (وزن بر حسب کیلوگرم تقسیم بر مجذور قد بر حسب متر)',
-        'DiabetesPedigreeFunction': 'تابع تبار دیابت',
-        'Age': 'سن (سال)'
-    }
-
-    def __init__(self):
-        base_dir = os.path.dirname(__file__)
-        model_path = os.path.join(base_dir, 'diabetes_model.pkl')
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model file not found at {model_path}")
-        with open(model_path, 'rb') as f:
-            self.model = pickle.load(f)
-
-    @staticmethod
-    def _persian_to_english_digits(s: str) -> str:
-        if not isinstance(s, str):
-            return s
-        persian_digits = '۰۱۲۳۴۵۶۷۸۹'
-        english_digits = '0123456789'
-        for p, e in zip(persian_digits, english_digits):
-            s = s.replace(p, e)
-        return s
-
-    @staticmethod
-    def _safe_cast_int(value, default=0):
-        if value is None or value == '':
-            return default
-        try:
-            if isinstance(value, str):
-                value = DiabetesModel._persian_to_english_digits(value.strip())
-            return int(float(value))
-        except Exception:
-            raise ValueError(f"قابل تبدیل به عدد صحیح نیست: {value}")
-
-    @staticmethod
-    def _safe_cast_float(value, default=0.0):
-        if value is None or value == '':
-            return default
-        try:
-            if isinstance(value, str):
-                value = DiabetesModel._persian_to_english_digits(value.strip())
-                value = value.replace(',', '.')
-            return float(value)
-        except Exception:
-            raise ValueError(f"قابل تبدیل به عدد اعشاری نیست: {value}")
-
-    def predict(self, features: dict):
-        try:
-            values = np.array([[ 
-                self._safe_cast_int(features.get('Pregnancies', 0)),
-                self._safe_cast_int(features.get('Glucose', 0)),
-                self._safe_cast_int(features.get('BloodPressure', 0)),
-                self._safe_cast_int(features.get('SkinThickness', 0)),
-                self._safe_cast_int(features.get('Insulin', 0)),
-                self._safe_cast_float(features.get('BMI', 0.0)),
-                self._safe_cast_float(features.get('DiabetesPedigreeFunction', 0.0)),
-                self._safe_cast_int(features.get('Age', 0))
-            ]])
-        except ValueError as e:
-            raise
-
-        prediction = self.model.predict(values)
-        return int(prediction[0])
-
-    def extract_features_from_image(self, uploaded_file):
-        try:
-            image = Image.open(uploaded_file)
-        except Exception as e:
-            raise ValueError(f"خطا در باز کردن فایل تصویر: {e}")
-        try:
-            text = pytesseract.image_to_string(image, lang='eng+fas')
-        except Exception as e:
-            raise RuntimeError(f"خطا در OCR (اطمینان حاصل کنید tesseract و پکیج‌های زبان نصب شده‌اند): {e}")
-
-        text = text.replace('،', ',').replace(':', ' ').lower()
-        text = self._persian_to_english_digits(text)
-
-        features = {}
-        for field, keys in self.KEYWORDS.items():
-            found = False
-            for key in keys:
-                pattern = rf"{re.escape(key)}[\s:\-]*([\d\.,]+)"
-                match = re.search(pattern, text, flags=re.IGNORECASE)
-                if match:
-                    raw_val = match.group(1).strip()
-                    raw_val = raw_val.replace(',', '.')
-                    raw_val = self._persian_to_english_digits(raw_val)
-                    features[field] = raw_val
-                    found = True
-                    break
-            if not found:
-                pass
-        print("OCR OUTPUT >>>")
-        print(text)
-        print("<<< OCR END")
-
-        return features
-
-    def get_field_description(self, field_name):
-        return self.FIELD_DESCRIPTIONS.get(field_name, field_name)
+import os
+import csv
+import io
+import logging
+import pickle
+import time
+import numpy as np
+import warnings
+from PIL import Image
+import pytesseract
+from models.diabetes_prediction import preprocess
+from models.diabetes_prediction.keyword_extractor import KeywordExtractor, normalize_ocr_text
+from models.text_utils import DIGITS_TABLE, to_english_digits
+from models.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+pytesseract.pytesseract.tesseract_cmd = os.environ.get(
+    'TESSERACT_CMD', r"C:\Users\Mehran\AppData\Local\Programs\Tesseract-OCR\tesseract.exe")
+
+OCR_LANG = 'eng+fas'
+
+# raw: the uploaded image as-is; preprocessed: downscaled, binarized and
+# deskewed first; roi: preprocessed, then only the lines naming a field are OCR'd
+OCR_MODES = ('raw', 'preprocessed', 'roi')
+OCR_MODE = os.environ.get('MLCHAT_OCR_MODE', 'raw')
+
+
+def run_ocr(image, timeout: float = 0, mode: str = None) -> str:
+    mode = mode or OCR_MODE
+    if mode not in OCR_MODES:
+        raise ValueError(f"unknown OCR mode {mode!r}, expected one of {OCR_MODES}")
+    try:
+        if mode == 'raw':
+            return pytesseract.image_to_string(image, lang=OCR_LANG, timeout=timeout)
+
+        image = preprocess.preprocess(image)
+        if mode == 'roi':
+            # both Tesseract runs share the one ``timeout``
+            deadline = time.monotonic() + timeout
+            keywords = [k for keys in DiabetesModel.KEYWORDS.values() for k in keys]
+            boxes = preprocess.keyword_regions(image, keywords, OCR_LANG, timeout=timeout)
+            if timeout:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise RuntimeError('Tesseract process timeout')
+            if boxes:
+                return preprocess.ocr_regions(image, boxes, OCR_LANG, timeout=timeout)
+        return pytesseract.image_to_string(image, lang=OCR_LANG, timeout=timeout)
+    except Exception as e:
+        raise RuntimeError(f"خطا در OCR (اطمینان حاصل کنید tesseract و پکیج‌های زبان نصب شده‌اند): {e}")
+
+
+def ocr_image_bytes(data: bytes, timeout: float = 0, mode: str = None) -> str:
+    """OCR an encoded image; module-level so it can run in a worker process."""
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Exception as e:
+        raise ValueError(f"خطا در باز کردن فایل تصویر: {e}")
+    return run_ocr(image, timeout=timeout, mode=mode)
+
+
+class DiabetesModel:
+    REQUIRED_FIELDS = [
+        'Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness',
+        'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age'
+    ]
+
+    FLOAT_FIELDS = ['BMI', 'DiabetesPedigreeFunction']
+
+    KEYWORDS = {
+        'Pregnancies': ['pregnancies', 'بارداری'],
+        'Glucose': ['glucose', 'قند'],
+        'BloodPressure': ['bloodpressure', 'bp', 'فشار خون'],
+        'SkinThickness': ['skinthickness', 'پوست', 'skin thickness'],
+        'Insulin': ['insulin', 'انسولین'],
+        'BMI': ['bmi', 'body mass index', 'شاخص توده بدنی'],
+        'DiabetesPedigreeFunction': ['diabetespedigreefunction', 'diabetes pedigree', 'دیابت'],
+        'Age': ['age', 'سن']
+    }
+
+    FIELD_DESCRIPTIONS = {
+        'Pregnancies': 'تعداد دفعات بارداری',
+        'Glucose': 'غلظت گلوکز پلاسما در تست تحمل گلوکز خوراکی',
+        'BloodPressure': 'فشار خون دیاستولیک (mm Hg)',
+        'SkinThickness': 'ضخامت چین پوستی تریسپس (mm)',
+        'Insulin': 'انسولین سرم 2 ساعت (mu U/ml)',
+        'BMI': 'شاخص توده بدنی (وزن بر حسب کیلوگرم تقسیم بر مجذور قد بر حسب متر)',
+        'DiabetesPedigreeFunction': 'تابع تبار دیابت',
+        'Age': 'سن (سال)'
+    }
+
+    def __init__(self):
+        base_dir = os.path.dirname(__file__)
+        model_path = os.path.join(base_dir, 'diabetes_model.pkl')
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found at {model_path}")
+        # imported here rather than at module level: sklearn takes about a
+        # second to import and is only needed once the model is loaded
+        from sklearn.exceptions import InconsistentVersionWarning
+        warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
+        with open(model_path, 'rb') as f:
+            self.model = pickle.load(f)
+
+    _keyword_extractor = None
+
+    @staticmethod
+    def _persian_to_english_digits(s: str) -> str:
+        return to_english_digits(s)
+
+    @staticmethod
+    def _safe_cast_int(value, default=0):
+        if value is None or value == '':
+            return default
+        try:
+            if isinstance(value, str):
+                value = DiabetesModel._persian_to_english_digits(value.strip())
+            return int(float(value))
+        except Exception:
+            raise ValueError(f"قابل تبدیل به عدد صحیح نیست: {value}")
+
+    @staticmethod
+    def _safe_cast_float(value, default=0.0):
+        if value is None or value == '':
+            return default
+        try:
+            if isinstance(value, str):
+                value = DiabetesModel._persian_to_english_digits(value.strip())
+                value = value.replace(',', '.')
+            value = float(value)
+        except Exception:
+            raise ValueError(f"قابل تبدیل به عدد اعشاری نیست: {value}")
+        if not np.isfinite(value):
+            raise ValueError(f"مقدار عددی معتبر نیست: {value}")
+        return value
+
+    def predict(self, features: dict):
+        try:
+            values = np.array([[ 
+                self._safe_cast_int(features.get('Pregnancies', 0)),
+                self._safe_cast_int(features.get('Glucose', 0)),
+                self._safe_cast_int(features.get('BloodPressure', 0)),
+                self._safe_cast_int(features.get('SkinThickness', 0)),
+                self._safe_cast_int(features.get('Insulin', 0)),
+                self._safe_cast_float(features.get('BMI', 0.0)),
+                self._safe_cast_float(features.get('DiabetesPedigreeFunction', 0.0)),
+                self._safe_cast_int(features.get('Age', 0))
+            ]])
+        except ValueError as e:
+            raise
+
+        with stage('diabetes', 'predict'):
+            prediction = self.model.predict(values)
+        return int(prediction[0])
+
+    @classmethod
+    def features_to_matrix(cls, records):
+        """Validate and cast many feature dicts at once.
+
+        Returns an ``(n, 8)`` float array in ``REQUIRED_FIELDS`` order and a
+        ``{row: message}`` dict for records that could not be converted or hold
+        ``inf``/``nan`` (their row in the array is left at 0). Missing or empty values count as 0, as
+        in ``predict``.
+        """
+        n_fields = len(cls.REQUIRED_FIELDS)
+        if not records:
+            return np.zeros((0, n_fields)), {}
+
+        raw = np.array([['' if r.get(f) is None else str(r.get(f)) for f in cls.REQUIRED_FIELDS]
+                        for r in records], dtype=str)
+        raw = np.char.strip(np.char.translate(raw, DIGITS_TABLE))
+        float_cols = [cls.REQUIRED_FIELDS.index(f) for f in cls.FLOAT_FIELDS]
+        raw[:, float_cols] = np.char.replace(raw[:, float_cols], ',', '.')
+        raw[raw == ''] = '0'
+
+        errors = {}
+        try:
+            values = raw.astype(np.float64)
+        except ValueError:
+            # rare path: locate the offending cells and zero them out
+            values = np.zeros(raw.shape)
+            for (i, j), cell in np.ndenumerate(raw):
+                try:
+                    values[i, j] = float(cell)
+                except ValueError:
+                    errors.setdefault(i, f"{cls.REQUIRED_FIELDS[j]}: قابل تبدیل به عدد نیست: {cell}")
+            values[list(errors)] = 0
+
+        # float() accepts 'inf' and 'nan', which the model can't score
+        for i, j in zip(*np.nonzero(~np.isfinite(values))):
+            errors.setdefault(int(i), f"{cls.REQUIRED_FIELDS[j]}: مقدار عددی معتبر نیست: {raw[i, j]}")
+        values[list(errors)] = 0
+
+        int_cols = [j for j, f in enumerate(cls.REQUIRED_FIELDS) if f not in cls.FLOAT_FIELDS]
+        values[:, int_cols] = np.trunc(values[:, int_cols])
+        return values, errors
+
+    @classmethod
+    def records_from_csv(cls, text: str):
+        """Records from a CSV export whose header row names the ``REQUIRED_FIELDS`` (extra columns are ignored)."""
+        reader = csv.DictReader(io.StringIO(text))
+        header = [h.strip() for h in (reader.fieldnames or [])]
+        missing = [f for f in cls.REQUIRED_FIELDS if f not in header]
+        if missing:
+            raise ValueError(f"ستون‌های زیر در فایل CSV وجود ندارند: {', '.join(missing)}")
+        reader.fieldnames = header
+        return [{f: row.get(f) for f in cls.REQUIRED_FIELDS} for row in reader]
+
+    def predict_batch(self, records):
+        """Score many records with one model call.
+
+        Returns ``(predictions, errors)``: one int per record (``None`` for
+        records listed in ``errors``, a ``{row: message}`` dict).
+        """
+        values, errors = self.features_to_matrix(records)
+        predictions = [None] * len(values)
+        valid = [i for i in range(len(values)) if i not in errors]
+        if valid:
+            for i, p in zip(valid, self.model.predict(values[valid])):
+                predictions[i] = int(p)
+        return predictions, errors
+
+    def warmup(self):
+        self.model.predict(np.zeros((1, len(self.REQUIRED_FIELDS))))
+
+    def extract_features_from_image(self, uploaded_file):
+        try:
+            image = Image.open(uploaded_file)
+        except Exception as e:
+            raise ValueError(f"خطا در باز کردن فایل تصویر: {e}")
+        with stage('diabetes', 'ocr'):
+            text = run_ocr(image)
+        return self.extract_features_from_text(text)
+
+    @classmethod
+    def keyword_extractor(cls) -> KeywordExtractor:
+        if cls._keyword_extractor is None:
+            cls._keyword_extractor = KeywordExtractor(cls.KEYWORDS)
+        return cls._keyword_extractor
+
+    def extract_fields_from_text(self, text: str):
+        """``{field: ExtractedField}`` with value, matched keyword, position and confidence."""
+        return self.keyword_extractor().extract(normalize_ocr_text(text))
+
+    def extract_features_from_text(self, text: str):
+        with stage('diabetes', 'extract_fields'):
+            fields = self.extract_fields_from_text(text)
+        features = {field: match.value for field, match in fields.items()}
+        logger.info("ocr fields extracted", extra={
+            'chars': len(text or ''),
+            'found': sorted(features),
+            'missing': [f for f in self.REQUIRED_FIELDS if f not in features],
+        })
+        # the report text and values are patient data: only at DEBUG
+        logger.debug("ocr text", extra={'text': normalize_ocr_text(text), 'features': features})
+
+        return features
+
+    def get_field_description(self, field_name):
+        return self.FIELD_DESCRIPTIONS.get(field_name, field_name)
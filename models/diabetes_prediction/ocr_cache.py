@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class OCRCache:
+    """Two-tier cache of OCR results keyed by a hash of the uploaded bytes.
+
+    An in-memory LRU holds the ``max_entries`` most recent results; when
+    ``disk_path`` is given, every result is also written to a SQLite file
+    (trimmed to ``disk_max_entries`` least-recently-used rows) so repeat
+    uploads stay instant across restarts and worker processes.
+    """
+
+    def __init__(self, max_entries: int = 256, disk_path: str = None, disk_max_entries: int = 5000):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk_path = disk_path
+        self._conn = None
+        self._conn_pid = None
+
+    def _db(self):
+        # opened on first use and again after a fork, so a preloading master
+        # never shares its connection with the workers (call with _lock held)
+        if not self.disk_path:
+            return None
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_results ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)")
+        return self._conn
+
+    @staticmethod
+    def key(data: bytes, settings) -> str:
+        """Cache key for image ``data`` read with ``settings`` (anything with a stable ``repr``)."""
+        digest = hashlib.sha256(data)
+        digest.update(repr(settings).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            conn = self._db()
+            if conn is not None:
+                row = conn.execute("SELECT value FROM ocr_results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    with conn:
+                        conn.execute("UPDATE ocr_results SET last_used = ? WHERE key = ?", (time.time(), key))
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._remember(key, value)
+            conn = self._db()
+            if conn is None:
+                return
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ocr_results (key, value, last_used) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), time.time()))
+                conn.execute(
+                    "DELETE FROM ocr_results WHERE key NOT IN "
+                    "(SELECT key FROM ocr_results ORDER BY last_used DESC LIMIT ?)", (self.disk_max_entries,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'memory_entries': len(self._memory)}
@@ -0,0 +1,175 @@
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from models.diabetes_prediction.ml_model import ocr_image_bytes
+
+# extra seconds before a job is declared timed out, for image decoding and
+# (while queued) the pool's start-up
+GRACE_SECONDS = 5
+
+
+class OCRQueueFull(Exception):
+    pass
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_jobs ("
+            "job_id TEXT PRIMARY KEY, state TEXT NOT NULL, tag TEXT, text TEXT, message TEXT, "
+            "submitted REAL NOT NULL, started REAL, finished REAL)")
+    return conn
+
+
+def _run_job(path, job_id, image_bytes, timeout):
+    # runs in the pool process: the job's clock starts here, not at submission
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("UPDATE ocr_jobs SET state = 'running', started = ? WHERE job_id = ? AND state = 'queued'",
+                         (time.time(), job_id))
+    finally:
+        conn.close()
+    return ocr_image_bytes(image_bytes, timeout)
+
+
+class OCRJobQueue:
+    """Runs Tesseract on a bounded process pool, off the request thread.
+
+    ``submit`` hands back a job id right away (or raises ``OCRQueueFull`` when
+    ``max_pending`` jobs of this process are already in flight); ``status`` is
+    polled until the job is ``done``, ``error`` or ``timeout``. Each job is
+    limited to ``timeout`` seconds from when it starts running: Tesseract
+    itself is killed at that point, and a job still not finished shortly
+    after is reported as timed out regardless. Finished jobs are forgotten
+    after ``retention`` seconds.
+
+    Job state is kept in the SQLite file at ``path``, so a poll can be
+    answered by any worker process, not only the one that accepted the upload.
+    """
+
+    def __init__(self, path: str, max_workers: int = 2, max_pending: int = 8, timeout: float = 30,
+                 retention: float = 600):
+        self.path = path
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retention = retention
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _db(self):
+        # opened on first use and again after a fork (call with _lock held)
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = _connect(self.path)
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn, not fork: the web process is multi-threaded
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _queue_limit(self) -> float:
+        # longest a job can wait behind the others this process accepted
+        return self.timeout * math.ceil(self.max_pending / self.max_workers) + GRACE_SECONDS
+
+    def _prune(self, now):
+        conn = self._db()
+        with conn:
+            conn.execute("DELETE FROM ocr_jobs WHERE submitted < ? AND state NOT IN ('queued', 'running')",
+                         (now - self.retention,))
+            # left behind by a process that died before the job finished
+            conn.execute("DELETE FROM ocr_jobs WHERE submitted < ?",
+                         (now - self.retention - self._queue_limit() - self.timeout,))
+
+    def _finish(self, job_id, future):
+        if future.cancelled():
+            state, text, message = 'timeout', None, None
+        elif future.exception() is not None:
+            state, text, message = 'error', None, str(future.exception())
+        else:
+            state, text, message = 'done', future.result(), None
+        with self._lock:
+            self._futures.pop(job_id, None)
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "UPDATE ocr_jobs SET state = ?, text = ?, message = ?, finished = ? "
+                    "WHERE job_id = ? AND state IN ('queued', 'running')",
+                    (state, text, message, time.time(), job_id))
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._futures)
+
+    def submit(self, image_bytes: bytes, tag=None) -> str:
+        """Queue ``image_bytes``; ``tag`` is handed back by ``status`` (e.g. a cache key)."""
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            if len(self._futures) >= self.max_pending:
+                raise OCRQueueFull(f"{len(self._futures)} OCR jobs already in progress")
+            job_id = uuid.uuid4().hex
+            conn = self._db()
+            with conn:
+                conn.execute("INSERT INTO ocr_jobs (job_id, state, tag, submitted) VALUES (?, 'queued', ?, ?)",
+                             (job_id, tag, now))
+            future = self._pool().submit(_run_job, self.path, job_id, image_bytes, self.timeout)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT state, tag, text, message, submitted, started FROM ocr_jobs WHERE job_id = ?",
+                (job_id,)).fetchone()
+        if row is None:
+            return {'status': 'unknown'}
+
+        state, tag, text, message, submitted, started = row
+        if state == 'queued' or state == 'running':
+            now = time.time()
+            if state == 'running':
+                expired = now - started > self.timeout + GRACE_SECONDS
+            else:
+                expired = now - submitted > self._queue_limit()
+            if not expired:
+                return {'status': 'pending'}
+            with self._lock:
+                future = self._futures.get(job_id)
+                conn = self._db()
+                with conn:
+                    conn.execute("UPDATE ocr_jobs SET state = 'timeout', finished = ? WHERE job_id = ?",
+                                 (now, job_id))
+            if future is not None:
+                future.cancel()
+            return {'status': 'timeout'}
+
+        if state == 'error':
+            return {'status': 'error', 'message': message}
+        if state == 'done':
+            return {'status': 'done', 'text': text, 'tag': tag}
+        return {'status': state}
+
+    def discard(self, job_id: str):
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute("DELETE FROM ocr_jobs WHERE job_id = ?", (job_id,))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,126 @@
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+# Tesseract is most accurate around 300 DPI; phone photos of a lab report are
+# usually far larger than that, which only costs time
+TARGET_DPI = 300
+MAX_SIDE = 2200
+
+
+def downscale(image: Image.Image, target_dpi: int = TARGET_DPI, max_side: int = MAX_SIDE) -> Image.Image:
+    scale = 1.0
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] and dpi[0] > target_dpi:
+        scale = target_dpi / float(dpi[0])
+    longest = max(image.size) * scale
+    if longest > max_side:
+        scale *= max_side / longest
+    if scale >= 1.0:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    sum_bg = np.cumsum(levels * hist)
+    mean_bg = np.divide(sum_bg, weight_bg, out=np.zeros(256), where=weight_bg > 0)
+    mean_fg = np.divide(sum_bg[-1] - sum_bg, weight_fg, out=np.zeros(256), where=weight_fg > 0)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def estimate_skew(binary: Image.Image, max_angle: float = 5.0, step: float = 0.5) -> float:
+    """Rotation (degrees) that makes text rows most horizontal, by projection-profile variance."""
+    probe = binary.copy()
+    probe.thumbnail((800, 800))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = probe.rotate(float(angle), resample=Image.NEAREST, fillcolor=255)
+        ink_per_row = (np.asarray(rotated) < 128).sum(axis=1)
+        score = float(np.var(ink_per_row))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess(image: Image.Image, deskew: bool = True) -> Image.Image:
+    """Downscale, grayscale, binarize (Otsu) and optionally deskew an uploaded report."""
+    image = ImageOps.exif_transpose(image)
+    gray = downscale(image).convert('L')
+    pixels = np.asarray(gray)
+    binary = Image.fromarray(np.where(pixels > otsu_threshold(pixels), 255, 0).astype(np.uint8))
+    if deskew:
+        angle = estimate_skew(binary)
+        if angle:
+            binary = binary.rotate(angle, resample=Image.NEAREST, expand=True, fillcolor=255)
+    return binary
+
+
+def keyword_regions(image: Image.Image, keywords, lang: str, timeout: float = 0,
+                    probe_scale: float = 0.5, pad: int = 6):
+    """Boxes ``(left, top, right, bottom)`` of text lines mentioning any of ``keywords``.
+
+    Found with one quick ``image_to_data`` pass over a reduced copy of the
+    image; boxes are returned in full-resolution coordinates.
+    """
+    small = image.resize((max(1, int(image.width * probe_scale)), max(1, int(image.height * probe_scale))))
+    data = pytesseract.image_to_data(small, lang=lang, timeout=timeout, output_type=pytesseract.Output.DICT)
+
+    lines = {}
+    for i, word in enumerate(data['text']):
+        if not word or not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        left, top = data['left'][i], data['top'][i]
+        right, bottom = left + data['width'][i], top + data['height'][i]
+        line = lines.setdefault(key, {'words': [], 'box': [left, top, right, bottom]})
+        line['words'].append(word.lower())
+        box = line['box']
+        line['box'] = [min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)]
+
+    needles = [k.lower() for k in keywords]
+    boxes = []
+    for line in lines.values():
+        text = ' '.join(line['words'])
+        if any(n in text or n in text.replace(' ', '') for n in needles):
+            left, top, right, bottom = (int(v / probe_scale) for v in line['box'])
+            # keep the whole row: values are often right-aligned far from the label
+            boxes.append((0, max(0, top - pad), image.width, min(image.height, bottom + pad)))
+    return sorted(boxes, key=lambda b: b[1])
+
+
+def merge_rows(boxes):
+    """``boxes`` (sorted by top) with overlapping rows joined, so no line is read twice."""
+    merged = []
+    for box in boxes:
+        if merged and box[1] <= merged[-1][3]:
+            last = merged[-1]
+            merged[-1] = (min(last[0], box[0]), last[1], max(last[2], box[2]), max(last[3], box[3]))
+        else:
+            merged.append(tuple(box))
+    return merged
+
+
+def stack_regions(image: Image.Image, boxes, gap: int = 12) -> Image.Image:
+    """The crops of ``boxes`` one under the other on white, ``gap`` pixels apart."""
+    crops = [image.crop(box) for box in merge_rows(boxes)]
+    sheet = Image.new(image.mode, (max(c.width for c in crops), sum(c.height for c in crops) + gap * (len(crops) - 1)),
+                      255 if image.mode in ('L', '1') else 'white')
+    top = 0
+    for crop in crops:
+        sheet.paste(crop, (0, top))
+        top += crop.height + gap
+    return sheet
+
+
+def ocr_regions(image: Image.Image, boxes, lang: str, timeout: float = 0) -> str:
+    """Text of the rows in ``boxes``, read in one Tesseract run over the stacked crops."""
+    if not boxes:
+        return ''
+    return pytesseract.image_to_string(stack_regions(image, boxes), lang=lang, timeout=timeout,
+                                       config='--psm 6').strip()
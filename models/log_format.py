@@ -0,0 +1,25 @@
+import json
+import logging
+
+# attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event (the message) and the ``extra`` fields.
+
+    ``logger.info("movie request", extra={'query': q, 'ms': 12.5})`` becomes
+    ``{"time": ..., "level": "INFO", "logger": ..., "event": "movie request", "query": ..., "ms": 12.5}``.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
@@ -0,0 +1,169 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus' default buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# the stages timed during the current request (see collect_timings); the list
+# is shared with threads and tasks started from the request, which copy the context
+_timings = contextvars.ContextVar('mlchat_timings', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {value:g}')
+        return lines
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus exposition format, one series per label values."""
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, *labelvalues) -> dict:
+        """``{'count', 'sum'}`` of one series (zeros if it was never observed)."""
+        series = self._series.get(labelvalues)
+        if series is None:
+            return {'count': 0, 'sum': 0.0}
+        return {'count': series[2], 'sum': series[1]}
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labelvalues, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    labels = _format_labels(self.labelnames, labelvalues, [('le', f'{bound:g}')])
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labelnames, labelvalues, [('le', '+Inf')])
+                lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f'{self.name}_sum{labels} {total:.6f}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this process; ``render`` is what ``/metrics`` serves.
+
+    Every worker process keeps its own counts, so with several workers a
+    scrape sees the worker that answered it.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'mlchat_stage_seconds', 'Time spent in one stage of a model call.', ('model', 'stage'))
+PREDICT_SECONDS = REGISTRY.histogram(
+    'mlchat_predict_seconds', 'MLModelHandler prediction time by model and result status.', ('model', 'status'))
+HTTP_SECONDS = REGISTRY.histogram(
+    'mlchat_http_request_seconds', 'Request time until the response headers, by view.', ('view', 'method', 'status'))
+BATCH_SIZE = REGISTRY.histogram(
+    'mlchat_batch_size', 'Items per micro-batch (models.batching.MicroBatcher) call.', ('batcher',),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_QUEUE_SECONDS = REGISTRY.histogram(
+    'mlchat_batch_queue_seconds', 'Time an item waited in a micro-batcher queue before its batch ran.', ('batcher',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+CACHE_LOOKUPS = REGISTRY.counter(
+    'mlchat_cache_lookups_total', 'Cache lookups by cache and result (hit or miss).', ('cache', 'result'))
+
+
+@contextmanager
+def stage(model: str, name: str):
+    """Time the block into ``mlchat_stage_seconds`` and the current request's breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, model, name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((f'{model}.{name}', elapsed))
+
+
+@contextmanager
+def collect_timings():
+    """Collect the ``stage`` timings of this context into the yielded list of ``(stage, seconds)``."""
+    timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def current_timings() -> list:
+    """``[{'stage', 'ms'}]`` recorded so far in this request, in the order the stages finished."""
+    return [{'stage': name, 'ms': round(seconds * 1000, 2)} for name, seconds in (_timings.get() or [])]
@@ -1,73 +1,391 @@
-from models.diabetes_prediction.ml_model import DiabetesModel
-from models.movie_recommender.ml_model import MovieRecommender
-
-
-class MLModelHandler:
-    def __init__(self):
-        self.models = {
-            'diabetes': DiabetesModel(),
-            'movie': MovieRecommender()
-        }
-
-    def predict(self, model_name, data):
-        if model_name not in self.models:
-            raise ValueError(f"Model '{model_name}' not found.")
-
-        model = self.models[model_name]
-
-        if model_name == 'diabetes':
-            if 'image' in data and data['image'] is not None:
-                try:
-                    features = model.extract_features_from_image(data['image'])
-                    missing = [f for f in DiabetesModel.REQUIRED_FIELDS if f not in features or features[f] == '']
-                    if missing:
-                        return {"type": "diabetes", "status": "incomplete", "missing_fields": missing, "source": "image", "features": features}
-                    result = model.predict(features)
-                    return {"type": "diabetes", "status": "success", "result": result, "source": "image", "features": features}
-                except Exception as e:
-                    return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پردازش تصویر: {e}"}
-
-            provided_keys = set(data.keys())
-            required = set(DiabetesModel.REQUIRED_FIELDS)
-            missing = [f for f in DiabetesModel.REQUIRED_FIELDS if f not in data or data.get(f) in [None, ""]]
-            if not missing and required.issubset(provided_keys):
-                try:
-                    result = model.predict(data)
-                    return {"type": "diabetes", "status": "success", "result": result, "source": "form"}
-                except Exception as e:
-                    return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پیش‌بینی: {e}"}
-            else:
-                return {"type": "diabetes", "status": "incomplete", "missing_fields": missing}
-
-        elif model_name == 'movie':
-            title_or_genre = data.get('title', '').strip()
-            if not title_or_genre:
-                return {"type": "movie", "status": "error", "message": "لطفاً نام فیلم یا ژانر را وارد کنید"}
-
-            try:
-                titles, posters_or_options = model.recommend(title_or_genre)
-            except Exception as e:
-                return {"type": "movie", "status": "error", "message": f"خطا در سیستم پیشنهاددهی: {e}"}
-
-            # titles == None  => need confirmation/options
-            if titles is None:
-                return {
-                    "type": "movie",
-                    "status": "need_confirmation",
-                    "options": posters_or_options,
-                    "message": "کدام یک از این فیلم‌ها مد نظر شماست؟"
-                }
-            elif not titles:
-                return {
-                    "type": "movie",
-                    "status": "error",
-                    "message": "متأسفانه فیلمی با این عنوان یا ژانر پیدا نشد. لطفاً چیز دیگری امتحان کنید."
-                }
-            else:
-                return {
-                    "type": "movie",
-                    "status": "success",
-                    "titles": titles,
-                    "posters": posters_or_options,
-                    "message": f"نتایج پیشنهادی برای '{title_or_genre}':"
-                }
+import asyncio
+import os
+import time
+from models.batching import MicroBatcher
+from models.metrics import PREDICT_SECONDS, stage
+from models.registry import ModelRegistry
+from models.diabetes_prediction import ml_model as diabetes_ml_model
+from models.diabetes_prediction.ml_model import DiabetesModel, ocr_image_bytes
+from models.diabetes_prediction.ocr_cache import OCRCache
+from models.diabetes_prediction.ocr_jobs import OCRJobQueue
+
+
+def _load_movie_recommender():
+    # the movie catalog and the translator client are only loaded when the movie
+    # model is first needed
+    from models.movie_recommender.ml_model import MovieRecommender
+
+    # MOVIE_RESULT_CACHE_BACKEND names a Django cache alias (e.g. 'default')
+    # to share cached recommendations between worker processes
+    backend = None
+    alias = os.environ.get('MOVIE_RESULT_CACHE_BACKEND')
+    if alias:
+        from django.core.cache import caches
+        backend = caches[alias]
+    return MovieRecommender(result_cache_backend=backend)
+
+
+class MLModelHandler:
+    def __init__(self, batching=None, preload=None):
+        # models are built on first use; see preload()/warmup() for eager loading
+        self.models = ModelRegistry({
+            'diabetes': DiabetesModel,
+            'movie': _load_movie_recommender,
+        })
+
+        # MLCHAT_PRELOAD=all (or a comma-separated list of model names);
+        # preload_names is None for all of them, [] for none
+        if preload is None:
+            preload = os.environ.get('MLCHAT_PRELOAD', '')
+        preload = preload.strip()
+        self.preload_names = None if preload == 'all' else [n.strip() for n in preload.split(',') if n.strip()]
+        if self.preload_names is None or self.preload_names:
+            self.preload(self.preload_names)
+
+        # optional dynamic batching of single diabetes predictions under
+        # concurrent load (MLCHAT_MICROBATCH=1)
+        if batching is None:
+            batching = os.environ.get('MLCHAT_MICROBATCH', '').lower() in ('1', 'true', 'yes')
+        self.batchers = {}
+        if batching:
+            self.batchers['diabetes'] = MicroBatcher(
+                self._diabetes_batch,
+                max_batch_size=int(os.environ.get('MLCHAT_MICROBATCH_MAX_SIZE', 32)),
+                max_wait_ms=float(os.environ.get('MLCHAT_MICROBATCH_MAX_WAIT_MS', 5)),
+                timeout=float(os.environ.get('MLCHAT_MICROBATCH_TIMEOUT', 30)),
+                name='diabetes',
+            )
+
+        # background OCR for uploads; the process pool starts on first use and
+        # job state is shared by all worker processes through SQLite
+        self.ocr_jobs = OCRJobQueue(
+            os.environ.get('MLCHAT_OCR_JOBS_PATH') or os.path.join(
+                os.path.dirname(__file__), 'diabetes_prediction', 'ocr_jobs.sqlite3'),
+            max_workers=int(os.environ.get('MLCHAT_OCR_WORKERS', 2)),
+            max_pending=int(os.environ.get('MLCHAT_OCR_MAX_PENDING', 8)),
+            timeout=float(os.environ.get('MLCHAT_OCR_TIMEOUT', 30)),
+        )
+        # repeat uploads of the same photo skip OCR entirely
+        ocr_cache_path = os.environ.get('MLCHAT_OCR_CACHE_PATH', os.path.join(
+            os.path.dirname(__file__), 'diabetes_prediction', 'ocr_cache.sqlite3'))
+        self.ocr_cache = OCRCache(
+            max_entries=int(os.environ.get('MLCHAT_OCR_CACHE_SIZE', 256)),
+            disk_path=ocr_cache_path or None,
+        )
+
+    def _diabetes_batch(self, records):
+        # invalid records come back in errors and fail only their own request
+        predictions, errors = self.models['diabetes'].predict_batch(records)
+        return [ValueError(errors[i]) if i in errors else p for i, p in enumerate(predictions)]
+
+    def _predict_diabetes(self, features):
+        batcher = self.batchers.get('diabetes')
+        if batcher is not None:
+            return batcher(features)
+        return self.models['diabetes'].predict(features)
+
+    def preload(self, names=None, freeze=False):
+        self.models.preload(names, freeze=freeze)
+
+    def warmup(self, names=None):
+        self.models.warmup(names)
+
+    def reload(self, name):
+        """Rebuild a model from its artifacts; cached movie results of the old artifacts are no longer served."""
+        return self.models.reload(name)
+
+    def ingest_movies(self, movies):
+        """Add movies to the catalog (see ``models.movie_recommender.ingest``) and switch this
+        process to the new release; other workers follow within ``MOVIE_RELEASE_CHECK_SECONDS``."""
+        from models.movie_recommender.ingest import ingest
+
+        try:
+            summary = ingest(movies)
+        except Exception as e:
+            return {"type": "movie", "status": "error", "message": f"خطا در افزودن فیلم‌ها: {e}"}
+        if self.models.is_loaded('movie'):
+            self.reload('movie')
+        return {"type": "movie", "status": "success", **summary,
+                "message": f"{summary['added']} فیلم اضافه شد."}
+
+    def result_cache_stats(self):
+        if not self.models.is_loaded('movie') or self.models['movie'].result_cache is None:
+            return {}
+        return self.models['movie'].result_cache.stats()
+
+    def _diabetes_from_features(self, features):
+        missing = [f for f in DiabetesModel.REQUIRED_FIELDS if f not in features or features[f] == '']
+        if missing:
+            return {"type": "diabetes", "status": "incomplete", "missing_fields": missing, "source": "image", "features": features}
+        result = self._predict_diabetes(features)
+        return {"type": "diabetes", "status": "success", "result": result, "source": "image", "features": features}
+
+    @staticmethod
+    def _read_upload(image):
+        if hasattr(image, 'seek'):
+            image.seek(0)
+        return image.read()
+
+    @staticmethod
+    def _ocr_cache_key(data):
+        # anything that changes the text or the extracted features is part of the key
+        return OCRCache.key(data, (diabetes_ml_model.OCR_LANG, diabetes_ml_model.OCR_MODE, DiabetesModel.KEYWORDS))
+
+    def _features_from_text(self, key, text):
+        features = self.models['diabetes'].extract_features_from_text(text)
+        self.ocr_cache.put(key, {'text': text, 'features': features})
+        return features
+
+    def _image_features(self, image):
+        data = self._read_upload(image)
+        key = self._ocr_cache_key(data)
+        cached = self.ocr_cache.get(key)
+        if cached is not None:
+            return cached['features']
+        with stage('diabetes', 'ocr'):
+            text = ocr_image_bytes(data)
+        return self._features_from_text(key, text)
+
+    def submit_ocr(self, image):
+        """Start OCR of an uploaded image in the background. Raises ``OCRQueueFull``.
+
+        Returns the finished result straight away when this image was seen
+        before, otherwise a ``pending`` result whose ``job_id`` goes to ``ocr_result``.
+        """
+        data = self._read_upload(image)
+        key = self._ocr_cache_key(data)
+        cached = self.ocr_cache.get(key)
+        if cached is not None:
+            try:
+                return self._diabetes_from_features(cached['features'])
+            except Exception as e:
+                return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پردازش تصویر: {e}"}
+        return {"type": "diabetes", "status": "pending", "job_id": self.ocr_jobs.submit(data, tag=key)}
+
+    def ocr_result(self, job_id):
+        status = self.ocr_jobs.status(job_id)
+        if status['status'] == 'pending':
+            return {"type": "diabetes", "status": "pending", "job_id": job_id}
+
+        self.ocr_jobs.discard(job_id)
+        if status['status'] == 'done':
+            try:
+                return self._diabetes_from_features(self._features_from_text(status['tag'], status['text']))
+            except Exception as e:
+                return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پردازش تصویر: {e}"}
+        if status['status'] == 'timeout':
+            return {"type": "diabetes", "status": "error", "message": "پردازش تصویر بیش از حد طول کشید. لطفاً تصویر واضح‌تر یا کوچک‌تری ارسال کنید."}
+        if status['status'] == 'unknown':
+            return {"type": "diabetes", "status": "error", "message": "درخواست پردازش تصویر پیدا نشد. لطفاً دوباره تصویر را ارسال کنید."}
+        return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پردازش تصویر: {status.get('message')}"}
+
+    def batching_stats(self):
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
+
+    @staticmethod
+    def _observe_predict(model_name, start, result):
+        status = result.get('status', 'unknown') if isinstance(result, dict) else 'unknown'
+        PREDICT_SECONDS.observe(time.perf_counter() - start, model_name, status)
+
+    def predict(self, model_name, data):
+        start = time.perf_counter()
+        result = self._predict(model_name, data)
+        self._observe_predict(model_name, start, result)
+        return result
+
+    def _predict(self, model_name, data):
+        if model_name not in self.models:
+            raise ValueError(f"Model '{model_name}' not found.")
+
+        model = self.models[model_name]
+
+        if model_name == 'diabetes':
+            if 'image' in data and data['image'] is not None:
+                try:
+                    return self._diabetes_from_features(self._image_features(data['image']))
+                except Exception as e:
+                    return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پردازش تصویر: {e}"}
+
+            provided_keys = set(data.keys())
+            required = set(DiabetesModel.REQUIRED_FIELDS)
+            missing = [f for f in DiabetesModel.REQUIRED_FIELDS if f not in data or data.get(f) in [None, ""]]
+            if not missing and required.issubset(provided_keys):
+                try:
+                    result = self._predict_diabetes(data)
+                    return {"type": "diabetes", "status": "success", "result": result, "source": "form"}
+                except Exception as e:
+                    return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پیش‌بینی: {e}"}
+            else:
+                return {"type": "diabetes", "status": "incomplete", "missing_fields": missing}
+
+        elif model_name == 'movie':
+            title_or_genre = data.get('title', '').strip()
+            if not title_or_genre:
+                return {"type": "movie", "status": "error", "message": "لطفاً نام فیلم یا ژانر را وارد کنید"}
+
+            try:
+                titles, posters_or_options = model.recommend(title_or_genre)
+            except Exception as e:
+                return {"type": "movie", "status": "error", "message": f"خطا در سیستم پیشنهاددهی: {e}"}
+            return self._movie_response(title_or_genre, titles, posters_or_options)
+
+    def recommend_for_seeds(self, seeds, k: int = 5):
+        """Movie recommendations blended from several seed titles (see ``MovieRecommender.recommend_from_seeds``)."""
+        start = time.perf_counter()
+        try:
+            titles, posters = self.models['movie'].recommend_from_seeds(seeds, k)
+        except Exception as e:
+            result = {"type": "movie", "status": "error", "message": f"خطا در سیستم پیشنهاددهی: {e}"}
+        else:
+            if titles:
+                result = {"type": "movie", "status": "success", "titles": titles, "posters": posters,
+                          "message": "پیشنهادهای شما بر اساس فیلم‌هایی که انتخاب کرده‌اید:"}
+            else:
+                result = {"type": "movie", "status": "error",
+                          "message": "هنوز فیلمی انتخاب نکرده‌اید. ابتدا نام یک فیلم را جستجو کنید."}
+        self._observe_predict('movie_seeds', start, result)
+        return result
+
+    @staticmethod
+    def _movie_response(title_or_genre, titles, posters_or_options):
+        # titles == None  => need confirmation/options
+        if titles is None:
+            return {
+                "type": "movie",
+                "status": "need_confirmation",
+                "options": posters_or_options,
+                "message": "کدام یک از این فیلم‌ها مد نظر شماست؟"
+            }
+        elif not titles:
+            return {
+                "type": "movie",
+                "status": "error",
+                "message": "متأسفانه فیلمی با این عنوان یا ژانر پیدا نشد. لطفاً چیز دیگری امتحان کنید."
+            }
+        else:
+            return {
+                "type": "movie",
+                "status": "success",
+                "titles": titles,
+                "posters": posters_or_options,
+                "message": f"نتایج پیشنهادی برای '{title_or_genre}':"
+            }
+
+    async def apredict(self, model_name, data):
+        """``predict`` for async views.
+
+        Model work runs on worker threads so the event loop stays free; movie
+        posters are fetched with the async HTTP client (see ``MovieRecommender.arecommend``).
+        """
+        if model_name != 'movie':
+            return await asyncio.to_thread(self.predict, model_name, data)
+
+        start = time.perf_counter()
+        result = await self._apredict_movie(data)
+        self._observe_predict('movie', start, result)
+        return result
+
+    async def _apredict_movie(self, data):
+        title_or_genre = data.get('title', '').strip()
+        if not title_or_genre:
+            return {"type": "movie", "status": "error", "message": "لطفاً نام فیلم یا ژانر را وارد کنید"}
+        try:
+            model = await asyncio.to_thread(self.models.get, 'movie')
+            titles, posters_or_options = await model.arecommend(title_or_genre)
+        except Exception as e:
+            return {"type": "movie", "status": "error", "message": f"خطا در سیستم پیشنهاددهی: {e}"}
+        return self._movie_response(title_or_genre, titles, posters_or_options)
+
+    async def asubmit_ocr(self, image):
+        return await asyncio.to_thread(self.submit_ocr, image)
+
+    def start_movie_stream(self, title_or_genre):
+        """First step of a streamed movie recommendation: ``(event, state)``.
+
+        ``event`` is ``titles``, ``options`` or ``error`` and comes as soon as
+        the model has matched the query (from the result cache when it can,
+        like ``predict``). For ``titles``, ``state`` (plain JSON, so it can be
+        kept in the session) is handed to ``stream_movie_details`` for the
+        posters and translations; otherwise it is ``None``.
+        """
+        start = time.perf_counter()
+        event, state = self._start_movie_stream(title_or_genre)
+        if state is None:
+            status = 'need_confirmation' if event['event'] == 'options' else 'error'
+            PREDICT_SECONDS.observe(time.perf_counter() - start, 'movie', status)
+        else:
+            state['seconds'] = time.perf_counter() - start
+        return event, state
+
+    def _start_movie_stream(self, title_or_genre):
+        title_or_genre = (title_or_genre or '').strip()
+        if not title_or_genre:
+            return {"event": "error", "message": "لطفاً نام فیلم یا ژانر را وارد کنید"}, None
+
+        try:
+            model = self.models['movie']
+            key, kind, positions, user_used_farsi, titles = model.resolve(title_or_genre)
+            cached = titles is not None
+            if not cached:
+                titles, failed = model.titles_at(positions), set()
+                if kind == 'options' and user_used_farsi:
+                    titles = model.translate_many_to_fa(titles, failed)
+                if kind == 'options':
+                    model.remember(key, kind, positions, titles, complete=not failed)
+        except Exception as e:
+            return {"event": "error", "message": f"خطا در سیستم پیشنهاددهی: {e}"}, None
+
+        if not titles:
+            return {"event": "error", "message": "متأسفانه فیلمی با این عنوان یا ژانر پیدا نشد. لطفاً چیز دیگری امتحان کنید."}, None
+        if kind == 'options':
+            return {"event": "options", "options": titles, "message": "کدام یک از این فیلم‌ها مد نظر شماست؟"}, None
+
+        event = {"event": "titles", "titles": titles, "message": f"نتایج پیشنهادی برای '{title_or_genre}':"}
+        state = {'key': list(key), 'positions': [int(p) for p in positions], 'titles': titles,
+                 'translate': user_used_farsi and not cached, 'remember': not cached}
+        return event, state
+
+    def stream_movie_details(self, state):
+        """Yields a ``poster`` and, for Persian queries, a ``title`` event per movie of a
+        ``start_movie_stream`` result, as those resolve."""
+        start = time.perf_counter()
+        model = self.models['movie']
+        titles, failed = list(state['titles']), set()
+        for kind, index, value in model.stream_details(state['positions'], translate=state['translate'],
+                                                        failed=failed):
+            if kind == 'title':
+                titles[index] = value
+            yield {"event": kind, "index": index, kind: value}
+        if state['remember']:
+            model.remember(tuple(state['key']), 'results', state['positions'], titles, complete=not failed)
+        PREDICT_SECONDS.observe(state['seconds'] + time.perf_counter() - start, 'movie', 'success')
+
+    def predict_batch(self, model_name, records):
+        if model_name != 'diabetes':
+            raise ValueError(f"Batch prediction is not supported for model '{model_name}'.")
+        if not records:
+            return {"type": "diabetes", "status": "error", "message": "هیچ رکوردی ارسال نشده است."}
+
+        model = self.models['diabetes']
+        try:
+            predictions, errors = model.predict_batch(records)
+        except Exception as e:
+            return {"type": "diabetes", "status": "error", "message": f"خطا هنگام پیش‌بینی: {e}"}
+
+        results = []
+        for i, (record, prediction) in enumerate(zip(records, predictions)):
+            missing = [f for f in DiabetesModel.REQUIRED_FIELDS if record.get(f) in [None, ""]]
+            if missing:
+                results.append({"index": i, "status": "incomplete", "missing_fields": missing})
+            elif i in errors:
+                results.append({"index": i, "status": "error", "message": errors[i]})
+            else:
+                results.append({"index": i, "status": "success", "result": prediction})
+
+        return {
+            "type": "diabetes",
+            "status": "success",
+            "count": len(results),
+            "succeeded": sum(1 for r in results if r["status"] == "success"),
+            "results": results,
+        }
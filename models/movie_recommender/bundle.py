@@ -0,0 +1,242 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from models.movie_recommender.catalog import MovieCatalog, TextColumn
+from models.movie_recommender.fuzzy import FuzzyTitleMatcher
+from models.movie_recommender.similarity_store import (
+    DEFAULT_NEIGHBOR_DEPTH, SIMILARITY_NPY, SIMILARITY_PKL, build_neighbors, convert_pickle, save_neighbors,
+)
+from models.movie_recommender.releases import published_dir, save_version
+from models.movie_recommender.text_index import SubstringIndex
+
+BUNDLE_DIR = 'movies.bundle'
+MANIFEST = 'manifest.json'
+BUNDLE_FORMAT = 'mlchat-movies'
+BUNDLE_VERSION = 2
+NGRAM = 3
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _put_text(arrays: dict, name: str, texts):
+    # one UTF-8 blob plus byte offsets instead of a fixed-width unicode
+    # array, which would pad every tag string to the longest one
+    column = TextColumn.from_texts(texts)
+    arrays[f'{name}.utf8'] = column.blob
+    arrays[f'{name}.offsets'] = column.offsets
+
+
+def _get_text(arrays: dict, name: str) -> TextColumn:
+    return TextColumn(arrays[f'{name}.utf8'], arrays[f'{name}.offsets'])
+
+
+def _put_postings(arrays: dict, name: str, postings, extra_name: str):
+    grams, offsets, rows, extra = postings
+    # sorted and fixed-width (every gram has at most NGRAM characters), so it is binary-searched in place
+    arrays[f'{name}.grams'] = np.array(grams, dtype=f'U{NGRAM}')
+    arrays[f'{name}.offsets'] = offsets
+    arrays[f'{name}.rows'] = rows
+    arrays[f'{name}.{extra_name}'] = extra
+
+
+def _open_array(path: str) -> np.ndarray:
+    array = np.load(path, mmap_mode='r')
+    # numpy cannot mmap zero-length data; those arrays are empty anyway
+    return array if array.size else np.load(path)
+
+
+def bundle_manifest(path: str) -> str:
+    return os.path.join(published_dir(path), MANIFEST)
+
+
+class MovieBundle:
+    """The movie table and its search indexes, precomputed into one directory of ``.npy`` files.
+
+    ``python -m models.movie_recommender.bundle`` builds it from ``dict_mov.pkl``:
+    ids, titles and tags (plus the upper-cased texts the substring indexes
+    search and the lower-cased titles the fuzzy matcher scores) are stored as
+    UTF-8 blobs with byte offsets, and the n-gram posting lists of the three
+    indexes as sorted gram arrays and flat row arrays. Loading memory-maps
+    the arrays and wraps them as is: texts are ``TextColumn`` views decoded
+    one entry at a time, posting lists ``PostingLists`` found by binary
+    search, so nothing is decoded or rebuilt on boot. ``manifest.json``
+    records the format version, the sha256 of every file and of the
+    ``dict_mov.pkl`` it was built from.
+
+    Each save writes a new version directory (``v0001``, ...) and then points
+    ``CURRENT`` at it, so the bundle path never holds a half-written bundle.
+    """
+
+    def __init__(self, catalog, title_index, tags_index, fuzzy_matcher, manifest=None, path=None):
+        self.catalog = catalog
+        self.title_index = title_index
+        self.tags_index = tags_index
+        self.fuzzy_matcher = fuzzy_matcher
+        self.manifest = manifest or {}
+        self.path = path
+
+    @classmethod
+    def from_catalog(cls, catalog, fuzzy_cutoff: float = 0.4):
+        titles, tags = catalog.titles, catalog.tags
+        return cls(
+            catalog,
+            SubstringIndex(titles, n=NGRAM) if titles is not None else None,
+            SubstringIndex(tags, n=NGRAM) if tags is not None else None,
+            FuzzyTitleMatcher(titles, cutoff=fuzzy_cutoff, n=NGRAM) if titles is not None else None,
+        )
+
+    def extend(self, ids, titles, tags):
+        """Append movies: the catalog is replaced, the indexes get the new rows in place."""
+        self.catalog = self.catalog.appended(ids, titles, tags)
+        if self.title_index is not None:
+            self.title_index.extend(titles)
+            self.fuzzy_matcher.extend(titles)
+        if self.tags_index is not None:
+            self.tags_index.extend(tags)
+
+    @classmethod
+    def load(cls, path: str, source_sha256: str = None, verify: bool = False, fuzzy_cutoff: float = 0.4):
+        """Open the bundle published at ``path``; ``ValueError`` if it is from another format
+        version, was built from a different ``dict_mov.pkl`` than ``source_sha256``
+        or (with ``verify``) a file does not match its checksum."""
+        path = published_dir(path)
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != BUNDLE_FORMAT or manifest.get('version') != BUNDLE_VERSION:
+            raise ValueError(f"{path}: unsupported bundle format "
+                             f"{manifest.get('format')!r} v{manifest.get('version')}")
+        if source_sha256 and manifest.get('source', {}).get('sha256') != source_sha256:
+            raise ValueError(f"{path} was built from a different {manifest['source'].get('path')}")
+
+        arrays = {}
+        for filename, checksum in manifest['files'].items():
+            file_path = os.path.join(path, filename)
+            if verify and file_sha256(file_path) != checksum:
+                raise ValueError(f"{file_path}: checksum mismatch")
+            arrays[filename[:-len('.npy')]] = _open_array(file_path)
+
+        columns = manifest['columns']
+        titles = _get_text(arrays, 'title') if 'title' in columns else None
+        tags = _get_text(arrays, 'tags') if 'tags' in columns else None
+        catalog = MovieCatalog(arrays['ids'], titles, tags)
+        if len(catalog) != manifest['rows']:
+            raise ValueError(f"{path}: expected {manifest['rows']} rows, found {len(catalog)}")
+
+        n = manifest['ngram']
+        title_index = tags_index = fuzzy_matcher = None
+        if titles is not None:
+            title_index = SubstringIndex.from_postings(
+                _get_text(arrays, 'title_upper'), arrays['title_index.grams'],
+                arrays['title_index.offsets'], arrays['title_index.rows'], arrays['title_index.short_rows'], n=n)
+            fuzzy_matcher = FuzzyTitleMatcher.from_postings(
+                _get_text(arrays, 'title_lower'), arrays['fuzzy.grams'],
+                arrays['fuzzy.offsets'], arrays['fuzzy.rows'], arrays['fuzzy.gram_counts'],
+                cutoff=fuzzy_cutoff, n=n)
+        if tags is not None:
+            tags_index = SubstringIndex.from_postings(
+                _get_text(arrays, 'tags_upper'), arrays['tags_index.grams'],
+                arrays['tags_index.offsets'], arrays['tags_index.rows'], arrays['tags_index.short_rows'], n=n)
+        return cls(catalog, title_index, tags_index, fuzzy_matcher, manifest=manifest, path=path)
+
+    def arrays(self) -> dict:
+        catalog = self.catalog
+        arrays = {'ids': catalog.ids}
+        if catalog.titles is not None:
+            _put_text(arrays, 'title', catalog.titles)
+            _put_text(arrays, 'title_upper', self.title_index.texts)
+            _put_text(arrays, 'title_lower', self.fuzzy_matcher.titles)
+            _put_postings(arrays, 'title_index', self.title_index.postings_arrays(), 'short_rows')
+            _put_postings(arrays, 'fuzzy', self.fuzzy_matcher.postings_arrays(), 'gram_counts')
+        if catalog.tags is not None:
+            _put_text(arrays, 'tags', catalog.tags)
+            _put_text(arrays, 'tags_upper', self.tags_index.texts)
+            _put_postings(arrays, 'tags_index', self.tags_index.postings_arrays(), 'short_rows')
+        return arrays
+
+    def save(self, path: str, source: str = None, similarity: str = None) -> dict:
+        """Write the bundle as a new version under ``path`` and publish it once it is complete."""
+        manifest = {
+            'format': BUNDLE_FORMAT,
+            'version': BUNDLE_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'rows': len(self.catalog),
+            'columns': self.catalog.columns[1:],
+            'ngram': NGRAM,
+            'files': {},
+        }
+        for key, artifact in (('source', source), ('similarity', similarity)):
+            if artifact and os.path.exists(artifact):
+                manifest[key] = {'path': os.path.basename(artifact), 'sha256': file_sha256(artifact)}
+
+        def write(directory):
+            for name, array in self.arrays().items():
+                filename = f'{name}.npy'
+                np.save(os.path.join(directory, filename), np.ascontiguousarray(array))
+                manifest['files'][filename] = file_sha256(os.path.join(directory, filename))
+            with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+
+        # a bundle saved before versions sits at ``path`` itself; its files go once the new one is published
+        try:
+            with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+                legacy = list(json.load(f).get('files', {})) + [MANIFEST]
+        except (OSError, ValueError):
+            legacy = []
+        self.path = save_version(path, write, legacy)
+        self.manifest = manifest
+        return manifest
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(
+        description="Convert dict_mov.pkl (and similarity.pkl) into the memory-mapped movie bundle.")
+    parser.add_argument('--src', default=os.path.join(base_dir, 'dict_mov.pkl'))
+    parser.add_argument('--dst', default=os.path.join(base_dir, BUNDLE_DIR))
+    parser.add_argument('--similarity-dir', default=base_dir,
+                        help="converts similarity.pkl here first if similarity.npy is missing")
+    parser.add_argument('--verify', action='store_true',
+                        help="only check an existing bundle against its manifest and the source files")
+    args = parser.parse_args(argv)
+
+    similarity_npy = os.path.join(args.similarity_dir, SIMILARITY_NPY)
+
+    if args.verify:
+        source_sha256 = file_sha256(args.src) if os.path.exists(args.src) else None
+        bundle = MovieBundle.load(args.dst, source_sha256=source_sha256, verify=True)
+        recorded = bundle.manifest.get('similarity')
+        if recorded and os.path.exists(similarity_npy) and file_sha256(similarity_npy) != recorded['sha256']:
+            print(f"warning: {similarity_npy} changed since the bundle was built")
+        print(f"{args.dst}: v{bundle.manifest['version']}, {len(bundle.catalog)} movies, checksums ok")
+        return
+
+    if not os.path.exists(args.src):
+        parser.error(f"{args.src} does not exist")
+
+    similarity_pkl = os.path.join(args.similarity_dir, SIMILARITY_PKL)
+    if not os.path.exists(similarity_npy) and os.path.exists(similarity_pkl):
+        convert_pickle(similarity_pkl, similarity_npy)
+        matrix = np.load(similarity_npy, mmap_mode='r')
+        neighbor_idx, neighbor_scores = build_neighbors(matrix, DEFAULT_NEIGHBOR_DEPTH)
+        save_neighbors(args.similarity_dir, neighbor_idx, neighbor_scores, matrix)
+        print(f"wrote {similarity_npy} and its top-{neighbor_idx.shape[1]} neighbour table")
+
+    start = time.perf_counter()
+    bundle = MovieBundle.from_catalog(MovieCatalog.load(args.src))
+    manifest = bundle.save(args.dst, source=args.src, similarity=similarity_npy)
+    size_mb = sum(os.path.getsize(os.path.join(bundle.path, name)) for name in manifest['files']) / (1024 * 1024)
+    print(f"wrote {args.dst} (v{BUNDLE_VERSION}, {manifest['rows']} movies, {len(manifest['files'])} arrays, "
+          f"{size_mb:.1f} MB) in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
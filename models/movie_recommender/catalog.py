@@ -0,0 +1,136 @@
+import pickle
+import re
+import sys
+import numpy as np
+
+
+class TextColumn:
+    """Read-only list of strings kept as one UTF-8 blob plus byte offsets.
+
+    An entry is decoded only when it is read, so a memory-mapped column costs
+    no more than the pages actually touched. Appending to it (``+``) gives a
+    plain list.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        # memoryviews over the same buffers: indexing them costs far less than numpy scalars
+        self._data = memoryview(np.ascontiguousarray(blob, dtype=np.uint8)).cast('B')
+        self._bounds = memoryview(np.ascontiguousarray(offsets, dtype=np.int64)).cast('B').cast('q')
+
+    @classmethod
+    def from_texts(cls, texts):
+        encoded = [t.encode('utf-8') for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self._bounds) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        # past the end, _bounds[i + 1] raises the IndexError
+        return self._data[self._bounds[i]:self._bounds[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        data = self.blob.tobytes()
+        bounds = np.asarray(self.offsets).tolist()
+        for i in range(len(bounds) - 1):
+            yield data[bounds[i]:bounds[i + 1]].decode('utf-8')
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def containing(self, needle: str, rows):
+        """The positions in ``rows`` whose text contains ``needle``, found in the UTF-8 bytes
+        without decoding them."""
+        search = re.compile(re.escape(needle.encode('utf-8'))).search
+        data, bounds = self._data, self._bounds
+        return (pos for pos in rows if search(data, bounds[pos], bounds[pos + 1]))
+
+
+class MovieCatalog:
+    """Read-only, column-oriented movie table (``id``, ``title``, ``tags``).
+
+    Ids are one int64 array, titles and tags plain lists of strings (titles
+    interned) or, when opened from the movie bundle, ``TextColumn`` views, and
+    ``row_of`` maps a movie id to its row. Looking up a few rows is a couple
+    of list/array index operations instead of a pandas ``iloc`` that builds a
+    Series per row.
+    """
+
+    def __init__(self, ids, titles=None, tags=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.titles = self._column(titles, sys.intern)
+        self.tags = self._column(tags, str)
+        self._row_by_id = {}
+        for row, movie_id in enumerate(self.ids.tolist()):
+            self._row_by_id.setdefault(movie_id, row)
+
+    @staticmethod
+    def _column(values, convert):
+        if values is None or isinstance(values, TextColumn):
+            return values
+        return [convert(str(v)) for v in values]
+
+    @classmethod
+    def from_dict(cls, movies_dict):
+        """From the ``{column: {row_key: value}}`` layout of ``dict_mov.pkl`` (``DataFrame.to_dict()``)."""
+        keys = list(movies_dict['id'])
+
+        def column(name):
+            values = movies_dict.get(name)
+            return [values.get(k) for k in keys] if values is not None else None
+
+        return cls(column('id'), column('title'), column('tags'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_dict(pickle.load(f))
+
+    def to_dict(self):
+        """The ``dict_mov.pkl`` layout, with rows keyed ``0..N-1``."""
+        movies = {'id': dict(enumerate(self.ids.tolist()))}
+        if self.titles is not None:
+            movies['title'] = dict(enumerate(self.titles))
+        if self.tags is not None:
+            movies['tags'] = dict(enumerate(self.tags))
+        return movies
+
+    def appended(self, ids, titles=None, tags=None):
+        """A new catalog with these rows added after the existing ones."""
+        return MovieCatalog(
+            np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)]),
+            self.titles + list(titles) if self.titles is not None else None,
+            self.tags + list(tags) if self.tags is not None else None,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def columns(self):
+        return ['id'] + [name for name in ('title', 'tags') if getattr(self, name) is not None]
+
+    def row_of(self, movie_id):
+        """Row of ``movie_id``, or ``None`` when it is not in the catalog."""
+        return self._row_by_id.get(int(movie_id))
+
+    def title(self, row: int) -> str:
+        return self.titles[row]
+
+    def movie_id(self, row: int) -> int:
+        return int(self.ids[row])
+
+    def titles_at(self, rows) -> list:
+        titles = self.titles
+        return [titles[r] for r in rows]
+
+    def ids_at(self, rows) -> list:
+        return self.ids[np.asarray(rows, dtype=np.intp)].tolist()
@@ -0,0 +1,280 @@
+import argparse
+import os
+import numpy as np
+from models.movie_recommender.catalog import MovieCatalog
+from models.movie_recommender.releases import published_dir, save_version
+from models.movie_recommender.similarity_store import top_k_from_scores
+
+EMBEDDING_DIR = 'embeddings'
+VECTORS_NPY = 'vectors.npy'
+VOCAB_NPY = 'vocab.npy'
+IDF_NPY = 'idf.npy'
+COMPONENTS_NPY = 'components.npy'
+CENTROIDS_NPY = 'ivf_centroids.npy'
+LISTS_NPY = 'ivf_lists.npy'
+OFFSETS_NPY = 'ivf_offsets.npy'
+LIST_VECTORS_NPY = 'ivf_vectors.npy'
+ALL_NPY = (VECTORS_NPY, VOCAB_NPY, IDF_NPY, COMPONENTS_NPY, CENTROIDS_NPY, LISTS_NPY, OFFSETS_NPY, LIST_VECTORS_NPY)
+DEFAULT_DIM = 256
+DEFAULT_NPROBE = 8
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TagEmbedder:
+    """Maps a movie's ``tags`` text to its unit-length embedding: TF-IDF over the
+    fitted vocabulary, projected onto the truncated-SVD components.
+
+    Keeping the projection lets new movies be embedded without refitting.
+    """
+
+    def __init__(self, vocab, idf, components):
+        self.vocab = vocab
+        self.idf = idf
+        self.components = components
+        self._vectorizer = None
+
+    @classmethod
+    def fit(cls, tags, dim: int = DEFAULT_DIM, max_features: int = 5000, seed: int = 0):
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        tfidf = TfidfVectorizer(max_features=max_features, stop_words='english', dtype=np.float32)
+        matrix = tfidf.fit_transform(tags)
+        svd = TruncatedSVD(min(dim, matrix.shape[1] - 1), random_state=seed).fit(matrix)
+        return cls(tfidf.get_feature_names_out().astype(str), tfidf.idf_.astype(np.float32),
+                   svd.components_.astype(np.float32))
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    def embed(self, tags) -> np.ndarray:
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import CountVectorizer
+            self._vectorizer = CountVectorizer(vocabulary=self.vocab.tolist(), stop_words='english',
+                                               dtype=np.float32)
+        counts = self._vectorizer.transform(tags).multiply(self.idf).tocsr()
+        weights = _normalize(counts.toarray())  # TfidfVectorizer's l2 norm
+        return np.ascontiguousarray(_normalize(weights @ self.components.T), dtype=np.float32)
+
+
+class IVFIndex:
+    """Inverted-file ANN index: the vectors are clustered with spherical k-means
+    and a query only scores the members of its ``nprobe`` closest clusters.
+
+    ``lists`` holds every position grouped by cluster, ``offsets[c]:offsets[c + 1]``
+    being cluster ``c``'s slice of it, and ``list_vectors`` the vectors in the
+    same order, so scanning a cluster is one contiguous matrix-vector product.
+    """
+
+    def __init__(self, centroids, lists, offsets, list_vectors):
+        self.centroids = centroids
+        self.lists = lists
+        self.offsets = offsets
+        self.list_vectors = list_vectors
+
+    @classmethod
+    def build(cls, vectors, n_lists: int = None, iterations: int = 20, seed: int = 0):
+        n = len(vectors)
+        n_lists = min(n, n_lists or max(1, int(round(np.sqrt(n)))))
+        rng = np.random.default_rng(seed)
+        centroids = np.array(vectors[rng.choice(n, n_lists, replace=False)], dtype=np.float32)
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            # an emptied cluster restarts from a random movie
+            sums[empty] = vectors[rng.choice(n, int(empty.sum()), replace=False)]
+            centroids = _normalize(sums).astype(np.float32)
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        lists = np.argsort(assignment, kind='stable').astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=offsets[1:])
+        return cls(centroids, lists, offsets, np.ascontiguousarray(vectors[lists], dtype=np.float32))
+
+    def extended(self, vectors: np.ndarray, start: int):
+        """A copy with ``vectors`` (positions ``start``, ``start + 1``, ...) filed under their
+        closest clusters; the centroids themselves are not refitted."""
+        n_lists = len(self.centroids)
+        assignment = np.concatenate([
+            np.repeat(np.arange(n_lists), np.diff(self.offsets)),
+            np.argmax(vectors @ self.centroids.T, axis=1),
+        ])
+        order = np.argsort(assignment, kind='stable')
+        positions = np.concatenate([self.lists, np.arange(start, start + len(vectors), dtype=np.int32)])
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=offsets[1:])
+        list_vectors = np.concatenate([np.asarray(self.list_vectors), vectors])[order]
+        return IVFIndex(self.centroids, positions[order], offsets, list_vectors)
+
+    def __len__(self):
+        return len(self.centroids)
+
+    def scan(self, query: np.ndarray, nprobe: int):
+        """``(positions, scores)`` of every member of the ``nprobe`` clusters closest to ``query``."""
+        probes, _ = top_k_from_scores(self.centroids @ query, nprobe)
+        # in file order, so the reads walk the mmap'd vectors front to back
+        ranges = [(self.offsets[c], self.offsets[c + 1]) for c in np.sort(probes)]
+        positions = np.concatenate([self.lists[start:stop] for start, stop in ranges])
+        scores = np.concatenate([self.list_vectors[start:stop] @ query for start, stop in ranges])
+        return positions, scores
+
+
+class EmbeddingStore:
+    """Drop-in alternative to ``SimilarityStore`` answering from per-movie embeddings.
+
+    Instead of an N×N similarity matrix it keeps an N×d float32 matrix of
+    unit vectors (``TagEmbedder``) and an ``IVFIndex`` over them; the
+    similarity of two movies is the dot product of their vectors. Queries
+    score only the ``nprobe`` closest clusters, so results are approximate.
+    """
+
+    def __init__(self, vectors, index, embedder=None, nprobe: int = DEFAULT_NPROBE, source=None):
+        self.vectors = vectors
+        self.index = index
+        self.embedder = embedder
+        self.nprobe = nprobe
+        self.source = source
+
+    @classmethod
+    def build(cls, tags, dim: int = DEFAULT_DIM, n_lists: int = None, nprobe: int = DEFAULT_NPROBE):
+        embedder = TagEmbedder.fit(tags, dim)
+        vectors = embedder.embed(tags)
+        return cls(vectors, IVFIndex.build(vectors, n_lists), embedder, nprobe)
+
+    @classmethod
+    def load(cls, path, nprobe: int = DEFAULT_NPROBE):
+        path = published_dir(path)
+        vectors_path = os.path.join(path, VECTORS_NPY)
+        if not os.path.exists(vectors_path):
+            raise FileNotFoundError(
+                f"فایل {VECTORS_NPY} در پوشه {path} وجود ندارد؛ "
+                f"آن را با python -m models.movie_recommender.embedding_store بسازید.")
+
+        def array(name):
+            return np.load(os.path.join(path, name), mmap_mode='r')
+
+        embedder = None
+        if os.path.exists(os.path.join(path, COMPONENTS_NPY)):
+            embedder = TagEmbedder(array(VOCAB_NPY), np.load(os.path.join(path, IDF_NPY)), array(COMPONENTS_NPY))
+        index = IVFIndex(np.load(os.path.join(path, CENTROIDS_NPY)), np.load(os.path.join(path, LISTS_NPY)),
+                         np.load(os.path.join(path, OFFSETS_NPY)), array(LIST_VECTORS_NPY))
+        return cls(array(VECTORS_NPY), index, embedder, nprobe, source=vectors_path)
+
+    def save(self, path):
+        """Write the arrays as a new version under ``path`` (``releases.save_version``), so a
+        worker loading meanwhile never mixes files of two builds."""
+        arrays = {
+            VECTORS_NPY: self.vectors,
+            CENTROIDS_NPY: self.index.centroids,
+            LISTS_NPY: self.index.lists,
+            OFFSETS_NPY: self.index.offsets,
+            LIST_VECTORS_NPY: self.index.list_vectors,
+        }
+        if self.embedder is not None:
+            arrays.update({VOCAB_NPY: self.embedder.vocab, IDF_NPY: self.embedder.idf,
+                           COMPONENTS_NPY: self.embedder.components})
+
+        def write(directory):
+            for name, values in arrays.items():
+                np.save(os.path.join(directory, name), np.asarray(values))
+
+        # files of embeddings saved before versions sit at ``path`` itself
+        legacy = [name for name in ALL_NPY if os.path.isfile(os.path.join(path, name))]
+        self.source = os.path.join(save_version(path, write, legacy), VECTORS_NPY)
+
+    def extend(self, tags):
+        """Append movies, embedded with the saved projection (see ``IVFIndex.extended``)."""
+        if self.embedder is None:
+            raise ValueError("these embeddings were saved without their projection; rebuild them")
+        added = self.embedder.embed(tags)
+        start = len(self)
+        self.vectors = np.concatenate([np.asarray(self.vectors), added])
+        self.index = self.index.extended(added, start)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dtype(self):
+        return self.vectors.dtype
+
+    @property
+    def neighbor_depth(self) -> int:
+        return 0
+
+    def row(self, pos: int) -> np.ndarray:
+        """Exact similarity of ``pos`` to every movie."""
+        return np.asarray(self.vectors @ self.vectors[pos], dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int = 5, exclude=None, exact: bool = False):
+        """The ``k`` movies whose vectors are closest to ``query``, best first, skipping ``exclude``."""
+        exclude = np.empty(0, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        if exact or self.nprobe >= len(self.index):
+            positions, scores = None, np.asarray(self.vectors @ query, dtype=np.float32)
+        else:
+            positions, scores = self.index.scan(query, self.nprobe)
+
+        top, top_scores = top_k_from_scores(scores, k + len(exclude))
+        if positions is not None:
+            top = positions[top]
+        keep = np.isfinite(top_scores) & ~np.isin(top, exclude)
+        top, top_scores = top[keep][:k].astype(np.int64), top_scores[keep][:k]
+        if len(top) < k and positions is not None and len(positions) < len(self):
+            # the probed clusters were too small; score every movie
+            return self.search(query, k, exclude, exact=True)
+        return top, top_scores
+
+    def top_k(self, pos: int, k: int = 5):
+        """The ``k`` most similar movies to ``pos`` (excluding itself), best first."""
+        return self.search(np.asarray(self.vectors[pos], dtype=np.float32), k, exclude=[pos])
+
+    def neighbors_of(self, positions, k: int = 5) -> np.ndarray:
+        """The ``top_k`` neighbours of every position in ``positions``, concatenated."""
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.top_k(pos, k)[0] for pos in positions])
+
+    def blended_top_k(self, positions, k: int = 5, weights=None, exclude=None):
+        """See ``SimilarityStore.blended_top_k``; the mean similarity to the seeds is
+        the similarity to the mean of their vectors, so this is a single search."""
+        positions = np.asarray(positions, dtype=np.intp)
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if weights is None:
+            weights = np.full(len(positions), 1.0 / len(positions), dtype=np.float32)
+        else:
+            weights = np.asarray(weights, dtype=np.float32)
+            weights = weights / weights.sum()
+
+        query = weights @ np.asarray(self.vectors[positions], dtype=np.float32)
+        skip = positions if exclude is None else np.concatenate([positions, np.asarray(exclude, dtype=np.intp)])
+        return self.search(query, k, exclude=skip)
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(
+        description="Build the movie embeddings (TF-IDF + truncated SVD of the tags) and their IVF index.")
+    parser.add_argument('--src', default=os.path.join(base_dir, 'dict_mov.pkl'))
+    parser.add_argument('--dst', default=os.path.join(base_dir, EMBEDDING_DIR))
+    parser.add_argument('--dim', type=int, default=DEFAULT_DIM)
+    parser.add_argument('--lists', type=int, default=None, help="IVF clusters (default: sqrt of the movie count)")
+    args = parser.parse_args(argv)
+
+    catalog = MovieCatalog.load(args.src)
+    store = EmbeddingStore.build(catalog.tags, args.dim, args.lists)
+    store.save(args.dst)
+    size_mb = store.vectors.nbytes / (1024 * 1024)
+    print(f"wrote {len(store)} x {store.vectors.shape[1]} embeddings ({size_mb:.1f} MB) "
+          f"and a {len(store.index)}-list IVF index to {os.path.dirname(store.source)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import heapq
+from difflib import SequenceMatcher
+import numpy as np
+from models.movie_recommender.text_index import PostingLists, lookup, sorted_postings
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).astype(np.int64)
+    return np.unpackbits(words.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class FuzzyTitleMatcher:
+    """Typo-tolerant title lookup that returns row positions with scores.
+
+    Scores are difflib's ``SequenceMatcher.ratio`` (the same measure
+    ``get_close_matches`` uses), and so are the results, but few titles are
+    ever scored: titles are indexed by padded character trigrams, and the
+    ``max_candidates`` titles with the best trigram overlap (counted in a
+    single ``bincount``) are scored first. Any other title is scored only
+    while an upper bound of its ``ratio`` can still beat the ``n``-th best
+    score so far: ``quick_ratio`` from per-title character counts, then the
+    longest common subsequence (``ratio``'s matched characters are one),
+    both computed for many titles at once.
+    """
+
+    def __init__(self, titles, cutoff: float = 0.4, max_candidates: int = 64, n: int = 3):
+        self.cutoff = cutoff
+        self.max_candidates = max_candidates
+        self.n = n
+        self.titles = [str(t).lower() for t in titles]
+
+        postings = {}
+        gram_counts = np.empty(len(self.titles), dtype=np.int32)
+        for pos, title in enumerate(self.titles):
+            grams = self._grams(title)
+            gram_counts[pos] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(pos)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self._gram_counts = gram_counts
+        self._chars = None
+
+    @classmethod
+    def from_postings(cls, titles, grams, offsets, rows, gram_counts,
+                      cutoff: float = 0.4, max_candidates: int = 64, n: int = 3):
+        """Reopen a matcher saved with ``postings_arrays``; ``titles`` are the already lower-cased titles."""
+        matcher = cls.__new__(cls)
+        matcher.cutoff = cutoff
+        matcher.max_candidates = max_candidates
+        matcher.n = n
+        matcher.titles = titles
+        matcher.postings = PostingLists(grams, offsets, rows)
+        matcher._gram_counts = np.asarray(gram_counts, dtype=np.int32)
+        matcher._chars = None
+        return matcher
+
+    def postings_arrays(self):
+        """``(grams, offsets, rows, gram_counts)``: the posting lists as one concatenated array, grams sorted."""
+        return (*sorted_postings(dict(self.postings.items())), self._gram_counts)
+
+    def extend(self, titles):
+        """Append ``titles`` in place; existing rows keep their positions."""
+        start = len(self.titles)
+        new_titles = [str(t).lower() for t in titles]
+        added = {}
+        gram_counts = np.empty(len(new_titles), dtype=np.int32)
+        for i, title in enumerate(new_titles):
+            grams = self._grams(title)
+            gram_counts[i] = len(grams)
+            for gram in grams:
+                added.setdefault(gram, []).append(start + i)
+
+        postings = dict(self.postings.items())
+        for gram, rows in added.items():
+            new_rows = np.array(rows, dtype=np.int32)
+            postings[gram] = np.concatenate([postings[gram], new_rows]) if gram in postings else new_rows
+        self.titles = self.titles + new_titles
+        self.postings = postings
+        self._gram_counts = np.concatenate([self._gram_counts, gram_counts])
+        self._chars = None
+
+    def _grams(self, text: str) -> set:
+        padded = ' ' * (self.n - 1) + text + ' '
+        return {padded[i:i + self.n] for i in range(len(padded) - self.n + 1)}
+
+    def _candidates(self, grams: set) -> np.ndarray:
+        lists = [rows for rows in lookup(self.postings, grams) if rows is not None]
+        if not lists:
+            return np.empty(0, dtype=np.int64)
+        overlap = np.bincount(np.concatenate(lists), minlength=len(self.titles))
+        # Dice coefficient on trigram sets, so long titles sharing a few common
+        # grams don't crowd out short close matches
+        dice = 2.0 * overlap / (len(grams) + self._gram_counts)
+        hits = np.flatnonzero(overlap)
+        if len(hits) > self.max_candidates:
+            hits = hits[np.argpartition(dice[hits], -self.max_candidates)[-self.max_candidates:]]
+        return hits
+
+    def _char_table(self):
+        """``(columns, counts, masks, lengths)``, one ``counts``/``masks`` row per character.
+
+        ``counts[c, t]`` is how often character ``c`` occurs in title ``t``,
+        bit ``i`` of ``masks[c, t]`` whether it is the title's ``i``-th
+        character (for the first 64).
+        """
+        if self._chars is None:
+            # built on first use, so loading a saved matcher stays cheap
+            n_titles = len(self.titles)
+            lengths = np.array([len(t) for t in self.titles], dtype=np.int64)
+            codes = np.frombuffer(''.join(self.titles).encode('utf-32-le'), dtype=np.uint32)
+            rows = np.repeat(np.arange(n_titles), lengths)
+            offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            chars, cols = np.unique(codes, return_inverse=True)
+            counts = np.bincount(cols * n_titles + rows, minlength=len(chars) * n_titles)
+            masks = np.zeros(len(chars) * n_titles, dtype=np.uint64)
+            first = np.arange(len(codes)) - offsets < 64
+            np.bitwise_or.at(masks, cols[first] * n_titles + rows[first],
+                             np.left_shift(np.uint64(1), (np.arange(len(codes)) - offsets)[first].astype(np.uint64)))
+            columns = {chr(c): i for i, c in enumerate(chars.tolist())}
+            self._chars = (columns, counts.reshape(len(chars), n_titles).astype(np.int32),
+                           masks.reshape(len(chars), n_titles), lengths)
+        return self._chars
+
+    def _lcs_bounds(self, query: str, positions: np.ndarray) -> np.ndarray:
+        """``2 * lcs / (len(title) + len(query))`` for the titles at ``positions``, an upper bound of ``ratio``.
+
+        Bit-parallel LCS (Hyyrö): one pass over the query, each step a few
+        word operations on every title at once. Titles longer than 64
+        characters get the bound 1.
+        """
+        columns, _, masks, lengths = self._char_table()
+        ones = np.uint64(0xFFFFFFFFFFFFFFFF)
+        v = np.full(len(positions), ones, dtype=np.uint64)
+        zero = np.zeros(len(positions), dtype=np.uint64)
+        for ch in query:
+            m = masks[columns[ch], positions] if ch in columns else zero
+            u = v & m
+            v = (v + u) | (v & ~m)
+        title_lengths = lengths[positions]
+        width = np.minimum(title_lengths, 64).astype(np.uint64)
+        # v's zero bits among the title's width are the LCS
+        in_title = np.where(width == 64, ones, (np.uint64(1) << width) - np.uint64(1))
+        lcs = title_lengths - _popcount(v & in_title)
+        bounds = 2.0 * lcs / (title_lengths + len(query))
+        bounds[title_lengths > 64] = 1.0
+        return bounds
+
+    def _ratio_bounds(self, query: str) -> np.ndarray:
+        """``SequenceMatcher.quick_ratio`` of ``query`` against every title."""
+        columns, counts, _, lengths = self._char_table()
+        wanted = {}
+        for ch in query:
+            if ch in columns:
+                wanted[columns[ch]] = wanted.get(columns[ch], 0) + 1
+        if not wanted:
+            return np.zeros(len(self.titles))
+        rows = list(wanted)
+        matches = np.minimum(counts[rows], np.array([wanted[r] for r in rows])[:, None]).sum(axis=0)
+        return 2.0 * matches / (lengths + len(query))
+
+    def match(self, query: str, n: int = 5, cutoff: float = None):
+        """Up to ``n`` ``(position, score)`` pairs scoring at least ``cutoff``, best first."""
+        if cutoff is None:
+            cutoff = self.cutoff
+        query = (query or '').strip().lower()
+        if not query or n <= 0 or not self.titles:
+            return []
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        bounds = self._ratio_bounds(query)
+        # min-heap of the n best (score, title, -position); of equal scores
+        # the title sorting last wins, as in get_close_matches
+        best = []
+
+        def score(pos):
+            matcher.set_seq1(self.titles[pos])
+            value = matcher.ratio()
+            if value >= cutoff:
+                entry = (value, self.titles[pos], -int(pos))
+                if len(best) < n:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+
+        def threshold():
+            return max(cutoff, best[0][0]) if len(best) == n else cutoff
+
+        # the best trigram matches first: they usually settle the top n, so
+        # the bound rules out most other titles without scoring them
+        first = self._candidates(self._grams(query))
+        for pos in first[np.argsort(-bounds[first], kind='stable')]:
+            if bounds[pos] >= threshold():
+                score(pos)
+        bounds[first] = -1.0
+        rest = np.flatnonzero(bounds >= threshold())
+        if len(rest):
+            tighter = self._lcs_bounds(query, rest)
+            keep = tighter >= threshold()
+            rest, tighter = rest[keep], tighter[keep]
+            for i in np.argsort(-tighter, kind='stable'):
+                if tighter[i] < threshold():
+                    break
+                score(rest[i])
+        return [(-neg_pos, value) for value, _, neg_pos in sorted(best, reverse=True)]
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+from collections import Counter
+import numpy as np
+from models.movie_recommender.bundle import BUNDLE_DIR, MovieBundle, file_sha256
+from models.movie_recommender.catalog import MovieCatalog
+from models.movie_recommender.embedding_store import EMBEDDING_DIR, VECTORS_NPY, EmbeddingStore
+from models.movie_recommender.releases import (
+    artifact_dir, current_release, next_release, prune, publish, published_dir, release_lock, releases_dir,
+)
+from models.movie_recommender.similarity_store import (
+    SIMILARITY_NPY, SIMILARITY_PKL, extend_matrix, extend_neighbors, load_neighbors, save_neighbors,
+)
+
+DICT_PKL = 'dict_mov.pkl'
+# the tag vectors behind similarity.npy, kept so added movies can be compared without refitting
+VOCAB_NPY = 'similarity_vocab.npy'
+VECTORS_NPZ = 'similarity_vectors.npz'
+DEFAULT_KEEP = 3
+
+
+def parse_movies(movies):
+    """``(ids, titles, tags)`` from a list of ``{'id', 'title', 'tags'}`` objects (or a single one)."""
+    if isinstance(movies, dict):
+        movies = [movies]
+    if not isinstance(movies, list) or not movies:
+        raise ValueError("فهرست فیلم‌ها خالی است یا فهرستی از اشیاء JSON نیست.")
+
+    ids, titles, tags = [], [], []
+    for i, movie in enumerate(movies):
+        if not isinstance(movie, dict):
+            raise ValueError(f"فیلم شماره {i}: باید یک شیء JSON باشد.")
+        try:
+            ids.append(int(movie['id']))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"فیلم شماره {i}: شناسه (id) وجود ندارد یا عدد صحیح نیست.")
+        title = str(movie.get('title') or '').strip()
+        if not title:
+            raise ValueError(f"فیلم شماره {i}: عنوان (title) وجود ندارد.")
+        titles.append(title)
+        # the catalog's tags are lower-cased overview, genres, keywords, cast and crew
+        tags.append(str(movie.get('tags') or '').strip().lower())
+
+    repeated = sorted(movie_id for movie_id, count in Counter(ids).items() if count > 1)
+    if repeated:
+        raise ValueError(f"شناسه‌های تکراری در درخواست: {', '.join(map(str, repeated))}")
+    return ids, titles, tags
+
+
+def _load_bundle(src_dir: str):
+    dict_path = os.path.join(src_dir, DICT_PKL)
+    try:
+        return MovieBundle.load(os.path.join(src_dir, BUNDLE_DIR), source_sha256=file_sha256(dict_path))
+    except (OSError, ValueError, KeyError):
+        return MovieBundle.from_catalog(MovieCatalog.load(dict_path))
+
+
+def _tag_vectors(src_dir: str, tags):
+    """``(vectorizer, vectors)``: the L2-normalised tag counts ``similarity.npy`` is the cosine of."""
+    from scipy import sparse
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.preprocessing import normalize
+
+    vocab_path = os.path.join(src_dir, VOCAB_NPY)
+    if os.path.exists(vocab_path):
+        vectorizer = CountVectorizer(vocabulary=np.load(vocab_path).tolist(), stop_words='english')
+        return vectorizer, sparse.load_npz(os.path.join(src_dir, VECTORS_NPZ))
+    # first ingestion: refit the vectorizer the matrix was built with
+    vectorizer = CountVectorizer(max_features=5000, stop_words='english')
+    vectors = normalize(vectorizer.fit_transform(tags).astype(np.float32))
+    return vectorizer, vectors.tocsr()
+
+
+def _extend_similarity(src_dir: str, dst_dir: str, old_tags, new_tags):
+    from scipy import sparse
+    from sklearn.preprocessing import normalize
+
+    matrix = np.load(os.path.join(src_dir, SIMILARITY_NPY), mmap_mode='r')
+    vectorizer, vectors = _tag_vectors(src_dir, old_tags)
+    if not matrix.shape[0] == vectors.shape[0] == len(old_tags):
+        raise ValueError(f"{SIMILARITY_NPY} has {matrix.shape[0]} rows but the catalog {len(old_tags)} movies")
+    added = normalize(vectorizer.transform(new_tags).astype(np.float32))
+    vectors = sparse.vstack([vectors, added]).tocsr()
+    # the only similarities computed: each added movie against every movie
+    new_rows = np.asarray((added @ vectors.T).todense(), dtype=np.float32)
+
+    extend_matrix(matrix, new_rows, os.path.join(dst_dir, SIMILARITY_NPY))
+    neighbor_idx, neighbor_scores = load_neighbors(src_dir, matrix)
+    if neighbor_idx is not None:
+        save_neighbors(dst_dir, *extend_neighbors(neighbor_idx, neighbor_scores, new_rows),
+                       np.load(os.path.join(dst_dir, SIMILARITY_NPY), mmap_mode='r'))
+    np.save(os.path.join(dst_dir, VOCAB_NPY), np.array(vectorizer.get_feature_names_out(), dtype=str))
+    sparse.save_npz(os.path.join(dst_dir, VECTORS_NPZ), vectors)
+
+
+def ingest(movies, base_dir: str = None, keep: int = DEFAULT_KEEP) -> dict:
+    """Append ``movies`` to the catalog as a new release and publish it.
+
+    The release is built next to the current one: the bundle's indexes get
+    the new rows in place, ``similarity.npy`` and the neighbour table only
+    the similarities of the added movies, the embeddings (if built) their
+    vectors. It is then made current by rewriting ``releases/CURRENT``,
+    which running recommenders watch (``MovieRecommender.artifacts_changed``).
+    """
+    ids, titles, tags = parse_movies(movies)
+    base_dir = base_dir or os.path.dirname(__file__)
+    start = time.perf_counter()
+    with release_lock(base_dir):
+        src_dir = artifact_dir(base_dir)
+        if not os.path.exists(os.path.join(src_dir, SIMILARITY_NPY)) and \
+                os.path.exists(os.path.join(src_dir, SIMILARITY_PKL)):
+            raise ValueError("convert similarity.pkl first: python -m models.movie_recommender.similarity_store")
+
+        bundle = _load_bundle(src_dir)
+        known = [movie_id for movie_id in ids if bundle.catalog.row_of(movie_id) is not None]
+        if known:
+            raise ValueError(f"این فیلم‌ها از قبل در فهرست هستند: {', '.join(map(str, known))}")
+        old_tags = bundle.catalog.tags
+
+        name = next_release(base_dir)
+        tmp_dir = os.path.join(releases_dir(base_dir), f'.{name}.tmp')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            bundle.extend(ids, titles, tags)
+            dict_path = os.path.join(tmp_dir, DICT_PKL)
+            with open(dict_path, 'wb') as f:
+                pickle.dump(bundle.catalog.to_dict(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            if os.path.exists(os.path.join(src_dir, SIMILARITY_NPY)):
+                _extend_similarity(src_dir, tmp_dir, old_tags, tags)
+            if os.path.exists(os.path.join(published_dir(os.path.join(src_dir, EMBEDDING_DIR)), VECTORS_NPY)):
+                embeddings = EmbeddingStore.load(os.path.join(src_dir, EMBEDDING_DIR))
+                if len(embeddings) != len(old_tags):
+                    raise ValueError(f"the embeddings have {len(embeddings)} rows but the catalog {len(old_tags)} movies")
+                embeddings.extend(tags)
+                embeddings.save(os.path.join(tmp_dir, EMBEDDING_DIR))
+
+            bundle.save(os.path.join(tmp_dir, BUNDLE_DIR), source=dict_path,
+                        similarity=os.path.join(tmp_dir, SIMILARITY_NPY))
+            os.replace(tmp_dir, os.path.join(releases_dir(base_dir), name))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        previous = current_release(base_dir)
+        publish(base_dir, name)
+        removed = prune(base_dir, keep)
+
+    return {
+        'release': name,
+        'previous': previous,
+        'added': len(ids),
+        'movies': len(bundle.catalog),
+        'pruned': removed,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(
+        description="Append movies to the catalog and publish the updated artifacts as a new release.")
+    parser.add_argument('movies', nargs='?', help="JSON file with a list of {id, title, tags} objects")
+    parser.add_argument('--base-dir', default=base_dir)
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP, help="releases to keep on disk")
+    parser.add_argument('--rollback', metavar='RELEASE', help="make an older release current again")
+    args = parser.parse_args(argv)
+
+    if args.rollback:
+        if not os.path.isdir(os.path.join(releases_dir(args.base_dir), args.rollback)):
+            parser.error(f"no release {args.rollback} in {releases_dir(args.base_dir)}")
+        publish(args.base_dir, args.rollback)
+        print(f"current release: {args.rollback}")
+        return
+    if not args.movies:
+        parser.error("a JSON file of movies (or --rollback) is required")
+
+    with open(args.movies, encoding='utf-8') as f:
+        summary = ingest(json.load(f), args.base_dir, keep=args.keep)
+    print(f"published {summary['release']}: {summary['added']} movies added, {summary['movies']} in total "
+          f"({summary['seconds']:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
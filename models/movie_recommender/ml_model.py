@@ -1,224 +1,478 @@
-import os
-import pickle
-import pandas as pd
-import requests
-from difflib import get_close_matches
-from deep_translator import GoogleTranslator
-import re
-
-class MovieRecommender:
-    def __init__(self):
-        self.fa_to_en = {
-            "اکشن": "action",
-            "کمدی": "comedy",
-            "درام": "drama",
-            "ترسناک": "horror",
-            "علمی تخیلی": "sci-fi",
-            "علمی": "sci-fi",
-            "تخیلی": "sci-fi",
-            "ماجراجویی": "adventure",
-            "انیمیشن": "animation",
-            "رمانتیک": "romance",
-            "عاشقانه": "romance",
-            "جنایی": "crime",
-            "تاریخی": "history",
-            "جنگی": "war",
-            "موزیکال": "musical",
-            "اسپورت": "sport",
-        }
-
-        base_dir = os.path.dirname(__file__)
-        dict_path = os.path.join(base_dir, 'dict_mov.pkl')
-        sim_path = os.path.join(base_dir, 'similarity.pkl')
-
-        if not os.path.exists(dict_path) or not os.path.exists(sim_path):
-            raise FileNotFoundError("اطمینان حاصل کنید dict_mov.pkl و similarity.pkl در پوشه models/movie_recommender وجود دارند.")
-
-        with open(dict_path, 'rb') as f:
-            self.movies_dict = pickle.load(f)
-        self.movies = pd.DataFrame(self.movies_dict).reset_index(drop=True)
-
-        with open(sim_path, 'rb') as f:
-            self.similarity = pickle.load(f)
-
-        try:
-            self.translator_fa_to_en = GoogleTranslator(source="fa", target="en")
-            self.translator_en_to_fa = GoogleTranslator(source="en", target="fa")
-        except Exception as e:
-            print("Translator init failed:", e)
-            self.translator_fa_to_en = None
-            self.translator_en_to_fa = None
-
-        self.tmdb_api_key = os.environ.get('TMDB_API_KEY')
-        if not self.tmdb_api_key:
-            print("Warning: TMDB_API_KEY not found in environment. Poster fetching will return placeholders.")
-            self.tmdb_api_key = None
-
-        if 'title' in self.movies.columns:
-            self._titles_lower = [str(t).lower() for t in self.movies['title'].tolist()]
-        else:
-            self._titles_lower = []
-
-    def normalize_input(self, text: str) -> str:
-        if not text:
-            return text
-        text = text.strip()
-        if text in self.fa_to_en:
-            return self.fa_to_en[text]
-        return text
-
-    def _map_fa_keywords(self, text: str) -> str:
-        if not text:
-            return text
-        lowered = text.lower()
-        mapped = []
-        for fa, en in self.fa_to_en.items():
-            if fa in lowered:
-                mapped.append(en)
-        if mapped:
-            return mapped[0]
-        return text
-
-    def translate_to_en(self, text: str) -> str:
-        if not text:
-            return text
-        local_mapped = self._map_fa_keywords(text)
-        if local_mapped != text:
-            return local_mapped
-
-        if self.translator_fa_to_en:
-            try:
-                translated = self.translator_fa_to_en.translate(text)
-                return translated
-            except Exception as e:
-                print("translate_to_en failed:", e)
-                return text
-        # fallback to original text
-        return text
-
-    def translate_to_fa(self, text: str) -> str:
-        if not text:
-            return text
-        if self.translator_en_to_fa:
-            try:
-                return self.translator_en_to_fa.translate(text)
-            except Exception as e:
-                print("translate_to_fa failed:", e)
-                return text
-        return text
-
-    def fetch_poster(self, movie_id: int) -> str:
-        if not self.tmdb_api_key:
-            return "https://via.placeholder.com/300x450.png?text=No+Image+Key"
-
-        url = f"https://api.themoviedb.org/3/movie/{movie_id}"
-        params = {'api_key': self.tmdb_api_key, 'language': 'en-US'}
-        try:
-            res = requests.get(url, params=params, timeout=5)
-            res.raise_for_status()
-            data = res.json()
-            poster_path = data.get('poster_path')
-            if poster_path:
-                return f"https://image.tmdb.org/t/p/w500/{poster_path}"
-        except Exception as e:
-            print(f"Error fetching poster for movie_id {movie_id}: {e}")
-        return "https://via.placeholder.com/300x450.png?text=No+Image"
-
-    def is_persian(self, text: str) -> bool:
-        return bool(re.search(r'[\u0600-\u06FF]', str(text)))
-
-    def recommend(self, query: str):
-        if not query:
-            return [], []
-
-        user_used_farsi = self.is_persian(query)
-
-        query = self.normalize_input(query)
-        if user_used_farsi:
-            mapped = self._map_fa_keywords(query)
-            if mapped != query:
-                query_en = mapped.lower()
-            else:
-                query_en = self.translate_to_en(query).lower()
-        else:
-            query_en = query.lower()
-
-        if 'tags' in self.movies.columns:
-            try:
-                genre_matches = self.movies[self.movies['tags'].str.contains(query_en, case=False, na=False)]
-                if len(genre_matches) > 0:
-                    recommended = genre_matches.head(5)
-                    recommended_titles = recommended['title'].tolist()
-                    recommended_posters = [self.fetch_poster(mid) for mid in recommended['id'].tolist()]
-                    if user_used_farsi:
-                        recommended_titles = [self.translate_to_fa(t) for t in recommended_titles]
-                    return recommended_titles, recommended_posters
-            except Exception as e:
-                print("genre search failed:", e)
-
-        if 'title' not in self.movies.columns:
-            return [], []
-
-        try:
-            matching_titles = self.movies[self.movies['title'].str.contains(query_en, case=False, na=False)]
-        except Exception:
-            matching_titles = pd.DataFrame()
-
-        if len(matching_titles) == 0:
-            all_titles = self._titles_lower
-            q = query_en.lower()
-            close = get_close_matches(q, all_titles, n=5, cutoff=0.4)
-            if close:
-                idxs = []
-                for c in close:
-                    try:
-                        idx = self._titles_lower.index(c)
-                        idxs.append(idx)
-                    except ValueError:
-                        continue
-                options = [self.movies.iloc[i]['title'] for i in idxs]
-                if user_used_farsi:
-                    options = [self.translate_to_fa(t) for t in options]
-                return None, options
-            else:
-                return [], []
-
-        if len(matching_titles) > 1:
-            titles = matching_titles['title'].tolist()[:5]
-            if user_used_farsi:
-                titles = [self.translate_to_fa(t) for t in titles]
-            return None, titles
-
-        matched_title = matching_titles.iloc[0]['title']
-        try:
-            movie_pos = int(matching_titles.index[0])
-            if hasattr(self, 'similarity') and len(self.similarity) == len(self.movies):
-                distances = self.similarity[movie_pos]
-            else:
-                print("similarity dimension mismatch; cannot compute similar movies.")
-                return [], []
-        except Exception as e:
-            print("Error locating movie position in similarity matrix:", e)
-            return [], []
-
-        movies_list = sorted(list(enumerate(distances)), reverse=True, key=lambda x: x[1])[1:6]
-
-        recommended_titles = []
-        recommended_posters = []
-        for idx, score in movies_list:
-            try:
-                movie_id = int(self.movies.iloc[idx]['id'])
-                title = self.movies.iloc[idx]['title']
-            except Exception:
-                continue
-            if user_used_farsi:
-                title = self.translate_to_fa(title)
-            recommended_titles.append(title)
-            recommended_posters.append(self.fetch_poster(movie_id))
-
-        return recommended_titles, recommended_posters
-
-    def get_all_titles(self):
-        if 'title' in self.movies.columns:
-            return self.movies['title'].tolist()
-        return []
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from deep_translator import GoogleTranslator
+import re
+from models.movie_recommender.bundle import BUNDLE_DIR, MovieBundle, bundle_manifest, file_sha256
+from models.movie_recommender.catalog import MovieCatalog
+from models.movie_recommender.embedding_store import DEFAULT_NPROBE, EMBEDDING_DIR, EmbeddingStore
+from models.movie_recommender.similarity_store import SimilarityStore
+from models.movie_recommender.posters import TMDB_API_BASE, PosterCache, PosterFetcher
+from models.movie_recommender.releases import artifact_dir, current_release
+from models.movie_recommender.result_cache import RecommendationCache
+from models.movie_recommender.translation_cache import TranslationCache
+from models.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+_SOURCE_DONE = object()
+
+
+def _merge(*sources):
+    """Items of several iterators in the order they are produced, each drained on its own thread."""
+    items = queue.Queue()
+
+    def drain(source):
+        try:
+            for item in source:
+                items.put(item)
+        except Exception as e:
+            logger.warning("stream source failed", extra={'error': str(e)})
+        finally:
+            items.put(_SOURCE_DONE)
+
+    for source in sources:
+        threading.Thread(target=drain, args=(source,), daemon=True).start()
+    remaining = len(sources)
+    while remaining:
+        item = items.get()
+        if item is _SOURCE_DONE:
+            remaining -= 1
+        else:
+            yield item
+
+
+class MovieRecommender:
+    def __init__(self, result_cache_backend=None):
+        self.fa_to_en = {
+            "اکشن": "action",
+            "کمدی": "comedy",
+            "درام": "drama",
+            "ترسناک": "horror",
+            "علمی تخیلی": "sci-fi",
+            "علمی": "sci-fi",
+            "تخیلی": "sci-fi",
+            "ماجراجویی": "adventure",
+            "انیمیشن": "animation",
+            "رمانتیک": "romance",
+            "عاشقانه": "romance",
+            "جنایی": "crime",
+            "تاریخی": "history",
+            "جنگی": "war",
+            "موزیکال": "musical",
+            "اسپورت": "sport",
+        }
+
+        base_dir = os.path.dirname(__file__)
+        # catalog updates (python -m models.movie_recommender.ingest) publish
+        # versioned copies of the artifacts under releases/; until the first
+        # one they are read from this directory
+        self.base_dir = base_dir
+        self.release = current_release(base_dir)
+        self.release_check_interval = float(os.environ.get('MOVIE_RELEASE_CHECK_SECONDS', 5))
+        self._release_checked = time.monotonic()
+        artifacts = artifact_dir(base_dir, self.release)
+        dict_path = os.path.join(artifacts, 'dict_mov.pkl')
+
+        # MOVIE_BUNDLE= (empty) always rebuilds from dict_mov.pkl
+        self.bundle_path = os.environ.get('MOVIE_BUNDLE', os.path.join(artifacts, BUNDLE_DIR))
+        bundle = self._load_bundle(self.bundle_path, dict_path) if self.bundle_path else None
+        if bundle is None:
+            if not os.path.exists(dict_path):
+                raise FileNotFoundError("اطمینان حاصل کنید dict_mov.pkl در پوشه models/movie_recommender وجود دارد.")
+            bundle = MovieBundle.from_catalog(MovieCatalog.load(dict_path), fuzzy_cutoff=0.4)
+
+        self.bundle_manifest = bundle.manifest  # empty when built from dict_mov.pkl
+        self.movies = bundle.catalog
+        self.title_index = bundle.title_index
+        self.fuzzy_matcher = bundle.fuzzy_matcher
+        self.tags_index = bundle.tags_index
+
+        # MOVIE_ENGINE=embedding answers from the tag embeddings and their IVF
+        # index (python -m models.movie_recommender.embedding_store) instead of
+        # the dense similarity matrix; both have the same interface
+        self.engine = os.environ.get('MOVIE_ENGINE', 'dense').lower()
+        if self.engine == 'embedding':
+            self.similarity = EmbeddingStore.load(
+                os.environ.get('MOVIE_EMBEDDINGS', os.path.join(artifacts, EMBEDDING_DIR)),
+                nprobe=int(os.environ.get('MOVIE_ANN_NPROBE', DEFAULT_NPROBE)))
+        else:
+            self.similarity = SimilarityStore.load(artifacts)
+
+        try:
+            self.translator_fa_to_en = GoogleTranslator(source="fa", target="en")
+            self.translator_en_to_fa = GoogleTranslator(source="en", target="fa")
+        except Exception as e:
+            logger.warning("translator init failed", extra={'error': str(e)})
+            self.translator_fa_to_en = None
+            self.translator_en_to_fa = None
+
+        # offline mode: titles come only from the pre-translated cache
+        # (python -m models.movie_recommender.translation_cache), never the network
+        self.translation_offline = os.environ.get('MOVIE_TRANSLATION_OFFLINE', '').lower() in ('1', 'true', 'yes')
+        translation_cache_path = os.environ.get('MOVIE_TRANSLATION_CACHE', os.path.join(base_dir, 'translations.sqlite3'))
+        self.translation_cache = TranslationCache(translation_cache_path) if translation_cache_path else None
+
+        self.tmdb_api_key = os.environ.get('TMDB_API_KEY')
+        if not self.tmdb_api_key:
+            logger.warning("TMDB_API_KEY not found in environment; poster fetching will return placeholders")
+            self.tmdb_api_key = None
+
+        poster_cache_path = os.environ.get('MOVIE_POSTER_CACHE', os.path.join(base_dir, 'poster_cache.sqlite3'))
+        self.poster_fetcher = PosterFetcher(
+            self.tmdb_api_key,
+            base_url=os.environ.get('TMDB_API_BASE', TMDB_API_BASE),
+            cache=PosterCache(poster_cache_path) if poster_cache_path else None,
+        )
+
+        # repeated queries (genre names above all) skip the lookup and the
+        # title translation; MOVIE_RESULT_CACHE_TTL=0 disables the cache
+        ttl = float(os.environ.get('MOVIE_RESULT_CACHE_TTL', 3600))
+        self.result_cache = RecommendationCache(
+            backend=result_cache_backend,
+            ttl=ttl,
+            # results with an untranslated title are kept only briefly, so the next request retries
+            fallback_ttl=float(os.environ.get('MOVIE_RESULT_CACHE_FALLBACK_TTL', 60)),
+            max_entries=int(os.environ.get('MOVIE_RESULT_CACHE_SIZE', 1024)),
+            generation=self.artifact_version(dict_path, self.similarity.source,
+                                             bundle_manifest(self.bundle_path) if self.bundle_path else None),
+        ) if ttl > 0 else None
+
+    @staticmethod
+    def _load_bundle(path, dict_path):
+        if not os.path.exists(bundle_manifest(path)):
+            return None
+        try:
+            # a bundle built from another dict_mov.pkl is stale; checking costs one read of the pickle
+            source_sha256 = file_sha256(dict_path) if os.path.exists(dict_path) else None
+            return MovieBundle.load(path, source_sha256=source_sha256, fuzzy_cutoff=0.4)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("ignoring movie bundle; rebuild it with `python -m models.movie_recommender.bundle`",
+                           extra={'path': path, 'error': str(e)})
+            return None
+
+    def artifacts_changed(self) -> bool:
+        """Whether another release was published since this instance loaded; checked at
+        most every ``MOVIE_RELEASE_CHECK_SECONDS`` (0 never checks)."""
+        if self.release_check_interval <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._release_checked < self.release_check_interval:
+            return False
+        self._release_checked = now
+        return current_release(self.base_dir) != self.release
+
+    @staticmethod
+    def artifact_version(*paths) -> str:
+        """Short fingerprint (name, size, mtime) of the artifact files the results depend on."""
+        digest = hashlib.sha1()
+        for path in paths:
+            if path and os.path.exists(path):
+                stat = os.stat(path)
+                digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        return digest.hexdigest()[:16]
+
+    def normalize_input(self, text: str) -> str:
+        if not text:
+            return text
+        text = text.strip()
+        if text in self.fa_to_en:
+            return self.fa_to_en[text]
+        return text
+
+    def _map_fa_keywords(self, text: str) -> str:
+        if not text:
+            return text
+        lowered = text.lower()
+        mapped = []
+        for fa, en in self.fa_to_en.items():
+            if fa in lowered:
+                mapped.append(en)
+        if mapped:
+            return mapped[0]
+        return text
+
+    def translate_to_en(self, text: str) -> str:
+        if not text:
+            return text
+        local_mapped = self._map_fa_keywords(text)
+        if local_mapped != text:
+            return local_mapped
+        return self._translate_many([text], 'fa', 'en', self.translator_fa_to_en)[0]
+
+    def translate_to_fa(self, text: str) -> str:
+        if not text:
+            return text
+        return self._translate_many([text], 'en', 'fa', self.translator_en_to_fa)[0]
+
+    def translate_many_to_fa(self, texts, failed: set = None) -> list:
+        return self._translate_many(texts, 'en', 'fa', self.translator_en_to_fa, failed)
+
+    def _translate_many(self, texts, source, target, translator, failed: set = None) -> list:
+        translated = list(texts)
+        for i, text in self._translate_iter(texts, source, target, translator, failed):
+            translated[i] = text
+        return translated
+
+    def _translate_iter(self, texts, source, target, translator, failed: set = None):
+        """Yields ``(index, translation)``: cache hits at once, then each network translation as it returns.
+
+        A text that could not be translated is yielded as is, and its index
+        added to ``failed`` when given.
+        """
+        cached = {}
+        if self.translation_cache is not None:
+            cached = self.translation_cache.get_many(texts, source, target)
+
+        waiting = {}
+        for i, text in enumerate(texts):
+            if cached.get(text):
+                yield i, cached[text]
+            else:
+                waiting.setdefault(text, []).append(i)
+
+        for text, indexes in waiting.items():
+            translated = None
+            if text and not self.translation_offline and translator:
+                try:
+                    translated = translator.translate(text)
+                    if translated and self.translation_cache is not None:
+                        self.translation_cache.put(text, translated, source, target)
+                except Exception as e:
+                    logger.warning("translation failed", extra={'source': source, 'target': target, 'error': str(e)})
+            # fallback to original text
+            for i in indexes:
+                if not translated and text and failed is not None:
+                    failed.add(i)
+                yield i, translated or text
+
+    def fetch_poster(self, movie_id: int) -> str:
+        return self.poster_fetcher.fetch(movie_id)
+
+    def fetch_posters(self, movie_ids) -> list:
+        return self.poster_fetcher.fetch_many(movie_ids)
+
+    def is_persian(self, text: str) -> bool:
+        return bool(re.search(r'[\u0600-\u06FF]', str(text)))
+
+    def normalize_query(self, query: str):
+        """``(query_en, user_used_farsi)``: the lower-cased English form every lookup runs on."""
+        user_used_farsi = self.is_persian(query)
+
+        query = self.normalize_input(query)
+        if user_used_farsi:
+            mapped = self._map_fa_keywords(query)
+            if mapped != query:
+                query_en = mapped.lower()
+            else:
+                with stage('movie', 'translate_query'):
+                    query_en = self.translate_to_en(query).lower()
+        else:
+            query_en = query.lower()
+        return query_en, user_used_farsi
+
+    def match(self, query: str):
+        """Model-only part of ``recommend``: ``(kind, positions, user_used_farsi)``.
+
+        ``kind`` is ``'results'`` (recommended movies) or ``'options'`` (titles
+        the user should pick from); ``positions`` index ``self.movies`` and are
+        empty when nothing matched.
+        """
+        if not query:
+            return 'results', [], False
+        query_en, user_used_farsi = self.normalize_query(query)
+        kind, positions = self.lookup(query_en)
+        return kind, positions, user_used_farsi
+
+    def lookup(self, query_en: str):
+        """``(kind, positions)`` for an already normalised query; see ``match``."""
+        if self.tags_index is not None:
+            try:
+                with stage('movie', 'genre_search'):
+                    genre_positions = self.tags_index.search(query_en, limit=5)
+                if len(genre_positions) > 0:
+                    return 'results', [int(p) for p in genre_positions]
+            except Exception as e:
+                logger.warning("genre search failed", extra={'error': str(e)})
+
+        if self.title_index is None:
+            return 'results', []
+
+        with stage('movie', 'title_search'):
+            matching_positions = self.title_index.search(query_en, limit=5)
+
+        if len(matching_positions) == 0:
+            with stage('movie', 'fuzzy_match'):
+                close = self.fuzzy_matcher.match(query_en, n=5)
+            return 'options', [i for i, _ in close]
+
+        if len(matching_positions) > 1:
+            return 'options', [int(p) for p in matching_positions]
+
+        try:
+            movie_pos = int(matching_positions[0])
+            if hasattr(self, 'similarity') and len(self.similarity) == len(self.movies):
+                with stage('movie', 'similarity'):
+                    neighbor_positions, _ = self.similarity.top_k(movie_pos, 5)
+            else:
+                logger.error("similarity dimension mismatch; cannot compute similar movies",
+                             extra={'similarity_rows': len(self.similarity), 'movies': len(self.movies)})
+                return 'results', []
+        except Exception as e:
+            logger.warning("cannot locate movie in the similarity matrix", extra={'error': str(e)})
+            return 'results', []
+
+        return 'results', [int(p) for p in neighbor_positions]
+
+    def titles_at(self, positions) -> list:
+        return self.movies.titles_at(positions)
+
+    def ids_at(self, positions) -> list:
+        return self.movies.ids_at(positions)
+
+    def resolve(self, query: str):
+        """``(cache_key, kind, positions, user_used_farsi, titles)`` for ``query``.
+
+        ``titles`` (already in the output language) is only set when the
+        result came from ``result_cache``; otherwise the caller translates
+        them and hands them to ``remember``.
+        """
+        query_en, user_used_farsi = self.normalize_query(query)
+        key = (query_en, 'fa' if user_used_farsi else 'en')
+        if self.result_cache is not None:
+            with stage('movie', 'result_cache'):
+                cached = self.result_cache.get(*key)
+            if cached is not None:
+                kind, positions, titles = cached
+                return key, kind, positions, user_used_farsi, titles
+
+        kind, positions = self.lookup(query_en)
+        if not positions:
+            self.remember(key, kind, positions, [])
+            return key, kind, positions, user_used_farsi, []
+        return key, kind, positions, user_used_farsi, None
+
+    def remember(self, key, kind, positions, titles, complete: bool = True):
+        """Store a result for ``resolve``; ``complete=False`` when a title is an untranslated fallback."""
+        if self.result_cache is not None:
+            self.result_cache.put(*key, (kind, list(positions), list(titles)), complete=complete)
+
+    def recommend(self, query: str):
+        if not query:
+            return [], []
+        key, kind, positions, user_used_farsi, titles = self.resolve(query)
+        if not positions:
+            return [], []
+
+        if titles is None:
+            titles, failed = self.titles_at(positions), set()
+            if user_used_farsi:
+                with stage('movie', 'translate_titles'):
+                    titles = self.translate_many_to_fa(titles, failed)
+            self.remember(key, kind, positions, titles, complete=not failed)
+        if kind == 'options':
+            return None, titles
+        with stage('movie', 'posters'):
+            return titles, self.fetch_posters(self.ids_at(positions))
+
+    def seed_position(self, query: str):
+        """Row of the movie ``query`` names, or ``None`` (genres, ambiguous or unknown titles).
+
+        An exact (case-insensitive) title wins; otherwise, as in ``lookup``,
+        the only title containing the query, unless it also matches a genre.
+        """
+        if not query or self.title_index is None:
+            return None
+        query_en, _ = self.normalize_query(query)
+        matches = self.title_index.search(query_en)
+        for pos in matches:
+            if self.movies.titles[pos].lower() == query_en:
+                return int(pos)
+        if len(matches) == 1 and (self.tags_index is None or not len(self.tags_index.search(query_en, limit=1))):
+            return int(matches[0])
+        return None
+
+    def recommend_from_seeds(self, seeds, k: int = 5):
+        """``recommend`` for several liked movies at once (e.g. every title picked this session).
+
+        Seeds that don't name a single movie are skipped. Movies are ranked by
+        their mean similarity to all seeds (``SimilarityStore.blended_top_k``),
+        leaving out the seeds and the neighbours ``recommend`` already showed
+        for each of them. Titles are in Persian when the last seed was.
+        """
+        seeds = [s for s in seeds if s]
+        positions = list(dict.fromkeys(p for p in map(self.seed_position, seeds) if p is not None))
+        if not positions:
+            return [], []
+
+        with stage('movie', 'blend'):
+            shown = self.similarity.neighbors_of(positions, 5)
+            recommended, _ = self.similarity.blended_top_k(positions, k, exclude=shown)
+        positions = [int(p) for p in recommended]
+        if not positions:
+            return [], []
+
+        titles = self.titles_at(positions)
+        if self.is_persian(seeds[-1]):
+            with stage('movie', 'translate_titles'):
+                titles = self.translate_many_to_fa(titles)
+        with stage('movie', 'posters'):
+            return titles, self.fetch_posters(self.ids_at(positions))
+
+    async def arecommend(self, query: str):
+        """``recommend`` for async views: the lookup and translations run on a
+        worker thread while the posters are fetched concurrently."""
+        if not query:
+            return [], []
+        key, kind, positions, user_used_farsi, titles = await asyncio.to_thread(self.resolve, query)
+        if not positions:
+            return [], []
+
+        # started first, so the posters download while the titles are translated
+        posters = None
+        if kind == 'results':
+            posters = asyncio.ensure_future(self._afetch_posters(self.ids_at(positions)))
+        if titles is None:
+            titles, failed = self.titles_at(positions), set()
+            if user_used_farsi:
+                with stage('movie', 'translate_titles'):
+                    titles = await asyncio.to_thread(self.translate_many_to_fa, titles, failed)
+            # the result cache backend may be a database
+            await asyncio.to_thread(self.remember, key, kind, positions, titles, not failed)
+        if kind == 'options':
+            return None, titles
+        return titles, await posters
+
+    async def _afetch_posters(self, movie_ids):
+        with stage('movie', 'posters'):
+            return await self.poster_fetcher.afetch_many(movie_ids)
+
+    def stream_details(self, positions, translate: bool = False, failed: set = None):
+        """Yields ``('poster', i, url)`` and, with ``translate``, ``('title', i, persian_title)``
+        for the movies at ``positions``, in the order they resolve (see ``_translate_iter``
+        for ``failed``)."""
+        posters = (('poster', i, url) for i, url in self.poster_fetcher.iter_many(self.ids_at(positions)))
+        if not translate:
+            yield from posters
+            return
+        titles = (('title', i, title) for i, title in
+                  self._translate_iter(self.titles_at(positions), 'en', 'fa', self.translator_en_to_fa, failed))
+        yield from _merge(posters, titles)
+
+    def warmup(self):
+        # touch the lookup structures once, so the first real request doesn't
+        # pay for page faults on the mmap'd similarity files
+        if len(self.similarity) > 0:
+            self.similarity.top_k(0, 5)
+        if self.title_index is not None:
+            self.title_index.search('the', limit=5)
+            self.fuzzy_matcher.match('the')
+
+    def get_all_titles(self):
+        if self.movies.titles is not None:
+            return list(self.movies.titles)
+        return []
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # listed in requirements.txt; without it async views fetch posters on the thread pool
+    httpx = None
+
+TMDB_API_BASE = 'https://api.themoviedb.org/3'
+POSTER_URL = "https://image.tmdb.org/t/p/w500/{poster_path}"
+PLACEHOLDER_NO_KEY = "https://via.placeholder.com/300x450.png?text=No+Image+Key"
+PLACEHOLDER_NO_IMAGE = "https://via.placeholder.com/300x450.png?text=No+Image"
+
+logger = logging.getLogger(__name__)
+
+
+class PosterCache:
+    """Persistent movie_id -> poster URL cache in a small SQLite file.
+
+    Movies TMDB has no poster for are stored with a NULL url (negative
+    caching) and expire after ``negative_ttl`` instead of ``ttl``.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, negative_ttl: float = 6 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _db(self):
+        # opened on first use and again after a fork, so a preloading master
+        # never shares its connection with the workers (call with _lock held)
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS posters ("
+                    "movie_id INTEGER PRIMARY KEY, url TEXT, fetched_at REAL NOT NULL)")
+        return self._conn
+
+    def get_many(self, movie_ids):
+        """Fresh entries only, as ``{movie_id: url_or_None}``; a ``None`` value is a cached miss."""
+        ids = list({int(m) for m in movie_ids})
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT movie_id, url, fetched_at FROM posters WHERE movie_id IN ({placeholders})", ids).fetchall()
+        now = time.time()
+        fresh = {}
+        for movie_id, url, fetched_at in rows:
+            ttl = self.ttl if url else self.negative_ttl
+            if now - fetched_at < ttl:
+                fresh[movie_id] = url
+        return fresh
+
+    def put(self, movie_id: int, url):
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO posters (movie_id, url, fetched_at) VALUES (?, ?, ?)",
+                    (int(movie_id), url, time.time()))
+
+
+class PosterFetcher:
+    """Resolves TMDB poster URLs concurrently over a pooled ``requests.Session``.
+
+    ``base_url`` can point at a local stand-in (see ``benchmarks/fake_tmdb.py``)
+    to run the whole path offline.
+    """
+
+    def __init__(self, api_key, base_url: str = TMDB_API_BASE, cache: PosterCache = None,
+                 max_workers: int = 8, timeout: float = 5):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='poster')
+        # loading the CA bundle is most of an httpx client's setup, so build it once
+        self._ssl_context = None
+        self._warned_no_httpx = False
+
+    def _request(self, movie_id: int):
+        """Poster URL, ``None`` if TMDB has no poster; raises on transport errors."""
+        res = self.session.get(f"{self.base_url}/movie/{movie_id}",
+                               params={'api_key': self.api_key, 'language': 'en-US'},
+                               timeout=self.timeout)
+        return self._url_from_response(movie_id, res)
+
+    def _url_from_response(self, movie_id: int, res):
+        # works for both requests and httpx responses
+        if res.status_code == 404:
+            url = None
+        else:
+            res.raise_for_status()
+            poster_path = res.json().get('poster_path')
+            url = POSTER_URL.format(poster_path=poster_path) if poster_path else None
+        if self.cache is not None:
+            self.cache.put(movie_id, url)
+        return url
+
+    def _request_or_log(self, movie_id: int):
+        try:
+            return self._request(movie_id)
+        except Exception as e:
+            logger.warning("poster fetch failed", extra={'movie_id': movie_id, 'error': str(e)})
+            return None
+
+    def fetch(self, movie_id: int) -> str:
+        return self.fetch_many([movie_id])[0]
+
+    def fetch_many(self, movie_ids) -> list:
+        """Poster URLs in the order of ``movie_ids``; misses and timeouts become placeholders."""
+        urls = [None] * len(movie_ids)
+        for i, url in self.iter_many(movie_ids):
+            urls[i] = url
+        return urls
+
+    def iter_many(self, movie_ids):
+        """Yields ``(index, url)`` for ``movie_ids`` as each poster resolves.
+
+        Cached posters come first, then network responses in arrival order;
+        whatever is still missing at the deadline is yielded as a placeholder.
+        """
+        movie_ids = [int(m) for m in movie_ids]
+        if not self.api_key:
+            for i in range(len(movie_ids)):
+                yield i, PLACEHOLDER_NO_KEY
+            return
+
+        resolved = self.cache.get_many(movie_ids) if self.cache is not None else {}
+        waiting = {}
+        for i, movie_id in enumerate(movie_ids):
+            if movie_id in resolved:
+                yield i, resolved[movie_id] or PLACEHOLDER_NO_IMAGE
+            else:
+                waiting.setdefault(movie_id, []).append(i)
+        if not waiting:
+            return
+
+        pending = {self._executor.submit(self._request_or_log, m): m for m in waiting}
+        try:
+            # one deadline for the whole batch; late responses still land in
+            # the cache for the next request
+            for future in as_completed(pending, timeout=self.timeout):
+                for i in waiting.pop(pending[future]):
+                    yield i, future.result() or PLACEHOLDER_NO_IMAGE
+        except TimeoutError:
+            for indexes in waiting.values():
+                for i in indexes:
+                    yield i, PLACEHOLDER_NO_IMAGE
+
+    async def _arequest_or_log(self, client, movie_id: int):
+        try:
+            res = await client.get(f"{self.base_url}/movie/{movie_id}",
+                                   params={'api_key': self.api_key, 'language': 'en-US'})
+            # parsing is cheap, but the cache write is blocking SQLite I/O
+            return await asyncio.to_thread(self._url_from_response, movie_id, res)
+        except Exception as e:
+            logger.warning("poster fetch failed", extra={'movie_id': movie_id, 'error': str(e)})
+            return None
+
+    async def afetch_many(self, movie_ids) -> list:
+        """``fetch_many`` for async views, on an ``httpx.AsyncClient`` when httpx is installed."""
+        if httpx is None:
+            if not self._warned_no_httpx:
+                self._warned_no_httpx = True
+                logger.warning("httpx is not installed; async poster fetches fall back to the thread pool")
+            return await asyncio.to_thread(self.fetch_many, movie_ids)
+
+        movie_ids = [int(m) for m in movie_ids]
+        if not self.api_key:
+            return [PLACEHOLDER_NO_KEY] * len(movie_ids)
+
+        resolved = await asyncio.to_thread(self.cache.get_many, movie_ids) if self.cache is not None else {}
+        missing = [m for m in dict.fromkeys(movie_ids) if m not in resolved]
+        if missing:
+            if self._ssl_context is None:
+                self._ssl_context = await asyncio.to_thread(httpx.create_ssl_context)
+            # a client per call: it is bound to this event loop and closed on the way out
+            async with httpx.AsyncClient(timeout=self.timeout, verify=self._ssl_context,
+                                         limits=httpx.Limits(max_connections=self.max_workers)) as client:
+                pending = {m: asyncio.ensure_future(self._arequest_or_log(client, m)) for m in missing}
+                # same single deadline for the whole batch as fetch_many
+                await asyncio.wait(pending.values(), timeout=self.timeout)
+                late = [task for task in pending.values() if not task.done()]
+                for task in late:
+                    task.cancel()
+                await asyncio.gather(*late, return_exceptions=True)
+            for movie_id, task in pending.items():
+                if not task.cancelled():
+                    resolved[movie_id] = task.result()
+
+        return [resolved.get(m) or PLACEHOLDER_NO_IMAGE for m in movie_ids]
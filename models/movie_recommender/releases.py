@@ -0,0 +1,137 @@
+import os
+import re
+import shutil
+from contextlib import contextmanager
+
+RELEASES_DIR = 'releases'
+CURRENT = 'CURRENT'
+LOCK = '.lock'
+_RELEASE_NAME = re.compile(r'^v(\d+)$')
+
+
+def releases_dir(base_dir: str) -> str:
+    return os.path.join(base_dir, RELEASES_DIR)
+
+
+def current_release(base_dir: str) -> str:
+    """Name of the published release, or ``''`` while the artifacts still live in ``base_dir`` itself."""
+    try:
+        with open(os.path.join(releases_dir(base_dir), CURRENT), encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return ''
+    return name if name and os.path.isdir(os.path.join(releases_dir(base_dir), name)) else ''
+
+
+def artifact_dir(base_dir: str, release: str = None) -> str:
+    """Directory holding ``dict_mov.pkl``, the bundle and the similarity files of ``release`` (default: current)."""
+    if release is None:
+        release = current_release(base_dir)
+    return os.path.join(releases_dir(base_dir), release) if release else base_dir
+
+
+def list_releases(base_dir: str) -> list:
+    """Release names, oldest first."""
+    if not os.path.isdir(releases_dir(base_dir)):
+        return []
+    names = [name for name in os.listdir(releases_dir(base_dir)) if _RELEASE_NAME.match(name)]
+    return sorted(names, key=lambda name: int(_RELEASE_NAME.match(name).group(1)))
+
+
+def next_release(base_dir: str) -> str:
+    names = list_releases(base_dir)
+    return f'v{int(_RELEASE_NAME.match(names[-1]).group(1)) + 1 if names else 1:04d}'
+
+
+def publish(base_dir: str, name: str):
+    """Make ``name`` the current release; running recommenders pick it up on their next check."""
+    publish_dir(releases_dir(base_dir), name)
+
+
+def published_dir(path: str) -> str:
+    """Directory of the version of an artifact directory published at ``path`` (see
+    ``save_version``), or ``path`` itself when it was written without versions."""
+    try:
+        with open(os.path.join(path, CURRENT), encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return path
+    return os.path.join(path, name) if name else path
+
+
+def save_version(path: str, write, legacy=()) -> str:
+    """Write a new version of the artifact directory ``path`` and publish it.
+
+    ``write(directory)`` fills ``path/vNNNN.tmp``; once it returns, the
+    directory is renamed to ``path/vNNNN`` and ``path/CURRENT`` is replaced
+    to name it, so ``published_dir`` never sees a partial write. The
+    previous version stays for readers that still map it; older ones,
+    leftovers of interrupted writes and the ``legacy`` files (an unversioned
+    copy at ``path`` itself) are deleted. Returns the new version's directory.
+    """
+    os.makedirs(path, exist_ok=True)
+    versions = sorted((name for name in os.listdir(path) if _RELEASE_NAME.match(name)),
+                      key=lambda name: int(_RELEASE_NAME.match(name).group(1)))
+    name = f'v{int(_RELEASE_NAME.match(versions[-1]).group(1)) + 1 if versions else 1:04d}'
+    version_path = os.path.join(path, name)
+    shutil.rmtree(version_path + '.tmp', ignore_errors=True)
+    os.makedirs(version_path + '.tmp')
+    write(version_path + '.tmp')
+    os.replace(version_path + '.tmp', version_path)
+    publish_dir(path, name)
+
+    stale = [os.path.join(path, old) for old in os.listdir(path)
+             if old not in (name, *versions[-1:]) and (_RELEASE_NAME.match(old) or old.endswith('.tmp'))
+             and os.path.isdir(os.path.join(path, old))]
+    for target in stale + [os.path.join(path, old) for old in legacy]:
+        try:
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            else:
+                os.remove(target)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # still memory-mapped by a worker on Windows; the next save retries
+            pass
+    return version_path
+
+
+def publish_dir(path: str, name: str):
+    pointer = os.path.join(path, CURRENT)
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(name + '\n')
+    os.replace(pointer + '.tmp', pointer)
+
+
+def prune(base_dir: str, keep: int = 3) -> list:
+    """Delete all but the ``keep`` newest releases (never the current one); returns the deleted names."""
+    current = current_release(base_dir)
+    removed = []
+    for name in list_releases(base_dir)[:-keep] if keep > 0 else []:
+        if name == current:
+            continue
+        try:
+            shutil.rmtree(os.path.join(releases_dir(base_dir), name))
+            removed.append(name)
+        except OSError:
+            # still memory-mapped by a worker on Windows; the next prune retries
+            pass
+    return removed
+
+
+@contextmanager
+def release_lock(base_dir: str):
+    """Held while a release is being built, so two ingestions never pick the same name."""
+    os.makedirs(releases_dir(base_dir), exist_ok=True)
+    path = os.path.join(releases_dir(base_dir), LOCK)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise RuntimeError(f"another ingestion is running ({path}; delete it if that process died)")
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        os.remove(path)
@@ -0,0 +1,101 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from models.metrics import CACHE_LOOKUPS
+
+
+class LocalLRUCache:
+    """Bounded in-process LRU with per-entry expiry.
+
+    Implements the part of Django's cache API (``get``/``set``/``clear``)
+    that ``RecommendationCache`` uses, so a Django cache such as
+    ``django.core.cache.caches['default']`` can be dropped in instead.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RecommendationCache:
+    """Movie lookup results keyed on the normalised English query and the output language.
+
+    ``generation`` identifies the loaded movie artifacts and is part of every
+    key, so results computed from older artifacts are never served, even
+    from a cache shared between processes; ``invalidate`` moves to a new
+    generation. ``backend`` is anything with Django's ``get``/``set`` cache
+    API and defaults to an in-process ``LocalLRUCache``. Results stored as
+    incomplete (a title translation fell back to English) expire after
+    ``fallback_ttl`` instead of ``ttl``, or are not stored if it is 0.
+    """
+
+    def __init__(self, backend=None, ttl: float = 3600, max_entries: int = 1024, generation: str = '',
+                 fallback_ttl: float = 60):
+        self.backend = backend if backend is not None else LocalLRUCache(max_entries)
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.generation = generation
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, query_en: str, language: str) -> str:
+        # hashed: memcached rejects long keys and keys with spaces
+        digest = hashlib.sha1(f"{self.generation}\0{language}\0{query_en}".encode('utf-8')).hexdigest()
+        return f"movie-rec:{digest}"
+
+    def get(self, query_en: str, language: str):
+        value = self.backend.get(self.key(query_en, language))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_LOOKUPS.inc('movie_results', 'miss' if value is None else 'hit')
+        return value
+
+    def put(self, query_en: str, language: str, value, complete: bool = True):
+        ttl = self.ttl if complete else min(self.fallback_ttl, self.ttl)
+        if ttl > 0:
+            self.backend.set(self.key(query_en, language), value, ttl)
+
+    def invalidate(self, generation: str = None):
+        """Stop serving everything cached so far (e.g. after the movie artifacts were rebuilt)."""
+        self.generation = generation if generation is not None else f"{self.generation}+{time.time_ns()}"
+        if isinstance(self.backend, LocalLRUCache):
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0, 'generation': self.generation}
@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import numpy as np
+
+SIMILARITY_PKL = 'similarity.pkl'
+SIMILARITY_NPY = 'similarity.npy'
+NEIGHBORS_IDX_NPY = 'neighbors_idx.npy'
+NEIGHBORS_SCORE_NPY = 'neighbors_score.npy'
+NEIGHBORS_JSON = 'neighbors.json'
+DEFAULT_NEIGHBOR_DEPTH = 50
+
+logger = logging.getLogger(__name__)
+
+
+def top_k_from_scores(scores: np.ndarray, k: int):
+    """Positions and values of the ``k`` largest scores, best first, in O(N + k log k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    part = np.argpartition(scores, -k)[-k:]
+    order = part[np.argsort(scores[part])[::-1]]
+    return order, np.asarray(scores[order], dtype=np.float32)
+
+
+class SimilarityStore:
+    """Row-addressable view over the movie similarity matrix.
+
+    The matrix is opened from ``similarity.npy`` with ``mmap_mode='r'`` so every
+    worker shares the same pages through the OS cache; only the rows that are
+    actually read get paged in. ``similarity.pkl`` is still accepted as a
+    fallback until it has been converted.
+
+    When the precomputed neighbour table (``neighbors_idx.npy`` /
+    ``neighbors_score.npy``) is present, ``top_k`` answers from it directly and
+    only falls back to partitioning the full row when asked for more neighbours
+    than were stored.
+    """
+
+    def __init__(self, matrix, source=None, neighbor_idx=None, neighbor_scores=None):
+        self.matrix = matrix
+        self.source = source
+        self.neighbor_idx = neighbor_idx
+        self.neighbor_scores = neighbor_scores
+
+    @classmethod
+    def load(cls, base_dir):
+        npy_path = os.path.join(base_dir, SIMILARITY_NPY)
+        if os.path.exists(npy_path):
+            matrix = np.load(npy_path, mmap_mode='r')
+            neighbor_idx, neighbor_scores = load_neighbors(base_dir, matrix)
+            return cls(matrix, source=npy_path, neighbor_idx=neighbor_idx, neighbor_scores=neighbor_scores)
+
+        pkl_path = os.path.join(base_dir, SIMILARITY_PKL)
+        if os.path.exists(pkl_path):
+            logger.warning("loading similarity.pkl into memory; run "
+                           "`python -m models.movie_recommender.similarity_store` to convert it",
+                           extra={'path': pkl_path})
+            with open(pkl_path, 'rb') as f:
+                return cls(np.asarray(pickle.load(f)), source=pkl_path)
+
+        raise FileNotFoundError(
+            f"فایل {SIMILARITY_NPY} یا {SIMILARITY_PKL} در پوشه models/movie_recommender وجود ندارد.")
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dtype(self):
+        return self.matrix.dtype
+
+    @property
+    def neighbor_depth(self) -> int:
+        if self.neighbor_idx is None:
+            return 0
+        return self.neighbor_idx.shape[1]
+
+    def row(self, pos: int) -> np.ndarray:
+        return np.asarray(self.matrix[pos], dtype=np.float32)
+
+    def top_k(self, pos: int, k: int = 5):
+        """The ``k`` most similar movies to ``pos`` (excluding itself), best first."""
+        if k <= self.neighbor_depth:
+            return np.asarray(self.neighbor_idx[pos, :k]), np.asarray(self.neighbor_scores[pos, :k])
+        scores = np.array(self.matrix[pos], dtype=np.float32)
+        scores[pos] = -np.inf
+        return top_k_from_scores(scores, k)
+
+    def neighbors_of(self, positions, k: int = 5) -> np.ndarray:
+        """The ``top_k`` neighbours of every position in ``positions``, concatenated."""
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        if k <= self.neighbor_depth:
+            return np.asarray(self.neighbor_idx[np.asarray(positions, dtype=np.intp), :k]).ravel()
+        return np.concatenate([self.top_k(pos, k)[0] for pos in positions])
+
+    def blended_top_k(self, positions, k: int = 5, weights=None, exclude=None):
+        """The ``k`` movies most similar to all of ``positions`` together, best first.
+
+        The score of every movie is the (``weights``-weighted) mean of its
+        similarity to the seeds: the seed rows are read in one gather and
+        reduced with a single matrix-vector product. The seeds themselves
+        and the positions in ``exclude`` are never returned.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if weights is None:
+            weights = np.full(len(positions), 1.0 / len(positions), dtype=np.float32)
+        else:
+            weights = np.asarray(weights, dtype=np.float32)
+            weights = weights / weights.sum()
+
+        # sorted reads touch the mmap'd file front to back
+        order = np.argsort(positions, kind='stable')
+        rows = np.asarray(self.matrix[positions[order]], dtype=np.float32)
+        scores = weights[order] @ rows
+        scores[positions] = -np.inf
+        if exclude is not None and len(exclude):
+            scores[np.asarray(exclude, dtype=np.intp)] = -np.inf
+
+        top, top_scores = top_k_from_scores(scores, k)
+        keep = np.isfinite(top_scores)
+        return top[keep], top_scores[keep]
+
+
+def _top_k_rows(block: np.ndarray, k: int):
+    """Per-row top ``k`` of ``block`` (positions and scores), best first."""
+    part = np.argpartition(block, -k, axis=1)[:, -k:]
+    part_scores = np.take_along_axis(block, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def build_neighbors(matrix, k: int = DEFAULT_NEIGHBOR_DEPTH, chunk_size: int = 512):
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    neighbor_idx = np.empty((n, k), dtype=np.int32)
+    neighbor_scores = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        block = np.array(matrix[start:stop], dtype=np.float32)
+        rows = np.arange(stop - start)
+        block[rows, rows + start] = -np.inf
+        neighbor_idx[start:stop], neighbor_scores[start:stop] = _top_k_rows(block, k)
+    return neighbor_idx, neighbor_scores
+
+
+def extend_matrix(matrix, new_rows: np.ndarray, dst: str, chunk_size: int = 512):
+    """Write ``matrix`` grown by ``new_rows`` to ``dst``.
+
+    ``new_rows`` (m x (N + m)) holds the similarity of each added movie to every
+    movie, the added ones last; it is also the new column of the existing rows,
+    so nothing else is recomputed, the old block is only copied over in chunks.
+    """
+    n, m = matrix.shape[0], new_rows.shape[0]
+    tmp_path = dst + '.tmp'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=matrix.dtype, shape=(n + m, n + m))
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        out[start:stop, :n] = matrix[start:stop]
+        out[start:stop, n:] = new_rows[:, start:stop].T
+    out[n:] = new_rows
+    out.flush()
+    del out
+    os.replace(tmp_path, dst)
+
+
+def extend_neighbors(neighbor_idx, neighbor_scores, new_rows: np.ndarray):
+    """The neighbour table once the movies of ``new_rows`` (see ``extend_matrix``) are appended.
+
+    An existing movie only weighs its stored neighbours against the added
+    movies; the added movies take their top K from their own rows.
+    """
+    n, k = neighbor_idx.shape
+    m = new_rows.shape[0]
+    added = np.arange(n, n + m, dtype=np.int32)
+    candidates = np.concatenate([np.asarray(neighbor_idx), np.broadcast_to(added, (n, m))], axis=1)
+    scores = np.concatenate([np.asarray(neighbor_scores), np.asarray(new_rows[:, :n].T, dtype=np.float32)], axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+
+    block = np.array(new_rows, dtype=np.float32)
+    block[np.arange(m), added] = -np.inf
+    new_idx, new_scores = _top_k_rows(block, min(k, n + m - 1))
+    return (np.concatenate([np.take_along_axis(candidates, order, axis=1), new_idx.astype(np.int32)]),
+            np.concatenate([np.take_along_axis(scores, order, axis=1), new_scores]))
+
+
+def matrix_stamp(matrix, samples: int = 16) -> str:
+    """Cheap fingerprint of a similarity matrix: its shape, dtype and a few evenly spaced rows."""
+    digest = hashlib.sha256(f"{matrix.shape}:{matrix.dtype}".encode())
+    if matrix.shape[0]:
+        for pos in np.unique(np.linspace(0, matrix.shape[0] - 1, samples).astype(np.intp)):
+            digest.update(np.ascontiguousarray(matrix[pos]).tobytes())
+    return digest.hexdigest()
+
+
+def load_neighbors(base_dir, matrix=None):
+    """The neighbour table in ``base_dir``, or ``(None, None)`` if there is none or it
+    was not built from ``matrix``."""
+    idx_path = os.path.join(base_dir, NEIGHBORS_IDX_NPY)
+    score_path = os.path.join(base_dir, NEIGHBORS_SCORE_NPY)
+    if not os.path.exists(idx_path) or not os.path.exists(score_path):
+        return None, None
+    neighbor_idx, neighbor_scores = np.load(idx_path, mmap_mode='r'), np.load(score_path, mmap_mode='r')
+    if neighbor_idx.shape != neighbor_scores.shape:
+        logger.warning("neighbour table is inconsistent; ignoring it", extra={'path': idx_path})
+        return None, None
+    if matrix is None:
+        return neighbor_idx, neighbor_scores
+
+    if neighbor_idx.shape[0] != matrix.shape[0]:
+        logger.warning("neighbour table does not match the similarity matrix; ignoring it",
+                       extra={'path': idx_path, 'rows': neighbor_idx.shape[0], 'movies': matrix.shape[0]})
+        return None, None
+    try:
+        with open(os.path.join(base_dir, NEIGHBORS_JSON)) as f:
+            recorded = json.load(f).get('matrix')
+    except FileNotFoundError:
+        # written before the stamp was recorded: the row count is all there is to check
+        recorded = None
+    if recorded is not None and recorded != matrix_stamp(matrix):
+        logger.warning("neighbour table was built from a different similarity matrix; ignoring it",
+                       extra={'path': idx_path})
+        return None, None
+    return neighbor_idx, neighbor_scores
+
+
+def _save_npy(path: str, array: np.ndarray):
+    # write next to the destination and swap in, so running workers never
+    # mmap a half-written file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def save_neighbors(base_dir: str, neighbor_idx: np.ndarray, neighbor_scores: np.ndarray, matrix):
+    """Write the neighbour table built from ``matrix`` (already saved in ``base_dir``)."""
+    _save_npy(os.path.join(base_dir, NEIGHBORS_IDX_NPY), neighbor_idx)
+    _save_npy(os.path.join(base_dir, NEIGHBORS_SCORE_NPY), neighbor_scores)
+    # last: until it is replaced, the old stamp no longer matches and the table is ignored
+    json_path = os.path.join(base_dir, NEIGHBORS_JSON)
+    with open(json_path + '.tmp', 'w') as f:
+        json.dump({'matrix': matrix_stamp(matrix), 'depth': int(neighbor_idx.shape[1])}, f)
+    os.replace(json_path + '.tmp', json_path)
+
+
+def remove_neighbors(base_dir: str):
+    for name in (NEIGHBORS_JSON, NEIGHBORS_IDX_NPY, NEIGHBORS_SCORE_NPY):
+        try:
+            os.remove(os.path.join(base_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def convert_pickle(src: str, dst: str, dtype: str = 'float32') -> str:
+    with open(src, 'rb') as f:
+        matrix = np.asarray(pickle.load(f))
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError(f"expected a square similarity matrix, got shape {matrix.shape}")
+
+    _save_npy(dst, np.ascontiguousarray(matrix, dtype=np.dtype(dtype)))
+    return dst
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(
+        description="Convert similarity.pkl into a memory-mappable .npy file and build the top-K neighbour table.")
+    parser.add_argument('--src', default=os.path.join(base_dir, SIMILARITY_PKL))
+    parser.add_argument('--dst', default=os.path.join(base_dir, SIMILARITY_NPY))
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default='float32')
+    parser.add_argument('--neighbors', type=int, default=DEFAULT_NEIGHBOR_DEPTH,
+                        help="neighbours stored per movie (0 skips the table)")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.src):
+        convert_pickle(args.src, args.dst, args.dtype)
+        size_mb = os.path.getsize(args.dst) / (1024 * 1024)
+        print(f"wrote {args.dst} ({args.dtype}, {size_mb:.1f} MB)")
+    elif not os.path.exists(args.dst):
+        parser.error(f"neither {args.src} nor {args.dst} exists")
+
+    out_dir = os.path.dirname(os.path.abspath(args.dst))
+    if args.neighbors > 0:
+        matrix = np.load(args.dst, mmap_mode='r')
+        neighbor_idx, neighbor_scores = build_neighbors(matrix, args.neighbors)
+        save_neighbors(out_dir, neighbor_idx, neighbor_scores, matrix)
+        print(f"wrote top-{neighbor_idx.shape[1]} neighbour table to {out_dir}")
+    else:
+        # a table left from an earlier run would not match the matrix just written
+        remove_neighbors(out_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import itertools
+from collections.abc import Mapping
+import numpy as np
+from models.movie_recommender.catalog import TextColumn
+
+
+class PostingLists(Mapping):
+    """Read-only ``{gram: rows}`` over saved posting lists.
+
+    ``grams`` is sorted and the rows of ``grams[i]`` are
+    ``rows[offsets[i]:offsets[i + 1]]``; a lookup is a binary search, so
+    opening memory-mapped lists builds nothing.
+    """
+
+    def __init__(self, grams, offsets, rows):
+        # plain ndarray views: slicing an np.memmap costs several times more
+        self.grams = np.asarray(grams)
+        self.offsets = np.asarray(offsets)
+        self.rows = np.asarray(rows)
+        self._bounds = memoryview(np.ascontiguousarray(self.offsets, dtype=np.int64)).cast('B').cast('q')
+
+    def _find(self, gram) -> int:
+        i = int(np.searchsorted(self.grams, gram))
+        return i if i < len(self.grams) and self.grams[i] == gram else -1
+
+    def get(self, gram, default=None):
+        i = self._find(gram)
+        return self.rows[self._bounds[i]:self._bounds[i + 1]] if i >= 0 else default
+
+    def __getitem__(self, gram):
+        rows = self.get(gram)
+        if rows is None:
+            raise KeyError(gram)
+        return rows
+
+    def __contains__(self, gram):
+        return self._find(gram) >= 0
+
+    def __iter__(self):
+        return iter(self.grams.tolist())
+
+    def __len__(self):
+        return len(self.grams)
+
+    def items(self):
+        bounds = self._bounds
+        return ((gram, self.rows[bounds[i]:bounds[i + 1]]) for i, gram in enumerate(self.grams.tolist()))
+
+    def lookup(self, grams) -> list:
+        """``[self.get(gram) for gram in grams]`` with one binary search for all of them."""
+        grams = list(grams)
+        if not grams or not len(self.grams):
+            return [None] * len(grams)
+        found = np.minimum(np.searchsorted(self.grams, grams), len(self.grams) - 1)
+        hits = self.grams[found] == np.array(grams, dtype=self.grams.dtype)
+        bounds = self._bounds
+        return [self.rows[bounds[i]:bounds[i + 1]] if hit else None
+                for i, hit in zip(found.tolist(), hits.tolist())]
+
+    def containing(self, query: str):
+        """Posting lists of the grams that contain ``query``."""
+        bounds = self._bounds
+        return [self.rows[bounds[i]:bounds[i + 1]] for i in np.flatnonzero(np.char.find(self.grams, query) >= 0)]
+
+
+def lookup(postings, grams) -> list:
+    """Posting list of every gram in ``grams`` (``None`` where there is none), from a dict or ``PostingLists``."""
+    if isinstance(postings, PostingLists):
+        return postings.lookup(grams)
+    return [postings.get(gram) for gram in grams]
+
+
+def sorted_postings(postings: dict):
+    """``(grams, offsets, rows)``: ``postings`` as one concatenated array, grams sorted (see ``PostingLists``)."""
+    grams = sorted(postings)
+    offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[g]) for g in grams])
+    rows = np.concatenate([postings[g] for g in grams]) if grams else np.empty(0, dtype=np.int32)
+    return grams, offsets, rows.astype(np.int32, copy=False)
+
+
+class SubstringIndex:
+    """Case-insensitive substring search over one text column.
+
+    Every text is broken into character n-grams and each n-gram maps to a
+    sorted array of the row positions containing it. A query is answered by
+    intersecting the posting arrays of its own n-grams and then confirming the
+    (few) surviving rows with a plain ``in`` check, so results are exactly
+    those of a literal substring scan, in row order.
+    """
+
+    def __init__(self, texts, n: int = 3):
+        self.n = n
+        # upper() rather than lower(): same case-insensitive semantics as
+        # pandas' str.contains(case=False), including 'ß' -> 'SS' and 'ı' -> 'I'
+        self.texts = [t.upper() if isinstance(t, str) else '' for t in texts]
+
+        postings = {}
+        short_rows = []
+        for pos, text in enumerate(self.texts):
+            if len(text) < n:
+                short_rows.append(pos)
+                continue
+            for gram in {text[i:i + n] for i in range(len(text) - n + 1)}:
+                postings.setdefault(gram, []).append(pos)
+
+        # rows are visited in order, so every posting list is already sorted
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self._short_rows = np.array(short_rows, dtype=np.int32)
+        self._all_rows = np.arange(len(self.texts), dtype=np.int32)
+
+    @classmethod
+    def from_postings(cls, texts, grams, offsets, rows, short_rows, n: int = 3):
+        """Reopen an index saved with ``postings_arrays``; ``texts`` are the already upper-cased texts.
+
+        The posting lists are looked up in the sorted ``grams`` and sliced out
+        of ``rows``, so memory-mapped arrays are used as is.
+        """
+        index = cls.__new__(cls)
+        index.n = n
+        index.texts = texts
+        index.postings = PostingLists(grams, offsets, rows)
+        index._short_rows = np.asarray(short_rows, dtype=np.int32)
+        index._all_rows = np.arange(len(texts), dtype=np.int32)
+        return index
+
+    def postings_arrays(self):
+        """``(grams, offsets, rows, short_rows)``: the posting lists as one concatenated array, grams sorted."""
+        return (*sorted_postings(dict(self.postings.items())), self._short_rows)
+
+    def extend(self, texts):
+        """Append rows for ``texts`` in place; existing rows keep their positions."""
+        start = len(self.texts)
+        new_texts = [t.upper() if isinstance(t, str) else '' for t in texts]
+        added = {}
+        short_rows = []
+        for pos, text in enumerate(new_texts, start):
+            if len(text) < self.n:
+                short_rows.append(pos)
+                continue
+            for gram in {text[i:i + self.n] for i in range(len(text) - self.n + 1)}:
+                added.setdefault(gram, []).append(pos)
+
+        # the new positions come after every existing one, so appending keeps the lists sorted
+        postings = dict(self.postings.items())
+        for gram, rows in added.items():
+            new_rows = np.array(rows, dtype=np.int32)
+            postings[gram] = np.concatenate([postings[gram], new_rows]) if gram in postings else new_rows
+        self.texts = self.texts + new_texts
+        self.postings = postings
+        self._short_rows = np.concatenate([self._short_rows, np.array(short_rows, dtype=np.int32)])
+        self._all_rows = np.arange(len(self.texts), dtype=np.int32)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _candidates(self, query: str) -> np.ndarray:
+        if not query:
+            return self._all_rows
+
+        if len(query) < self.n:
+            if isinstance(self.postings, PostingLists):
+                lists = self.postings.containing(query)
+            else:
+                lists = [rows for gram, rows in self.postings.items() if query in gram]
+            lists.append(self._short_rows)
+            return np.unique(np.concatenate(lists))
+
+        grams = {query[i:i + self.n] for i in range(len(query) - self.n + 1)}
+        lists = lookup(self.postings, grams)
+        if any(rows is None for rows in lists):
+            return self._short_rows[:0]
+        lists.sort(key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+
+    def search(self, query: str, limit: int = None) -> np.ndarray:
+        """Row positions whose text contains ``query``, ascending, at most ``limit`` of them."""
+        query = (query or '').upper()
+        candidates = self._candidates(query)
+        if isinstance(self.texts, TextColumn):
+            found = self.texts.containing(query, candidates.tolist())
+        else:
+            found = (pos for pos in candidates.tolist() if query in self.texts[pos])
+        return np.fromiter(itertools.islice(found, limit), dtype=np.int64)
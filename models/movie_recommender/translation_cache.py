@@ -0,0 +1,114 @@
+import argparse
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """Persistent (source, target, text) -> translation store in a SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _db(self):
+        # opened on first use and again after a fork, so a preloading master
+        # never shares its connection with the workers (call with _lock held)
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL, translated TEXT NOT NULL, "
+                    "PRIMARY KEY (source, target, text))")
+        return self._conn
+
+    def get_many(self, texts, source: str, target: str) -> dict:
+        texts = list(dict.fromkeys(t for t in texts if t))
+        found = {}
+        # stay well below SQLite's bound-parameter limit
+        for start in range(0, len(texts), 500):
+            chunk = texts[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            with self._lock:
+                rows = self._db().execute(
+                    f"SELECT text, translated FROM translations "
+                    f"WHERE source = ? AND target = ? AND text IN ({placeholders})",
+                    [source, target, *chunk]).fetchall()
+            found.update(rows)
+        return found
+
+    def get(self, text: str, source: str, target: str):
+        return self.get_many([text], source, target).get(text)
+
+    def put_many(self, pairs, source: str, target: str):
+        rows = [(source, target, text, translated) for text, translated in pairs if text and translated]
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations (source, target, text, translated) VALUES (?, ?, ?, ?)",
+                    rows)
+
+    def put(self, text: str, translated: str, source: str, target: str):
+        self.put_many([(text, translated)], source, target)
+
+
+def pretranslate(titles, cache: TranslationCache, translator, source='en', target='fa',
+                 chunk_size: int = 50, workers: int = 4):
+    """Translate every title missing from ``cache``; returns ``(translated, failed)`` counts."""
+    cached = cache.get_many(titles, source, target)
+    missing = [t for t in dict.fromkeys(titles) if t and t not in cached]
+
+    def translate_one(title):
+        try:
+            return title, translator.translate(title)
+        except Exception as e:
+            logger.warning("translation failed for %r: %s", title, e)
+            return title, None
+
+    translated = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # commit per chunk, so an interrupted run resumes where it stopped
+        for start in range(0, len(missing), chunk_size):
+            results = list(pool.map(translate_one, missing[start:start + chunk_size]))
+            ok = [(t, tr) for t, tr in results if tr]
+            cache.put_many(ok, source, target)
+            translated += len(ok)
+            failed += len(results) - len(ok)
+            logger.info("%d/%d titles processed", start + len(results), len(missing))
+    return translated, failed
+
+
+def main(argv=None):
+    from deep_translator import GoogleTranslator
+
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Pre-translate every catalog title into the translation cache.")
+    parser.add_argument('--movies', default=os.path.join(base_dir, 'dict_mov.pkl'))
+    parser.add_argument('--cache', default=os.environ.get('MOVIE_TRANSLATION_CACHE')
+                        or os.path.join(base_dir, 'translations.sqlite3'))
+    parser.add_argument('--target', default='fa')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    with open(args.movies, 'rb') as f:
+        titles = [str(t) for t in pickle.load(f)['title'].values()]
+
+    cache = TranslationCache(args.cache)
+    translator = GoogleTranslator(source='en', target=args.target)
+    translated, failed = pretranslate(titles, cache, translator, target=args.target, workers=args.workers)
+    print(f"done: {translated} new translations, {failed} failed, cache at {args.cache}")
+
+
+if __name__ == '__main__':
+    main()
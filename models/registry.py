@@ -0,0 +1,98 @@
+import gc
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Name -> model mapping that constructs each model on first use.
+
+    ``factories`` maps a model name to a zero-argument callable (usually the
+    model class). Loading is thread-safe and happens once per process, unless
+    ``preload`` ran before the process forked, in which case workers inherit
+    the loaded models copy-on-write.
+
+    A model with an ``artifacts_changed()`` method is rebuilt in the background
+    once that returns true (e.g. a new movie catalog was published); requests
+    keep getting the current instance until the new one has loaded.
+    """
+
+    def __init__(self, factories: dict):
+        self._factories = dict(factories)
+        self._models = {}
+        self._locks = {name: threading.Lock() for name in self._factories}
+        self._refreshing = set()
+
+    def __contains__(self, name):
+        return name in self._factories
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def names(self):
+        return list(self._factories)
+
+    def is_loaded(self, name) -> bool:
+        return name in self._models
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            self._refresh_if_changed(name, model)
+            return model
+        if name not in self._factories:
+            raise KeyError(name)
+        with self._locks[name]:
+            if name not in self._models:
+                self._models[name] = self._factories[name]()
+            return self._models[name]
+
+    def reload(self, name):
+        """Build a fresh ``name`` (e.g. after its artifacts were rebuilt) and swap it in.
+
+        Requests already holding the old instance finish with it.
+        """
+        if name not in self._factories:
+            raise KeyError(name)
+        model = self._factories[name]()
+        with self._locks[name]:
+            self._models[name] = model
+        return model
+
+    def _refresh_if_changed(self, name, model):
+        changed = getattr(model, 'artifacts_changed', None)
+        if changed is None or name in self._refreshing or not changed():
+            return
+        with self._locks[name]:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+        threading.Thread(target=self._refresh, args=(name,), daemon=True).start()
+
+    def _refresh(self, name):
+        try:
+            self.reload(name)
+            logger.info("model reloaded", extra={'model': name})
+        except Exception as e:
+            logger.warning("model reload failed; keeping the loaded one", extra={'model': name, 'error': str(e)})
+        finally:
+            self._refreshing.discard(name)
+
+    def preload(self, names=None, freeze: bool = False):
+        """Load ``names`` (default: all) now; ``freeze`` moves them out of the GC's reach before a fork."""
+        for name in names or self.names():
+            self.get(name)
+        if freeze:
+            # keep the collector from touching (and so un-sharing) the pages
+            # holding the preloaded objects in forked workers
+            gc.collect()
+            gc.freeze()
+
+    def warmup(self, names=None):
+        """Load ``names`` and run each model's optional ``warmup()`` hook."""
+        for name in names or self.names():
+            model = self.get(name)
+            hook = getattr(model, 'warmup', None)
+            if callable(hook):
+                hook()
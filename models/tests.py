@@ -0,0 +1,179 @@
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from difflib import get_close_matches
+from unittest import mock
+from models.diabetes_prediction import ocr_jobs
+from models.diabetes_prediction.keyword_extractor import KeywordExtractor, normalize_ocr_text
+from models.diabetes_prediction.ml_model import DiabetesModel
+from models.movie_recommender.fuzzy import FuzzyTitleMatcher
+from models.text_utils import to_english_digits
+
+
+def extract_with_loop(keywords, text):
+    # the per-keyword search KeywordExtractor replaced
+    text = to_english_digits(text.replace('،', ',').replace(':', ' ').lower())
+    features = {}
+    for field, keys in keywords.items():
+        for key in keys:
+            match = re.search(rf"{re.escape(key)}[\s:\-]*([\d\.,]+)", text, flags=re.IGNORECASE)
+            if match:
+                features[field] = to_english_digits(match.group(1).strip().replace(',', '.'))
+                break
+    return features
+
+
+class KeywordExtractorTests(unittest.TestCase):
+    def random_text(self, rng, keywords):
+        words = [k for keys in keywords.values() for k in keys] + ['mg/dl', 'result', 'نتیجه', 'date', 'x']
+        separators = [' ', ': ', ':', ' - ', '', '\n', '  ', '،']
+        values = ['12', '۱۲۰', '3.5', '7,25', '۲۵٫۳', '..', '1.2.3', '0', '']
+        parts = []
+        for _ in range(rng.randint(0, 25)):
+            word = rng.choice(words)
+            parts.append(word.upper() if rng.random() < 0.2 else word)
+            parts.append(rng.choice(separators))
+            parts.append(rng.choice(values))
+            parts.append(rng.choice(separators))
+        return ''.join(parts)
+
+    def test_matches_per_keyword_loop(self):
+        keywords = DiabetesModel.KEYWORDS
+        extractor = KeywordExtractor(keywords)
+        rng = random.Random(13)
+        for _ in range(3000):
+            text = self.random_text(rng, keywords)
+            found = {field: m.value for field, m in extractor.extract(normalize_ocr_text(text)).items()}
+            self.assertEqual(found, extract_with_loop(keywords, text), text)
+
+    def test_match_details(self):
+        extractor = KeywordExtractor(DiabetesModel.KEYWORDS)
+        text = normalize_ocr_text('Glucose: ۱۴۸  BMI - 33،6  سن 50')
+        fields = extractor.extract(text)
+        self.assertEqual(list(fields), ['Glucose', 'BMI', 'Age'])
+        self.assertEqual(fields['BMI'].value, '33.6')
+        self.assertEqual(text[fields['Glucose'].start:fields['Glucose'].end], 'glucose  148')
+        self.assertEqual(fields['Glucose'].confidence, 1.0)
+        self.assertLess(fields['Age'].confidence, 1.0)
+
+
+class FuzzyTitleMatcherTests(unittest.TestCase):
+    ALPHABET = 'abcdefghijklmnopqrstuvwxyz '
+
+    def make_titles(self, rng, count):
+        words = [''.join(rng.choice(self.ALPHABET[:-1]) for _ in range(rng.randint(2, 8))) for _ in range(150)]
+        return [' '.join(rng.choice(words) for _ in range(rng.randint(1, 4))).title() for _ in range(count)]
+
+    def make_typo(self, rng, title):
+        chars = list(title.lower())
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(chars))
+            op = rng.choice('sdi')
+            if op == 's':
+                chars[i] = rng.choice(self.ALPHABET)
+            elif op == 'd' and len(chars) > 1:
+                del chars[i]
+            else:
+                chars.insert(i, rng.choice(self.ALPHABET))
+        return ''.join(chars)
+
+    def test_agrees_with_difflib(self):
+        rng = random.Random(5)
+        titles = self.make_titles(rng, 600)
+        lower = [t.lower() for t in titles]
+        matcher = FuzzyTitleMatcher(titles)
+        queries = [self.make_typo(rng, rng.choice(titles)) for _ in range(150)] + ['zzzz', 'q']
+        for query in queries:
+            expected = get_close_matches(query, lower, n=5, cutoff=0.4)
+            found = [lower[pos] for pos, _ in matcher.match(query, n=5, cutoff=0.4)]
+            self.assertEqual(found[:1], expected[:1], query)
+            self.assertEqual(found, expected, query)
+
+    def test_extend_keeps_positions(self):
+        matcher = FuzzyTitleMatcher(['Heat', 'Alien'])
+        matcher.extend(['Aliens'])
+        self.assertEqual(matcher.match('alien', n=1)[0][0], 1)
+        self.assertEqual(matcher.match('alienss', n=1)[0][0], 2)
+
+
+class OCRJobQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.release = threading.Event()
+        # a thread pool and a fake Tesseract: the queue's bookkeeping is what is tested
+        patcher = mock.patch.object(ocr_jobs, 'ocr_image_bytes', side_effect=self.fake_ocr)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def fake_ocr(self, data, timeout):
+        if data == b'slow':
+            self.release.wait(5)
+        if data == b'bad':
+            raise RuntimeError('Tesseract failed')
+        return data.decode()
+
+    def make_queue(self, **kwargs):
+        queue = ocr_jobs.OCRJobQueue(f'{self.tmp}/jobs.sqlite3', **kwargs)
+        queue._executor = ThreadPoolExecutor(max_workers=queue.max_workers)
+        # cleanups run last-first: unblock the fake, then wait for the pool before the temp dir goes
+        self.addCleanup(queue._executor.shutdown, wait=True, cancel_futures=True)
+        self.addCleanup(self.release.set)
+        return queue
+
+    def wait_for(self, queue, job_id, seconds=5):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            status = queue.status(job_id)
+            if status['status'] != 'pending':
+                return status
+            time.sleep(0.01)
+        self.fail(f'job {job_id} still pending')
+
+    def test_done_and_error(self):
+        queue = self.make_queue()
+        self.assertEqual(self.wait_for(queue, queue.submit(b'glucose 148', tag='k')),
+                         {'status': 'done', 'text': 'glucose 148', 'tag': 'k'})
+        self.assertEqual(self.wait_for(queue, queue.submit(b'bad')),
+                         {'status': 'error', 'message': 'Tesseract failed'})
+        self.assertEqual(queue.status('missing'), {'status': 'unknown'})
+
+    def test_rejects_jobs_beyond_max_pending(self):
+        queue = self.make_queue(max_workers=1, max_pending=2)
+        first, second = queue.submit(b'slow'), queue.submit(b'slow')
+        with self.assertRaises(ocr_jobs.OCRQueueFull):
+            queue.submit(b'third')
+        self.release.set()
+        self.assertEqual(self.wait_for(queue, first)['status'], 'done')
+        self.assertEqual(self.wait_for(queue, second)['status'], 'done')
+        queue.submit(b'third')
+
+    @mock.patch.object(ocr_jobs, 'GRACE_SECONDS', 0)
+    def test_running_job_times_out(self):
+        queue = self.make_queue(max_workers=1, timeout=0.05)
+        job_id = queue.submit(b'slow')
+        self.assertEqual(queue.status(job_id), {'status': 'pending'})
+        self.assertEqual(self.wait_for(queue, job_id), {'status': 'timeout'})
+        # a late result does not replace the timeout
+        self.release.set()
+        deadline = time.monotonic() + 5
+        while queue.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(queue.status(job_id), {'status': 'timeout'})
+
+    @mock.patch.object(ocr_jobs, 'GRACE_SECONDS', 0)
+    def test_queued_job_times_out_behind_a_stuck_one(self):
+        queue = self.make_queue(max_workers=1, max_pending=2, timeout=0.05)
+        queue.submit(b'slow')
+        queued = queue.submit(b'never runs')
+        self.assertEqual(self.wait_for(queue, queued), {'status': 'timeout'})
+        self.release.set()
+
+
+if __name__ == '__main__':
+    unittest.main()
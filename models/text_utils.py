@@ -0,0 +1,11 @@
+PERSIAN_DIGITS = '۰۱۲۳۴۵۶۷۸۹'
+ENGLISH_DIGITS = '0123456789'
+
+# one str.translate pass instead of a replace() per digit
+DIGITS_TABLE = str.maketrans(PERSIAN_DIGITS, ENGLISH_DIGITS)
+
+
+def to_english_digits(s):
+    if not isinstance(s, str):
+        return s
+    return s.translate(DIGITS_TABLE)